@@ -0,0 +1,111 @@
+"""
+Lazy Routers
+Route modules imported on first use instead of at startup
+
+A LazyRouter holds a URL prefix in the app's route table. The first request
+under that prefix (or warm_up(), run in the background once the server is
+listening) imports the module in a worker thread, runs an optional
+`on_load` hook and swaps the module's real routes into the table in the
+placeholder's position. Later requests never see the placeholder.
+
+Heavy subsystems (GraphRAG and its numpy stack, the email generator) stay
+out of the import path of `app.app`, which keeps cold starts of a
+scale-to-zero container short.
+"""
+from typing import Awaitable, Callable, List, Optional
+from fastapi import APIRouter, FastAPI
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Receive, Scope, Send
+import asyncio
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LazyRouter(BaseRoute):
+    """Placeholder route for `module.router`, mounted at `prefix` once loaded"""
+
+    def __init__(self, app: FastAPI, module: str, prefix: str, tags: Optional[List[str]] = None,
+                 on_load: Optional[Callable[[], Awaitable[None]]] = None):
+        self.app = app
+        self.module = module
+        self.prefix = prefix.rstrip("/")
+        self.tags = tags
+        self.on_load = on_load
+        self.routes: Optional[List[BaseRoute]] = None
+        self.load_seconds: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.routes is not None
+
+    def matches(self, scope: Scope):
+        if scope["type"] in ("http", "websocket"):
+            path = scope["path"]
+            if path == self.prefix or path.startswith(self.prefix + "/"):
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    async def load(self) -> List[BaseRoute]:
+        async with self._lock:
+            if self.routes is not None:
+                return self.routes
+            started = time.perf_counter()
+            # Module imports run real code (numpy, model setup); keep them off the event loop
+            module = await run_in_threadpool(importlib.import_module, self.module)
+            if self.on_load is not None:
+                await self.on_load()
+
+            collector = APIRouter()
+            collector.include_router(module.router, prefix=self.prefix, tags=self.tags)
+            table = self.app.router.routes
+            position = table.index(self) if self in table else len(table)
+            table[position:position + 1] = collector.routes
+            self.app.openapi_schema = None
+            self.routes = collector.routes
+            self.load_seconds = time.perf_counter() - started
+            logger.info(f"Loaded {self.module} in {self.load_seconds * 1000:.0f} ms")
+            return self.routes
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send):
+        await self.load()
+        # Dispatch again, through the route table that now holds the real routes
+        await self.app.router(scope, receive, send)
+
+    def url_path_for(self, name: str, /, **path_params):
+        # Names in an unloaded module are unknown until it loads
+        raise NoMatchFound(name, path_params)
+
+
+def include_lazy_router(app: FastAPI, module: str, prefix: str, tags: Optional[List[str]] = None,
+                        on_load: Optional[Callable[[], Awaitable[None]]] = None) -> LazyRouter:
+    route = LazyRouter(app, module, prefix, tags, on_load)
+    app.router.routes.append(route)
+    return route
+
+
+def lazy_routers(app: FastAPI) -> List[LazyRouter]:
+    return [route for route in app.router.routes if isinstance(route, LazyRouter)]
+
+
+async def warm_up(app: FastAPI, delay: float = 0.0):
+    """Load every lazy router, one at a time, `delay` seconds after startup"""
+    await asyncio.sleep(delay)
+    for route in lazy_routers(app):
+        try:
+            await route.load()
+        except Exception as e:
+            # The next request under the prefix retries (and reports) the import
+            logger.error(f"Warm-up of {route.module} failed: {e}")
+
+
+__all__ = [
+    'LazyRouter',
+    'include_lazy_router',
+    'lazy_routers',
+    'warm_up',
+]
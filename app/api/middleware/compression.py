@@ -0,0 +1,159 @@
+"""
+Response Compression Middleware
+Pure-ASGI gzip / brotli encoding of text responses
+
+- Encoding is negotiated from Accept-Encoding (brotli preferred)
+- Only text-like content types are touched; images (.avif), archives and
+  server-sent events pass through untouched
+- Responses that already carry a Content-Encoding (cached pages,
+  precompressed static assets) or a Content-Range are left alone
+- A complete body under `minimum_size` is not worth the header overhead
+- Streaming bodies are compressed chunk by chunk and flushed per chunk, so
+  NDJSON / CSV exports still reach the client incrementally
+"""
+from typing import Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.page_cache import accepted_encoding
+import brotli
+import zlib
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "image/svg+xml",
+)
+# text/* that must reach the client unbuffered
+EXCLUDED_TYPES = ("text/event-stream",)
+# Already-compressed media, whatever content type they were served with
+EXCLUDED_SUFFIXES = (".avif", ".webp", ".png", ".jpg", ".jpeg", ".gif", ".woff2", ".gz", ".br", ".zip", ".pdf")
+
+
+class _Encoder:
+    """Incremental compressor; every chunk comes out flushed so it can be sent on its own"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+def compressible(headers: Headers, path: str) -> bool:
+    if "content-encoding" in headers or "content-range" in headers:
+        return False
+    if "no-transform" in headers.get("cache-control", ""):
+        return False
+    if path.lower().endswith(EXCLUDED_SUFFIXES):
+        return False
+    content_type = headers.get("content-type", "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(EXCLUDED_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Compresses eligible responses on the way out
+
+    The start message is held until the first body chunk arrives: a
+    complete small body goes out as is, anything else gets Content-Encoding,
+    a weakened ETag and no Content-Length (it would no longer be right)
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500, gzip_level: int = 6,
+                 brotli_quality: int = 4, encodings: Tuple[str, ...] = ("br", "gzip")):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = encodings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        encoding = accepted_encoding(request_headers.get("accept-encoding", ""), self.encodings)
+        if encoding == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        start: Optional[Message] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                if message["status"] < 200 or message["status"] in (204, 304) or not compressible(headers, path):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=list(start.get("headers", [])))
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = "W/" + etag
+                if more_body:
+                    del headers["content-length"]
+                    await send({**start, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": encoder.chunk(body), "more_body": True})
+                else:
+                    compressed = encoder.finish(body)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send({**start, "headers": headers.raw})
+                    await send({"type": "http.response.body", "body": compressed})
+                return
+
+            if more_body:
+                if body:
+                    await send({"type": "http.response.body", "body": encoder.chunk(body), "more_body": True})
+            else:
+                await send({"type": "http.response.body", "body": encoder.finish(body)})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+__all__ = [
+    'CompressionMiddleware',
+    'compressible',
+]
@@ -0,0 +1,140 @@
+"""
+Request Pipeline Middleware
+Single pure-ASGI layer replacing the old BaseHTTPMiddleware stack
+(proxy headers, security headers, analytics)
+"""
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.api.middleware.analytics import should_track, track_request
+from app.api.middleware.security import encoded_security_headers
+from app.config import settings
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Request bodies on these paths are capped at MAX_UPLOAD_SIZE_MB (+ multipart framing)
+UPLOAD_PATHS = ("/api/v1/chatbot/upload",)
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class RequestBodyTooLarge(HTTPException):
+    """
+    Raised from receive() once a capped request body passes its limit
+    An HTTPException so FastAPI's body parsing re-raises it as a 413 instead of a 400
+    """
+
+    def __init__(self):
+        super().__init__(413, detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE_MB}MB")
+
+
+class RequestPipelineMiddleware:
+    """
+    One pass over every HTTP request:
+    - rewrites scope["scheme"] from X-Forwarded-Proto
+    - injects precomputed security headers (and X-Process-Time) on response start
+    - rejects oversized upload bodies with 413, before or while they stream in
+    - hands the finished request to the analytics buffer
+
+    Unlike BaseHTTPMiddleware it never wraps the response body, so streaming
+    responses pass straight through without an extra task per layer
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.security_headers = encoded_security_headers()
+        self.track_response_time = settings.TRACK_RESPONSE_TIME
+        self.analytics_enabled = settings.ENABLES_ANALYTICS
+        self.max_upload_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        user_agent = referrer = b""
+        content_length = None
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-proto":
+                # Request came through an HTTPS proxy
+                scope["scheme"] = value.decode("latin-1")
+            elif name == b"user-agent":
+                user_agent = value
+            elif name == b"referer":
+                referrer = value
+            elif name == b"content-length":
+                content_length = value
+
+        start_time = time.perf_counter()
+        status_code = 500
+        response_started = False
+
+        if scope["path"].startswith(UPLOAD_PATHS):
+            # Reject declared oversize bodies without reading a byte
+            if content_length is not None and content_length.isdigit() \
+                    and int(content_length) > self.max_upload_bytes:
+                receive = self._reject_body
+            receive = self._limit_body(receive, self.max_upload_bytes)
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                status_code = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.extend(self.security_headers)
+                if self.track_response_time:
+                    process_time_ms = (time.perf_counter() - start_time) * 1000
+                    headers.append((b"x-process-time", str(round(process_time_ms, 2)).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except RequestBodyTooLarge:
+            if response_started:
+                raise
+            response = JSONResponse(
+                {"detail": RequestBodyTooLarge().detail},
+                status_code=413,
+                headers={"Connection": "close"},
+            )
+            await response(scope, receive, send_wrapper)
+        finally:
+            if self.analytics_enabled and should_track(scope["path"]):
+                process_time_ms = (time.perf_counter() - start_time) * 1000
+                try:
+                    track_request(
+                        path=scope["path"],
+                        method=scope["method"],
+                        status_code=status_code,
+                        process_time_ms=process_time_ms,
+                        client=scope.get("client"),
+                        user_agent=user_agent.decode("latin-1"),
+                        referrer=referrer.decode("latin-1"),
+                        route=getattr(scope.get("route"), "path", None),
+                    )
+                except Exception as e:
+                    # Don't let analytics errors break the app
+                    logger.error(f"Analytics tracking error: {e}")
+
+    @staticmethod
+    async def _reject_body() -> Message:
+        raise RequestBodyTooLarge()
+
+    @staticmethod
+    def _limit_body(receive: Receive, max_bytes: int) -> Receive:
+        """Wrap receive() so the body stream aborts as soon as it passes max_bytes"""
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise RequestBodyTooLarge()
+            return message
+
+        return limited_receive
@@ -0,0 +1,132 @@
+"""
+Rate Limit Middleware
+Per-client token buckets for the API, one bucket per route group
+
+Requests are grouped by path prefix (first match wins) and keyed by the
+SHA-256 of the client IP, so an upload flood only drains the upload
+bucket. Pages, static files and CORS preflights are never limited.
+
+Behind proxies the socket peer is the proxy, so the client IP is taken
+from X-Forwarded-For: each of the `trusted_hops` proxies appends the
+address it received the request from, and the entry that many places
+from the right is the last one not written by the client. With 0 hops
+(the default) the header is ignored and the peer address is used.
+Limited responses get a 429 with Retry-After; every limited group answers
+with RateLimit-Limit / -Remaining / -Reset / -Policy headers.
+"""
+from typing import Optional, Sequence, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.utils.rate_limit import MemoryRateLimiter, SQLiteRateLimiter
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = 60
+
+# (path prefix, group, requests per minute)
+RouteGroups = Sequence[Tuple[str, str, int]]
+
+
+def default_groups() -> RouteGroups:
+    return (
+        ("/api/v1/chatbot/upload", "upload", settings.RATE_LIMIT_UPLOADS_PER_MINUTE),
+        # LLM-backed: every call costs model time
+        ("/api/v1/chatbot/query", "llm", settings.RATE_LIMIT_LLM_PER_MINUTE),
+        ("/api/v1/chatbot/qeury", "llm", settings.RATE_LIMIT_LLM_PER_MINUTE),
+        ("/api/v1/email/generate", "llm", settings.RATE_LIMIT_LLM_PER_MINUTE),
+        ("/api/", "api", settings.RATE_LIMIT_PER_MINUTE),
+    )
+
+
+def client_ip(scope: Scope, trusted_hops: int = 0) -> str:
+    """Client address: the peer, or the X-Forwarded-For entry added by the outermost trusted proxy"""
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if trusted_hops <= 0:
+        return peer
+    forwarded = [
+        entry.strip()
+        for name, value in scope.get("headers", ())
+        if name == b"x-forwarded-for"
+        for entry in value.decode("latin-1").split(",")
+    ]
+    if len(forwarded) < trusted_hops:
+        # Fewer hops than configured: not (only) through our proxies
+        return peer
+    return forwarded[-trusted_hops] or peer
+
+
+def create_limiter():
+    if settings.RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteRateLimiter(settings.RATE_LIMIT_DB_PATH, idle_seconds=WINDOW_SECONDS)
+    return MemoryRateLimiter(idle_seconds=WINDOW_SECONDS)
+
+
+class RateLimitMiddleware:
+    """Pure-ASGI token-bucket limiter (see app.utils.rate_limit for the backends)"""
+
+    def __init__(self, app: ASGIApp, limiter=None, groups: Optional[RouteGroups] = None,
+                 trusted_hops: Optional[int] = None):
+        self.app = app
+        self.limiter = limiter if limiter is not None else create_limiter()
+        self.groups = tuple(groups if groups is not None else default_groups())
+        self.trusted_hops = settings.RATE_LIMIT_TRUSTED_PROXY_HOPS if trusted_hops is None else trusted_hops
+        self.counters = {"allowed": 0, "limited": 0}
+
+    def _group(self, path: str) -> Optional[Tuple[str, int]]:
+        for prefix, group, per_minute in self.groups:
+            if path.startswith(prefix):
+                return (group, per_minute) if per_minute > 0 else None
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        matched = self._group(scope["path"])
+        if matched is None:
+            await self.app(scope, receive, send)
+            return
+
+        group, per_minute = matched
+        ip = client_ip(scope, self.trusted_hops)
+        key = f"{group}:{hashlib.sha256(ip.encode()).hexdigest()[:32]}"
+        if getattr(self.limiter, "blocking", False):
+            decision = await run_in_threadpool(
+                self.limiter.acquire, key, rate=per_minute / WINDOW_SECONDS, capacity=per_minute
+            )
+        else:
+            decision = self.limiter.acquire(key, rate=per_minute / WINDOW_SECONDS, capacity=per_minute)
+        headers = decision.headers(WINDOW_SECONDS)
+
+        if not decision.allowed:
+            self.counters["limited"] += 1
+            response = JSONResponse(
+                {"detail": f"Rate limit exceeded. Try again in {headers['Retry-After']} seconds."},
+                status_code=429,
+                headers=headers,
+            )
+            await response(scope, receive, send)
+            return
+
+        self.counters["allowed"] += 1
+        raw_headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + raw_headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+__all__ = [
+    'RateLimitMiddleware',
+    'client_ip',
+    'create_limiter',
+    'default_groups',
+]
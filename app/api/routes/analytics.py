@@ -1,17 +1,72 @@
 """Analytics Routes"""
-from fastapi import APIRouter, HTTPException
-from app.database.connection import get_db, get_table_counts
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.database import crud
+from app.database.connection import get_async_db, get_table_counts_async, SessionLocal
+from app.database.analytics_buffer import analytics_buffer
+from app.database.rollups import (
+    ACTIVE_SESSIONS, SESSION_AVG_SUM, UNREAD_MESSAGES, read_summary_counters
+)
+from app.database.export import EXPORT_FORMATS, EXPORT_TABLES, export_headers, export_statement, iter_export
+from app.utils.pagination import clamp_limit, decode_cursor
+from app.utils.cache import SingleFlightCache, cached_endpoint, install_write_invalidation
+from app.config import settings
+from app.dependencies import require_admin
 from app.database.models import (
-    Visitor, ChatSession, ContactMessage, ChatQuery,
-    EmailGeneration, ProjectView, ApiUsage
+    Visitor, ChatSession, ChatQuery,
+    EmailGeneration, ProjectView, ApiUsage,
+    DailyPageStat, DailyApiStat
 )
-from sqlalchemy import func
+from sqlalchemy import false, func, select
 from datetime import datetime, timedelta
+from typing import Optional
 
 
 router = APIRouter()
 
+# Shared by every dashboard tab: one query set per key per TTL window
+analytics_cache = SingleFlightCache(max_entries=settings.ANALYTICS_CACHE_MAX_ENTRIES)
+
+if settings.ANALYTICS_CACHE_INVALIDATE_ON_WRITE:
+    install_write_invalidation(SessionLocal, analytics_cache)
+
+
+def _cache_ttl(name: str) -> float:
+    return settings.ANALYTICS_CACHE_TTLS.get(name, settings.ANALYTICS_CACHE_DEFAULT_TTL)
+
+
+async def _percentiles(db, column, *filters, points=(50, 90, 95, 99)) -> dict:
+    """
+    Nearest-rank percentiles of a column, computed in the database: a count,
+    then every rank in one SELECT of scalar subqueries. Keep an index on
+    (equality filter columns..., column) so ranks are read off the index, not sorted
+    """
+    filters = (column.isnot(None),) + filters
+    total = await db.scalar(select(func.count()).select_from(column.table).where(*filters)) or 0
+    if not total:
+        return {**{f"p{p}": None for p in points}, "samples": 0}
+
+    ranks = [
+        select(column).where(*filters)
+        .order_by(column.asc())
+        .offset(int(p / 100 * (total - 1)))
+        .limit(1)
+        .scalar_subquery()
+        for p in points
+    ]
+    values = (await db.execute(select(*ranks))).one()
+    result = {f"p{p}": round(value, 2) if value is not None else None for p, value in zip(points, values)}
+    result["samples"] = total
+    return result
+
+
+def cached(name: str, *tables: str):
+    """Cache an analytics endpoint, invalidated by writes to `tables`"""
+    return cached_endpoint(analytics_cache, name, _cache_ttl, tags=tables)
+
+
 @router.get("/summary")
+@cached("summary", "visitors", "daily_page_stats", "table_row_counts", "contact_messages", "chat_sessions", "email_generations")
 async def get_analytics():
     """
     Get overall analytics summary
@@ -21,56 +76,55 @@ async def get_analytics():
     - Top pages
     - Device breakdown
     - Unread messages count
+
+    Visitor figures come from the daily_page_stats rollup, message and
+    session figures from table_row_counts
     """
 
     try: 
         # Get all tables counts
-        counts = get_table_counts()
+        counts = await get_table_counts_async()
 
-        with get_db() as db:
+        async with get_async_db() as db:
             # Visitor today
-            today = datetime.now(datetime.timezone.utc)
-            today_visitors = db.query(Visitor).filter(
-                func.date(Visitor.timestamp) == today
-            ).count()
+            today = datetime.utcnow().date()
+            today_visitors = await db.scalar(
+                select(func.coalesce(func.sum(DailyPageStat.views), 0))
+                .where(DailyPageStat.day == today)
+            )
 
             # Visitor this week
-            week_ago = datetime.now(datetime.timezone.utc) - timedelta(days=7)
-            week_visitors = db.query(Visitor).filter(
-                func.date(Visitor.timestamp) >= week_ago
-            ).count()
+            week_ago = today - timedelta(days=7)
+            week_visitors = await db.scalar(
+                select(func.coalesce(func.sum(DailyPageStat.views), 0))
+                .where(DailyPageStat.day >= week_ago)
+            )
 
             # Most Viewed pages ( last 30 days)
-            thirty_days_ago = datetime.now(datetime.timezone.utc)-timedelta(days=30)
-            top_pages = db.qeury(
-                Visitor.page,
-                func.count(Visitor.id).lable('views')
-
-            ).filter(Visitor.timestamp >= thirty_days_ago)\
-            .group_by(Visitor.page)\
-            .order_by(func.count(Visitor.id).desc())\
-            .limit(10)\
-            .all()
+            thirty_days_ago = today - timedelta(days=30)
+            top_pages = (await db.execute(
+                select(
+                    DailyPageStat.page,
+                    func.sum(DailyPageStat.views).label('views')
+                ).where(DailyPageStat.day >= thirty_days_ago)
+                .group_by(DailyPageStat.page)
+                .order_by(func.sum(DailyPageStat.views).desc())
+                .limit(10)
+            )).all()
 
             # Device breakdown
-            devices = db.query(
-                Visitor.device_type,
-                func.count(Visitor.id).label('count')
-            ).group_by(Visitor.device_type)\
-            .all()
-
-            # Unread messages
-            unread_messages = db.query(ContactMessage).filter_by(read=False).count()
-
-            # Active chat sessions (with queries)
-            active_sessions = db.query(ChatSession)\
-                .filter(ChatSession.queries_count > 0)\
-                .count()
-            
-            # Average response time for chatbot
-            avg_response = db.query(
-                func.avg(ChatSession.avg_respone_time_ms)
-            ).scalar()
+            devices = (await db.execute(
+                select(
+                    DailyPageStat.device_type,
+                    func.sum(DailyPageStat.views).label('count')
+                ).group_by(DailyPageStat.device_type)
+            )).all()
+
+            # Unread messages, active chat sessions (with queries) and their average response time
+            summary = await db.run_sync(read_summary_counters)
+            unread_messages = summary[UNREAD_MESSAGES]
+            active_sessions = summary[ACTIVE_SESSIONS]
+            avg_response = summary[SESSION_AVG_SUM] / 1000 / active_sessions if active_sessions else 0
 
         return {
             "status": "success",
@@ -105,6 +159,7 @@ async def get_analytics():
     
 
 @router.get("/visitors/trend")
+@cached("visitors_trend", "visitors", "daily_page_stats")
 async def visitor_trend(days: int=30):
     """
     Get visitor trend for last N days
@@ -116,16 +171,17 @@ async def visitor_trend(days: int=30):
     try: 
         if days < 1 or days > 365:
             raise HTTPException(400, detail="Days must be between 1 and 365")
-        with get_db() as db:
-            start_date = datetime.now(datetime.timezone.utc) - timedelta(days=days)
-
-            trend = db.query(
-                func.date(Visitor.timestamp).label('date'),
-                func.count(Visitor.id).label('visitor')
-            ).filter(Visitor.timestamp >= start_date)\
-            .group_by(func.date(Visitor.timestamp))\
-            .order_by(func.date(Visitor.timestamp))\
-            .all()
+        async with get_async_db() as db:
+            start_date = datetime.utcnow().date() - timedelta(days=days)
+
+            trend = (await db.execute(
+                select(
+                    DailyPageStat.day.label('date'),
+                    func.sum(DailyPageStat.views).label('visitors')
+                ).where(DailyPageStat.day >= start_date)
+                .group_by(DailyPageStat.day)
+                .order_by(DailyPageStat.day)
+            )).all()
 
             return {
                 "status": "success",
@@ -141,22 +197,24 @@ async def visitor_trend(days: int=30):
         raise HTTPException(500, detail=str(e))
     
 @router.get("/pages/views")
-async def page_views(days: int= 30):
+@cached("pages_views", "visitors")
+async def page_views(days: int = Query(30, ge=1, le=365)):
     """
     Get page view statistics
     """
     try:
-        with get_db as db:
-            start_date = datetime.now(datetime.timezone.utc) - timedelta(days=days)
-
-            page_stats = db.query(
-                Visitor.page,
-                func.count(Visitor,id).label('total_views'),
-                func.count(func.distinct(Visitor.ip_hash)).label('unique_visitors')
-            ).filter(Visitor.page)\
-            .group_by(Visitor.page)\
-            .order_by(func.count(Visitor.id).desc())\
-            .all()
+        async with get_async_db() as db:
+            start_date = datetime.utcnow() - timedelta(days=days)
+
+            page_stats = (await db.execute(
+                select(
+                    Visitor.page,
+                    func.count(Visitor.id).label('total_views'),
+                    func.count(func.distinct(Visitor.ip_hash)).label('unique_visitors')
+                ).where(Visitor.timestamp >= start_date)
+                .group_by(Visitor.page)
+                .order_by(func.count(Visitor.id).desc())
+            )).all()
 
             return {
                 "status": "success",
@@ -175,18 +233,20 @@ async def page_views(days: int= 30):
     
 
 @router.get('/projects/popular')
+@cached("projects_popular", "project_views")
 async def popular_projects():
     """Get most viewed projects"""
     try:
-        with get_db as db:
-            project_stats = db.query(
-                ProjectView.project_slug,
-                ProjectView.project_name,
-                func.count(ProjectView.id).label('views')
-            ).group_by(ProjectView.project_slug, ProjectView.project_name)\
-            .order_by(func.count(ProjectView.id).desc())\
-            .limit(10)\
-            .all()
+        async with get_async_db() as db:
+            project_stats = (await db.execute(
+                select(
+                    ProjectView.project_slug,
+                    ProjectView.project_name,
+                    func.count(ProjectView.id).label('views')
+                ).group_by(ProjectView.project_slug, ProjectView.project_name)
+                .order_by(func.count(ProjectView.id).desc())
+                .limit(10)
+            )).all()
 
             return {
                 "status":"success",
@@ -204,32 +264,51 @@ async def popular_projects():
     
 
 @router.get("/chatbot/sats")
+@cached("chatbot_stats", "chat_sessions", "chat_queries")
 async def chatbot_stats():
     """Get chatbot usage stats"""
 
     try:
-        with get_db as db:
+        async with get_async_db() as db:
             
-            total_sessions = db.query(ChatSession).count()
-            total_queries = db.query(ChatQuery).count()
-
-            avg_queries = db.query(
-                func.avg(ChatSession.avg_response_time_ms)
-            ).scalar()
-
-            avg_response_time = db.query(
-                func.avg(ChatSession.avg_response_time_ms)
-            ).scalar()
-
-            top_sessions = db.query(ChatSession)\
-                            .order_by(ChatSession.queries_count.desc())\
-                            .limit(5)\
-                            .all()
+            total_sessions = await db.scalar(select(func.count(ChatSession.id)))
+            total_queries = await db.scalar(select(func.count(ChatQuery.id)))
+
+            avg_queries = await db.scalar(select(func.avg(ChatSession.queries_count)))
+
+            avg_response_time = await db.scalar(select(func.avg(ChatSession.avg_response_time_ms)))
+
+            cache_hits, time_saved = (await db.execute(
+                select(
+                    func.count(ChatQuery.id),
+                    func.coalesce(func.sum(ChatQuery.time_saved_ms), 0.0)
+                ).where(ChatQuery.cache_hit.is_(True))
+            )).one()
+
+            avg_hit_time = await db.scalar(
+                select(func.avg(ChatQuery.response_time_ms))
+                .where(ChatQuery.cache_hit.is_(True))
+            )
+
+            avg_miss_time = await db.scalar(
+                select(func.avg(ChatQuery.response_time_ms))
+                .where(ChatQuery.cache_hit.isnot(True), ChatQuery.error.isnot(True))
+            )
+
+            # Served by idx_chat_query_ttft (error, ttft_ms)
+            ttft = await _percentiles(db, ChatQuery.ttft_ms, ChatQuery.error == false())
+
+            top_sessions = (await db.scalars(
+                select(ChatSession)
+                .order_by(ChatSession.queries_count.desc())
+                .limit(5)
+            )).all()
             
-            recent_sessions = db.query(ChatSession)\
-                            .order_by(ChatSession.created_at.desc())\
-                            .limit(10)\
-                            .all()
+            recent_sessions = (await db.scalars(
+                select(ChatSession)
+                .order_by(ChatSession.created_at.desc())
+                .limit(10)
+            )).all()
             
             return {
                 "status": "success",
@@ -239,6 +318,14 @@ async def chatbot_stats():
                     "avg_queries_per_session": round(avg_queries or 0,2),
                     "avg_response_time_ms": round(avg_response_time or 0,2)
                 },
+                "ttft_ms": ttft,
+                "answer_cache": {
+                    "hits": cache_hits,
+                    "hit_rate": round(cache_hits / total_queries, 4) if total_queries else 0.0,
+                    "time_saved_ms": round(time_saved, 2),
+                    "avg_hit_response_time_ms": round(avg_hit_time or 0, 2),
+                    "avg_miss_response_time_ms": round(avg_miss_time or 0, 2)
+                },
                 "top_sessions": [s.to_dict() for s in top_sessions],
                 "recent_sessions": [s.to_dict() for s in recent_sessions]
             }
@@ -247,33 +334,53 @@ async def chatbot_stats():
     
 
 @router.get("/email/stats")
+@cached("email_stats", "email_generations")
 async def email_generator_status():
     """Get email generator stats"""
     try:
-        with get_db as db:
-
-            total = db.query(EmailGeneration).count()
-            successful = db.query(EmailGeneration).filter_by(success=True).count()
-            failed = db.qeury(EmailGeneration).filter_by(success=False).count()
-
-            avg_time = db.query(
-                func.avg(EmailGeneration.generation_time_ms)
-            ).filter_by(success=True).scalar()
-
-            top_companies = db.query(
-                EmailGeneration.company_name,
-                func.count(EmailGeneration.id).label('count')
-            ).filter(EmailGeneration.company_name != "")\
-            .group_by(EmailGeneration.company_name)\
-            .order_by(func.count(EmailGeneration.id).desc())\
-            .limit(10)\
-            .all()
-
-            recent = db.query(EmailGeneration)\
-                    .filter_by(success=True)\
-                    .order_by(EmailGeneration.created_at.desc())\
-                    .limit(10)\
-                    .all()
+        async with get_async_db() as db:
+
+            total = await db.scalar(select(func.count(EmailGeneration.id)))
+            successful = await db.scalar(
+                select(func.count(EmailGeneration.id)).where(EmailGeneration.success.is_(True))
+            )
+            failed = await db.scalar(
+                select(func.count(EmailGeneration.id)).where(EmailGeneration.success.is_(False))
+            )
+
+            avg_time = await db.scalar(
+                select(func.avg(EmailGeneration.generation_time_ms))
+                .where(EmailGeneration.success.is_(True))
+            )
+
+            cache_hits, time_saved = (await db.execute(
+                select(
+                    func.count(EmailGeneration.id),
+                    func.coalesce(func.sum(EmailGeneration.time_saved_ms), 0.0)
+                ).where(EmailGeneration.cache_hit.is_(True))
+            )).one()
+
+            avg_miss_time = await db.scalar(
+                select(func.avg(EmailGeneration.generation_time_ms))
+                .where(EmailGeneration.cache_hit.isnot(True), EmailGeneration.success.is_(True))
+            )
+
+            top_companies = (await db.execute(
+                select(
+                    EmailGeneration.company_name,
+                    func.count(EmailGeneration.id).label('count')
+                ).where(EmailGeneration.company_name != "")
+                .group_by(EmailGeneration.company_name)
+                .order_by(func.count(EmailGeneration.id).desc())
+                .limit(10)
+            )).all()
+
+            recent = (await db.scalars(
+                select(EmailGeneration)
+                .where(EmailGeneration.success.is_(True))
+                .order_by(EmailGeneration.created_at.desc())
+                .limit(10)
+            )).all()
             
             return {
                 "status": "success",
@@ -284,6 +391,12 @@ async def email_generator_status():
                     "success_rate": round((successful/total*100) if total > 0 else 0, 2),
                     "avg_generation_time_ms": round(avg_time or 0, 2)
                 },
+                "response_cache": {
+                    "hits": cache_hits,
+                    "hit_rate": round(cache_hits / successful, 4) if successful else 0.0,
+                    "time_saved_ms": round(time_saved, 2),
+                    "avg_miss_generation_time_ms": round(avg_miss_time or 0, 2)
+                },
                 "top_companies": [
                     {"comapny": company, "count": count}
                     for company, count in top_companies
@@ -294,24 +407,25 @@ async def email_generator_status():
         raise HTTPException(500, detail=str(e))
     
 @router.get('/api/performance')
+@cached("api_performance", "api_usage", "daily_api_stats")
 async def api_performance():
-    """Get API endpoint performance metrics"""
+    """Get API endpoint performance metrics (from the daily_api_stats rollup)"""
     try:
-        with get_db() as db:
-
-            endpoint_stats = db.qeury(
-                ApiUsage.endpoint,
-                func.count(ApiUsage.id).label('request'),
-                func.avg(ApiUsage.response_time_ms).label('avg_response_time'),
-                func.count(func.distinct(ApiUsage.ip_hash)).label('unique_users')
-            ).group_by(ApiUsage.endpoint)\
-            .order_by(func.count(ApiUsage.id).desc())\
-            .all()
-
-            total_requests = db.query(ApiUsage).count()
-            error_requests = db.query(ApiUsage)\
-                    .filter(ApiUsage.status_code>=400)\
-                    .count()
+        async with get_async_db() as db:
+
+            total_requests_col = func.sum(DailyApiStat.requests)
+            endpoint_stats = (await db.execute(
+                select(
+                    DailyApiStat.endpoint,
+                    total_requests_col.label('requests'),
+                    (func.sum(DailyApiStat.total_response_time_ms) / total_requests_col).label('avg_response_time'),
+                    func.sum(DailyApiStat.errors).label('errors')
+                ).group_by(DailyApiStat.endpoint)
+                .order_by(total_requests_col.desc())
+            )).all()
+
+            total_requests = sum(row.requests for row in endpoint_stats)
+            error_requests = sum(row.errors for row in endpoint_stats)
             
             return {
                 "status": "success",
@@ -325,10 +439,87 @@ async def api_performance():
                         "endpoint": endpoint,
                         "requests": requests,
                         "avg_response_time_ms": round(avg_time or 0, 2),
-                        "unique_users": unique
+                        "errors": errors
                     }
-                    for endpoint, requests, avg_time, unique in endpoint_stats
+                    for endpoint, requests, avg_time, errors in endpoint_stats
                 ]
             }
     except Exception as e:
-        raise HTTPException(500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(500, detail=str(e))
+
+
+@router.get('/api/usage')
+async def api_usage_rows(endpoint: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    Raw api_usage rows, oldest first, one page at a time
+    Pass the returned next_cursor as `cursor` for the following page (null on the last one)
+    """
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    limit = clamp_limit(limit, settings.HISTORY_PAGE_SIZE, settings.HISTORY_MAX_PAGE_SIZE)
+
+    try:
+        async with get_async_db() as db:
+            rows, next_cursor = await db.run_sync(crud.get_api_usage_page, limit, position, endpoint)
+        return {
+            "status": "success",
+            "rows": [row.to_dict() for row in rows],
+            "next_cursor": next_cursor
+        }
+    except Exception as e:
+        raise HTTPException(500, detail=str(e))
+
+
+@router.get('/export/{table}', dependencies=[Depends(require_admin)])
+async def export_table(table: str, format: str = "ndjson", since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, key: Optional[str] = None, cursor: Optional[str] = None):
+    """
+    Stream raw rows for offline analysis (NDJSON or CSV), oldest first
+    Admin only: these are per-visitor and per-query rows, not aggregates
+
+    Query params:
+    - table: visitors, api_usage or chat_queries
+    - since / until: timestamp range (inclusive / exclusive)
+    - key: only one page (visitors), endpoint (api_usage) or session_id (chat_queries)
+    - cursor: resume after a row (as returned by the paginated endpoints)
+    """
+    if table not in EXPORT_TABLES:
+        raise HTTPException(404, detail=f"Unknown table, exportable: {', '.join(EXPORT_TABLES)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    try:
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+
+    stmt = export_statement(table, since=since, until=until, key=key, position=position)
+    return StreamingResponse(
+        iter_export(stmt, format, settings.EXPORT_BATCH_ROWS),
+        media_type=EXPORT_FORMATS[format],
+        headers=export_headers(table, format),
+    )
+
+
+@router.get('/ingest/stats')
+async def ingest_stats():
+    """Get analytics ingestion buffer counters (queued, written, dropped)"""
+    return {
+        "status": "success",
+        "buffer": analytics_buffer.stats()
+    }
+
+
+@router.get('/cache/stats')
+async def cache_stats():
+    """Get analytics response cache counters (hits, misses, coalesced)"""
+    return {
+        "status": "success",
+        "cache": analytics_cache.stats(),
+        "ttl_seconds": {
+            name: _cache_ttl(name)
+            for name in ("summary", "visitors_trend", "pages_views", "projects_popular",
+                         "chatbot_stats", "email_stats", "api_performance")
+        }
+    }
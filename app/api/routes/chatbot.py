@@ -3,10 +3,26 @@ GraphRAG Chatbot API Routes
 Handles PDF upload, processing, and querying
 """
 from fastapi import APIRouter, UploadFile, File, HTTPException, Body, Request
-from fastapi.responses import JSONResponse
-from app.database.models import ChatSession, ChatQuery
-from app.database.connection import get_db
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.database import crud
+from app.database.connection import get_async_db
+from app.database.export import EXPORT_FORMATS, export_headers, export_statement, iter_export
+from app.database.writer import run_write
 from app.config import settings
+from app.utils.uploads import stream_upload
+from app.core.document_cache import document_cache
+from app.utils.session import session_store
+from app.utils.pagination import clamp_limit, decode_cursor
+from app.core.ingestion import QueueFull, ingestion_queue
+from app.core.graphrag import GraphRAG
+from app.core.answer_cache import CachedAnswer, answer_cache
+from app.core.llm import llm_client
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Optional
+import anyio
+import asyncio
+import json
+import re
 import uuid
 import time
 import hashlib
@@ -14,12 +30,56 @@ from datetime import datetime
 
 router = APIRouter()
 
-chat_sessions = {}
+
+def _load_session_document(session_id: str, meta: dict):
+    """Rebuild a session's GraphRAG handle in a worker that didn't create it"""
+    sha256 = meta.get('sha256')
+    document = document_cache.get(sha256) if sha256 else None
+    if document is None or not GraphRAG.exists(document.path):
+        return None
+    return GraphRAG.load(document.path)
+
+
+session_store.set_loader(_load_session_document)
+
+async def _publish_document(job: dict, document):
+    """Ingestion finished: mark the session ready and make its GraphRAG handle resident"""
+    try:
+        await run_in_threadpool(
+            session_store.update_meta,
+            job['session_id'],
+            status='ready',
+            pages=document.metadata.get("pages", 0),
+            chunks=document.metadata.get("chunks", 0),
+        )
+    except KeyError:
+        # The session was deleted (or expired) while its document was processing
+        return
+    # Arrays are memory-mapped from the cache entry, not loaded into the heap
+    graph_rag = await run_in_threadpool(GraphRAG.load, document.path)
+    await run_in_threadpool(session_store.attach, job['session_id'], graph_rag)
+
+
+async def _publish_failure(job: dict, error: str):
+    try:
+        await run_in_threadpool(session_store.update_meta, job['session_id'], status='failed', error=error)
+    except KeyError:
+        pass
+
+
+ingestion_queue.on_complete = _publish_document
+ingestion_queue.on_failure = _publish_failure
+
 
 @router.post("/upload")
 async def upload_pdf(request: Request, file: UploadFile=File(...)):
     """
-    Upload and process PDF for chatbot
+    Upload a PDF for the chatbot
+
+    The file is streamed to UPLOAD_DIR in chunks (413 once it passes
+    MAX_UPLOAD_SIZE_MB) and never held in memory as a whole. Processing runs
+    in the background: the response (202) carries the session_id and a job_id
+    to poll at /jobs/{job_id}. Documents processed before are ready at once (200)
 
     Returns session__id for subsequent queries
     """
@@ -29,52 +89,198 @@ async def upload_pdf(request: Request, file: UploadFile=File(...)):
         if not file.filename.endswith(".pdf"):
             raise HTTPException(400, detail="Only PDF files aer accepted at the moment.")
         
-        content = await file.read()
-        file_size_mb = len(content) /(1024*1024)
+        stored = await stream_upload(
+            file,
+            directory=settings.UPLOAD_DIR,
+            max_bytes=settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024,
+            chunk_size=settings.UPLOAD_CHUNK_SIZE_KB * 1024,
+        )
 
-        if file_size_mb > settings.MAX_UPLOAD_SIZE_MB:
-            raise HTTPException(400, detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE_MB}MB")
-        
-        session_id = str(uuid.uuid4())
+        # Identical bytes were processed before: reuse the artifacts, the upload is not needed
+        document = await run_in_threadpool(document_cache.get, stored.sha256)
+        ready = document is not None
+        if ready:
+            stored.remove()
+        else:
+            stored.persist(settings.UPLOAD_DIR)
 
-        # TODO: Process PDF with your GraphRAG system
-        # from app.core.graphrag import GraphRAG
-        # graph_rag = GraphRAG()
-        # documents = process_pdf(content)
-        # graph_rag.build_knowledge_graph(documents)
-        # chat_sessions[session_id] = {'graph_rag': graph_rag, 'filename': file.filename}
-        
-        # For now, just store filename
+        session_id = str(uuid.uuid4())
+        job_id = str(uuid.uuid4())
+        job_args = (job_id, session_id, stored.sha256, file.filename, str(stored.path), stored.size_bytes)
 
-        chat_sessions[session_id] = {
-            'filename' : file.filename,
-            'uploaded_at': datetime.now(datetime.timezone.utc)
-        }
-        ip = request.client.host
+        await run_in_threadpool(
+            session_store.create,
+            session_id,
+            {
+                'filename' : file.filename,
+                'path': str(stored.path),
+                'sha256': stored.sha256,
+                'job_id': job_id,
+                'status': 'ready' if ready else 'processing',
+                'uploaded_at': datetime.utcnow().isoformat()
+            },
+            # Arrays are memory-mapped from the cache entry, not loaded into the heap
+            await run_in_threadpool(GraphRAG.load, document.path) if ready else None
+        )
+        ip = request.client.host if request.client else "unknown"
         ip_hash = hashlib.sha256(ip.encode()).hexdigest()
 
-        with get_db() as db:
-            session = ChatSession(
-                session_id = session_id,
-                pdf_filename = file.filename,
-                file_size_bytes=len(content),
-                ip_hash=ip_hash,
-                user_agent=request.header.get('user-agent', '')[:500]
-            )
-            db.add(session)
+        await run_write(
+            crud.create_chat_session,
+            session_id,
+            file.filename,
+            file_size_bytes=stored.size_bytes,
+            ip_hash=ip_hash,
+            user_agent=request.headers.get('user-agent', '')[:500]
+        )
 
-        return {
-            "status":"success",
+        try:
+            if ready:
+                job = await run_in_threadpool(ingestion_queue.record_done, *job_args)
+            else:
+                job = await run_in_threadpool(ingestion_queue.submit, *job_args)
+                ingestion_queue.notify()
+        except QueueFull as e:
+            await run_in_threadpool(session_store.delete, session_id)
+            await run_write(crud.delete_chat_session, session_id)
+            # The same bytes may be waiting in another session's job
+            if not await run_in_threadpool(ingestion_queue.file_in_use, str(stored.path)):
+                stored.remove()
+            raise HTTPException(503, detail=f"Too many documents are being processed, try again later ({e})",
+                                headers={"Retry-After": str(int(settings.INGEST_POLL_SECONDS) or 1)})
+
+        body = {
+            "status": "success" if ready else "processing",
             "session_id": session_id,
+            "job_id": job_id,
+            "job": job,
+            "status_url": str(request.url_for("get_ingestion_job", job_id=job_id)),
             "filename": file.filename,
-            "message": "PDF uploaded and processed successfully!"
+            "sha256": stored.sha256,
+            "cached": ready,
         }
+        if ready:
+            body.update({
+                "pages": document.metadata.get("pages", 0),
+                "chunks": document.metadata.get("chunks", 0),
+                "message": "PDF uploaded and processed successfully!"
+            })
+            return body
+        body["message"] = "PDF uploaded, processing in the background"
+        return JSONResponse(body, status_code=202)
     
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, detail=f"Error processing PDF: {str(e)}")
+
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """
+    Processing status of an uploaded PDF
+    stage: queued, extracting, indexing, caching, ready (or failed); progress: 0-100
+    """
+    job = await run_in_threadpool(ingestion_queue.get, job_id)
+    if job is None:
+        raise HTTPException(404, detail="Job not found")
+    return {"status": "success", "job": job}
+
     
+async def _resolve_query(payload: dict):
+    """Validate a query payload and resolve its session -> (query, session_id, session, graph_rag)"""
+    query = payload.get("query")
+    session_id = payload.get("session_id")
+
+    if not query:
+        raise HTTPException(400, detail="Query is required!")
+    if not session_id:
+        raise HTTPException(400, detail="Session ID is required!")
+    
+    chat_session = await run_in_threadpool(session_store.get, session_id)
+    if chat_session is None:
+        raise HTTPException(404, detail="Session not found. Please upload a PDF first.")
+
+    graph_rag = chat_session.obj
+    if graph_rag is None:
+        status = chat_session.meta.get('status', 'ready')
+        if status == 'processing':
+            job = await run_in_threadpool(ingestion_queue.get, chat_session.meta['job_id'])
+            raise HTTPException(
+                409,
+                detail={
+                    "message": "The PDF is still being processed. Poll the job and retry once it is ready.",
+                    "job": job,
+                },
+                headers={"Retry-After": "2"},
+            )
+        if status == 'failed':
+            raise HTTPException(409, detail=f"Processing the PDF failed: {chat_session.meta.get('error')}. Please upload it again.")
+        raise HTTPException(409, detail="Session document is not available. Please upload the PDF again.")
+    return query, session_id, chat_session, graph_rag
+
+
+ANSWER_SYSTEM_PROMPT = (
+    "You answer questions about a PDF using only the numbered excerpts provided. "
+    "Cite excerpts as [n]. If the excerpts do not contain the answer, say so."
+)
+
+
+def _answer_messages(query: str, sources: list, filename: str) -> list:
+    excerpts = "\n\n".join(
+        f"[{n}] (pages {s['page_start']}-{s['page_end']}) {s['text']}" for n, s in enumerate(sources, 1)
+    )
+    return [
+        {"role": "system", "content": ANSWER_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Document: {filename}\n\nExcerpts:\n{excerpts}\n\nQuestion: {query}"},
+    ]
+
+
+async def _generate_answer(query: str, sources: list, filename: str) -> AsyncIterator[str]:
+    """Yield the answer in pieces as they are produced"""
+    if llm_client.configured:
+        async for piece in llm_client.stream(_answer_messages(query, sources, filename)):
+            yield piece
+        return
+
+    # No provider key: placeholder answer
+    response_text = (
+        f"This is a placehoder response for your query: '{query}'."
+        f"Integrate your GraphRAG system here to get actual answers form the PDF: "
+        f"{filename}"
+    )
+    for piece in re.findall(r"\S+\s*", response_text):
+        yield piece
+        await asyncio.sleep(0)
+
+
+async def _record_query(session_id: str, query: str, response_text: str, response_time_ms: float,
+                        ttft_ms: Optional[float], cache_hit: bool = False, time_saved_ms: Optional[float] = None,
+                        error_message: Optional[str] = None):
+    await run_write(crud.record_query, session_id, query, response_text, response_time_ms, ttft_ms,
+                    cache_hit=cache_hit, time_saved_ms=time_saved_ms, error_message=error_message)
+
+
+def _lookup_answer(chat_session, graph_rag, query: str, start_time: float):
+    """Answer-cache lookup -> (CachedAnswer, match kind, time saved ms) or (None, None, None)"""
+    cached = answer_cache.lookup(chat_session.meta['sha256'], graph_rag.version, query)
+    if cached is None:
+        return None, None, None
+    answer, match = cached
+    time_saved_ms = max(answer.response_time_ms - (time.time() - start_time)*1000, 0.0)
+    answer_cache.record_saving(time_saved_ms)
+    return answer, match, time_saved_ms
+
+
+def _store_answer(chat_session, graph_rag, query: str, response_text: str, sources: list, response_time_ms: float):
+    answer_cache.store(chat_session.meta['sha256'], graph_rag.version, query, CachedAnswer(
+        query=query,
+        answer=response_text,
+        sources=sources,
+        response_time_ms=response_time_ms,
+    ))
+
+
 @router.post('/qeury')
 async def query_pdf(payload: dict=Body(...)):
     """
@@ -86,51 +292,37 @@ async def query_pdf(payload: dict=Body(...)):
     }
     """
 
+    query, session_id = payload.get("query"), payload.get("session_id")
     try:
-        query = payload.get("query")
-        session_id = payload.get("session_id")
-
-        if not query:
-            raise HTTPException(400, detail="Query is required!")
-        if not session_id:
-            raise HTTPException(400, detail="Session ID is required!")
-        
-        if session_id not in chat_sessions:
-            raise HTTPException(404, detail="Session not found. Please upload a PDF first.")
+        query, session_id, chat_session, graph_rag = await _resolve_query(payload)
         
         start_time = time.time()
 
-        # TODO: Query your GraphRAG system
-        # graph_rag = chat_sessions[session_id]['graph_rag']
-        # response_text = graph_rag.query(query)
-
-        # Placehoder
-        response_text = (
-            f"This is a placehoder response for your query: '{query}'."
-            f"Integrate your GraphRAG system here to get actual answers form the PDF: "
-            f"{chat_sessions[session_id]['filename']}"
-        )
+        # Same (or near-identical) question about the same document: skip retrieval + generation
+        answer, match, time_saved_ms = _lookup_answer(chat_session, graph_rag, query, start_time)
 
-        response_time_ms = (time.time() - start_time)*1000
-
-        with get_db() as db:
-            chat_query = ChatQuery(
-                session_id = session_id,
-                query=query,
-                response=response_text,
-                response_time_ms=response_time_ms,
-                error=False
-            )
-            db.add(chat_query)
+        if answer is not None:
+            response_text, sources = answer.answer, answer.sources
+            response_time_ms = (time.time() - start_time)*1000
+        else:
+            retrieved = await run_in_threadpool(graph_rag.retrieve, query)
+            sources = [source.to_dict() for source in retrieved]
+            response_text = "".join([
+                piece async for piece in _generate_answer(query, sources, chat_session.meta['filename'])
+            ])
+            response_time_ms = (time.time() - start_time)*1000
+            _store_answer(chat_session, graph_rag, query, response_text, sources, response_time_ms)
 
-            db_session = db.query(ChatSession).filter_by(session_id=session_id).first()
-            if db_session:
-                db_session.update_stats(response_time_ms)
+        # Nothing is sent before the whole answer exists
+        await _record_query(session_id, query, response_text, response_time_ms, response_time_ms,
+                            cache_hit=answer is not None, time_saved_ms=time_saved_ms)
 
         return {
             "status": "success",
             "response": response_text,
             "response_time_ms": round(response_time_ms,2),
+            "sources": sources,
+            "cached": match,
             "session_id": session_id
         }
     
@@ -139,64 +331,210 @@ async def query_pdf(payload: dict=Body(...)):
     except Exception as e:
         # Log error to database
         try:
-            with get_db() as db:
-                chat_query = ChatQuery(
-                    session_id=session_id,
-                    query=query,
-                    response="",
-                    response_time_ms=0,
-                    error=True,
-                    error_message=str(e)
-                )
-                db.add(chat_query)
+            await _record_query(session_id, query, "", 0, None, error_message=str(e))
         except:
             pass
 
         raise HTTPException(500, detail=f"Error processing query: {str(e)}")
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post('/query/stream')
+async def query_pdf_stream(payload: dict=Body(...)):
+    """
+    Query the uploaded PDF, streaming the answer as server-sent events
+    Same request body as /qeury. Events:
+        sources   retrieved chunks (sent once retrieval is done)
+        token     {"text": ...} answer pieces, several coalesced when the client is slow
+        done      {"response_time_ms", "ttft_ms", "cached"}
+        error     {"detail"}
+    A comment line is sent every SSE_HEARTBEAT_SECONDS while nothing else is
+    """
+
+    query, session_id, chat_session, graph_rag = await _resolve_query(payload)
+    start_time = time.time()
+
+    async def event_stream():
+        ttft_ms = None
+        pieces = []
+        completed = False
+        error_message = None
+        producer = None
+
+        answer, match, time_saved_ms = _lookup_answer(chat_session, graph_rag, query, start_time)
+        try:
+            if answer is not None:
+                sources = answer.sources
+                yield _sse("sources", {"sources": sources})
+                ttft_ms = (time.time() - start_time)*1000
+                pieces.append(answer.answer)
+                yield _sse("token", {"text": answer.answer})
+            else:
+                retrieved = await run_in_threadpool(graph_rag.retrieve, query)
+                sources = [source.to_dict() for source in retrieved]
+                yield _sse("sources", {"sources": sources})
+
+                # Bounded hand-off: generation pauses while the client is not reading
+                queue: asyncio.Queue = asyncio.Queue(maxsize=settings.SSE_QUEUE_MAX_CHUNKS)
+
+                async def produce():
+                    try:
+                        async for piece in _generate_answer(query, sources, chat_session.meta['filename']):
+                            await queue.put(piece)
+                    except Exception:
+                        await queue.put(None)
+                        raise
+                    await queue.put(None)
+
+                producer = asyncio.create_task(produce())
+                finished = False
+                while not finished:
+                    try:
+                        piece = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keep-alive\n\n"
+                        continue
+                    batch = []
+                    # Coalesce whatever piled up while the last event was being sent
+                    while piece is not None:
+                        batch.append(piece)
+                        if queue.empty():
+                            break
+                        piece = queue.get_nowait()
+                    finished = piece is None
+                    if batch:
+                        if ttft_ms is None:
+                            ttft_ms = (time.time() - start_time)*1000
+                        pieces.extend(batch)
+                        yield _sse("token", {"text": "".join(batch)})
+                # Surface generation errors
+                await producer
+
+            response_time_ms = (time.time() - start_time)*1000
+            completed = True
+            yield _sse("done", {
+                "response_time_ms": round(response_time_ms, 2),
+                "ttft_ms": round(ttft_ms, 2) if ttft_ms is not None else None,
+                "cached": match,
+                "session_id": session_id
+            })
+        except Exception as e:
+            error_message = str(e)
+            yield _sse("error", {"detail": f"Error processing query: {error_message}"})
+        finally:
+            if producer is not None and not producer.done():
+                producer.cancel()
+            response_text = "".join(pieces)
+            response_time_ms = (time.time() - start_time)*1000
+            if completed and answer is None:
+                _store_answer(chat_session, graph_rag, query, response_text, sources, response_time_ms)
+            if not completed and error_message is None:
+                error_message = "Client disconnected"
+            try:
+                # The stream may be finishing because the client went away (task
+                # cancelled): the write still has to complete
+                with anyio.CancelScope(shield=True):
+                    await _record_query(session_id, query, response_text, response_time_ms, ttft_ms,
+                                        cache_hit=answer is not None, time_saved_ms=time_saved_ms,
+                                        error_message=error_message)
+            except Exception:
+                pass
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
     
 
 @router.get("/session/{session_id}")
-async def get_session_history(session_id: str):
-    """Get chat history for a session"""
+async def get_session_history(session_id: str, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    Get chat history for a session, oldest first, one page at a time
+    Pass the returned next_cursor as `cursor` for the following page (null on the last one)
+    """
 
     try:
-        with get_db() as db:
-            # Get session info
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    limit = clamp_limit(limit, settings.HISTORY_PAGE_SIZE, settings.HISTORY_MAX_PAGE_SIZE)
 
-            session = db.query(ChatSession).filter_by(session_id=session_id).first()
+    try:
+        async with get_async_db() as db:
+            session, queries, next_cursor = await db.run_sync(crud.get_session_history, session_id, limit, position)
             if not session:
                 raise HTTPException(404, detail="Session not found")
             
-            queries = db.query(ChatQuery)\
-                .filter_by(session_id=session_id)\
-                .order_by(ChatQuery.timestamp.asc())\
-                .all()
-            
             return {
                 "session": session.to_dict(),
-                "queries": [q.to_dict() for q in queries]
+                "queries": [q.to_dict() for q in queries],
+                "next_cursor": next_cursor
             }
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(500, detail=str(e))
-    
+
+
+@router.get("/session/{session_id}/export")
+async def export_session_history(session_id: str, format: str = "ndjson"):
+    """Stream a session's whole query log as NDJSON or CSV"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    async with get_async_db() as db:
+        session = await db.run_sync(crud.get_chat_session, session_id)
+    if session is None:
+        raise HTTPException(404, detail="Session not found")
+    stmt = export_statement("chat_queries", key=session_id)
+    return StreamingResponse(
+        iter_export(stmt, format, settings.EXPORT_BATCH_ROWS),
+        media_type=EXPORT_FORMATS[format],
+        headers=export_headers(f"chat-{session_id}", format),
+    )
+
 @router.delete("/session/{session_id}")
 async def delete_session(session_id: str):
-    """Delete a chat session and its history"""
+    """Delete a chat session and its history (and its upload, unless a job still needs the file)"""
     try:
-        if session_id in chat_sessions:
-            del chat_sessions[session_id]
-
-        with get_db() as db:
-            db.query(ChatQuery).filter_by(session_id=session_id).delete()
+        await run_in_threadpool(session_store.delete, session_id)
 
-            db.query(ChatSession).filter_by(session_id=session_id).delete()
+        await run_write(crud.delete_chat_session, session_id)
 
-            db.query(ChatSession).filter_by(session_id=session_id).delete()
+        upload = await run_in_threadpool(ingestion_queue.upload_for_session, session_id)
+        if upload:
+            await run_in_threadpool(ingestion_queue.discard_upload, upload)
 
         return {"status": "success", "message": "Session deleted"}
     except Exception as e:
         raise HTTPException(500, detail=str(e))
-        
\ No newline at end of file
+
+
+@router.get("/llm/stats")
+async def llm_client_stats():
+    """Get LLM client counters (requests, retries, failures, tokens, requests in flight)"""
+    return {"status": "success", "llm": llm_client.stats()}
+
+
+@router.get("/cache/stats")
+async def document_cache_stats():
+    """Get processed-document and answer cache counters"""
+    return {
+        "status": "success",
+        "cache": document_cache.stats(),
+        "answers": answer_cache.stats()
+    }
+
+
+@router.get("/sessions/stats")
+async def session_store_stats():
+    """Get session store counters (resident sessions, memory, evictions) and ingestion queue counters"""
+    return {
+        "status": "success",
+        "sessions": await run_in_threadpool(session_store.stats),
+        "ingestion": await run_in_threadpool(ingestion_queue.stats)
+    }
@@ -1,8 +1,8 @@
 """Contact Form Routes"""
 from fastapi import APIRouter, Request, Body, HTTPException
 from fastapi.responses import JSONResponse
-from app.database.models import ContactMessage
-from app.database.connection import get_db
+from app.database import crud
+from app.database.writer import run_write
 from app.config import settings
 import hashlib
 import requests
@@ -12,11 +12,10 @@ router = APIRouter()
 
 @router.post("/message")
 async def submit_contact(request: Request, payload: dict = Body(...)):
-    with get_db() as db:
-        msg = ContactMessage(
-            name=payload['name'],
-            email=payload['email'],
-            message=payload['message']
-        )
-        db.add(msg)
+    await run_write(
+        crud.create_contact_message,
+        name=payload['name'],
+        email=payload['email'],
+        message=payload['message']
+    )
     return {"status": "success"}
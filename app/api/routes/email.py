@@ -1,8 +1,58 @@
 """Email Generator Routes"""
-from fastapi import APIRouter
+from fastapi import APIRouter, Body, HTTPException, Request
+from app.database import crud
+from app.database.writer import run_write
+from app.core.email_generator import email_generator
+from app.core.llm import LLMError
+import hashlib
 
 router = APIRouter()
 
 @router.post("/generate")
-async def generate_email():
-    return {"message": "Email generation - implement your logic here"}
+async def generate_email(request: Request, payload: dict = Body(...)):
+    """
+    Generate a cold email for a job posting
+    Body: job_description and resume_text (required), job_url, job_title,
+    company_name, resume_filename. Repeats are answered from the response cache
+    """
+    job_text = (payload.get('job_description') or '').strip()
+    resume_text = (payload.get('resume_text') or '').strip()
+    if not job_text or not resume_text:
+        raise HTTPException(400, detail="job_description and resume_text are required")
+    if not email_generator.configured:
+        raise HTTPException(503, detail="No LLM provider configured")
+
+    ip = request.client.host if request.client else "unknown"
+    record = {
+        "job_url": payload.get('job_url'),
+        "job_title": payload.get('job_title'),
+        "company_name": payload.get('company_name') or "",
+        "resume_filename": payload.get('resume_filename'),
+        "ip_hash": hashlib.sha256(ip.encode()).hexdigest(),
+        "user_agent": request.headers.get('user-agent', '')[:500],
+    }
+
+    try:
+        generated = await email_generator.generate(job_text, resume_text)
+    except LLMError as e:
+        await run_write(crud.record_email_generation, generated_email=None, generation_time_ms=0.0,
+                        error_message=str(e), **record)
+        raise HTTPException(502, detail=f"Email generation failed: {e}")
+
+    await run_write(crud.record_email_generation, generated_email=generated.email,
+                    generation_time_ms=generated.generation_time_ms, cache_hit=generated.cache_hit,
+                    time_saved_ms=generated.time_saved_ms, **record)
+    return {
+        "status": "success",
+        "email": generated.email,
+        "model": generated.model,
+        "cache_hit": generated.cache_hit,
+        "generation_time_ms": round(generated.generation_time_ms, 2),
+        "time_saved_ms": round(generated.time_saved_ms, 2) if generated.time_saved_ms is not None else None
+    }
+
+
+@router.get("/cache/stats")
+async def email_cache_stats():
+    """Get email response cache counters (hits, entries, bytes on disk, evictions)"""
+    return {"status": "success", "generator": email_generator.stats()}
@@ -2,12 +2,28 @@ from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
+from app.config import settings
+from app.utils.assets import asset_manifest, install_url_for
+from app.utils.page_cache import PageCache
 
 router = APIRouter()
 
+TEMPLATES_DIR = Path(__file__).parent.parent.parent.parent / "templates"
+
 # Setup Jinja2 templates
 templates = Jinja2Templates(
-    directory=str(Path(__file__).parent.parent.parent.parent / "templates")
+    directory=str(TEMPLATES_DIR)
+)
+# url_for(...) -> host-relative URLs; fingerprinted asset names after `python -m app.utils.assets build`
+install_url_for(templates, asset_manifest)
+
+# Rendered once per page; re-rendered on template edits in development
+page_cache = PageCache(
+    templates,
+    TEMPLATES_DIR,
+    watch=settings.is_development,
+    enabled=settings.PAGE_CACHE_ENABLED,
+    assets_mtime=asset_manifest.mtime,
 )
 
 # ==========================================
@@ -17,18 +33,12 @@ templates = Jinja2Templates(
 @router.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Homepage - renders pages/home.html which extends base.html"""
-    return templates.TemplateResponse(
-        "pages/home.html",  # ← Changed from index.html
-        {"request": request}
-    )
+    return await page_cache.response(request, "pages/home.html")
 
 @router.get("/portfolio", response_class=HTMLResponse)
 async def portfolio(request: Request):
     """Portfolio page"""
-    return templates.TemplateResponse(
-        "pages/portfolio.html",
-        {"request": request}
-    )
+    return await page_cache.response(request, "pages/portfolio.html")
 
 # ==========================================
 # PROJECT PAGES
@@ -37,39 +47,24 @@ async def portfolio(request: Request):
 @router.get("/cancer-prediction", response_class=HTMLResponse)
 async def cancer_prediction(request: Request):
     """Cancer Prediction project"""
-    return templates.TemplateResponse(
-        "pages/project-details/cancer-prediction.html",
-        {"request": request}
-    )
+    return await page_cache.response(request, "pages/project-details/cancer-prediction.html")
 
 @router.get("/cold-email-intro", response_class=HTMLResponse)
 async def cold_email(request: Request):
     """Cold Email project"""
-    return templates.TemplateResponse(
-        "pages/project-details/cold-email_intro.html",
-        {"request": request}
-    )
+    return await page_cache.response(request, "pages/project-details/cold-email_intro.html")
 
 @router.get("/cold-email", response_class=HTMLResponse)
 async def cold_email(request: Request):
     """Cold Email project"""
-    return templates.TemplateResponse(
-        "pages/project-details/cold-email.html",
-        {"request": request}
-    )
+    return await page_cache.response(request, "pages/project-details/cold-email.html")
 
 @router.get("/hand-gesture-detection", response_class=HTMLResponse)
 async def hand_gesture_detection(request: Request):
     """Hand Gesture Detection project"""
-    return templates.TemplateResponse(
-        "pages/project-details/hand-gesture-detection.html",
-        {"request": request}
-    )
+    return await page_cache.response(request, "pages/project-details/hand-gesture-detection.html")
 
 @router.get("/graphrag-chatbot", response_class=HTMLResponse)
 async def graphrag_chatbot(request: Request):
     """GraphRAG ChatBot project"""
-    return templates.TemplateResponse(
-        "pages/project-details/graphrag-chatbot.html",
-        {"request": request}
-    )
\ No newline at end of file
+    return await page_cache.response(request, "pages/project-details/graphrag-chatbot.html")
\ No newline at end of file
@@ -2,28 +2,80 @@
 Main FastAPI Application
 """
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pathlib import Path
+from contextlib import asynccontextmanager
 from app.config import settings
-# from app.database.connection import init_db
+from app.database.connection import init_db, async_engine
+from app.database.analytics_buffer import analytics_buffer
+from app.database.writer import stop_writer
+from app.database.retention import retention_loop
+from app.utils.assets import StaticAssets, asset_manifest
 # from app.api.routes import pages
-from app.api.routes import pages, chatbot, email, contact, analytics
-from app.api.middleware.analytics import AnalyticsMiddleware
-from app.api.middleware.security import SecurityHeadersMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.datastructures import Headers
+from app.api.routes import pages, analytics
+from app.api.lazy import include_lazy_router, warm_up
+from app.api.middleware.compression import CompressionMiddleware
+from app.api.middleware.pipeline import RequestPipelineMiddleware
+from app.api.middleware.rate_limit import RateLimitMiddleware
+import asyncio
+import importlib
+import sys
 
-class ProxyHeadersMiddleware(BaseHTTPMiddleware):
-    """Middleware to handle X-Forwarded-Proto header for HTTPS"""
-    async def dispatch(self, request, call_next):
-        # Check if request came through HTTPS proxy
-        forwarded_proto = request.headers.get("x-forwarded-proto")
-        if forwarded_proto:
-            request.scope["scheme"] = forwarded_proto
-        
-        response = await call_next(request)
-        return response
+
+async def start_ingestion():
+    """Chatbot subsystem startup: picks up jobs left queued (or interrupted) by a previous run"""
+    from app.core.ingestion import ingestion_queue
+    await ingestion_queue.start()
+
+
+async def stop_chatbot():
+    """Chatbot subsystem shutdown, if it was ever loaded"""
+    ingestion = sys.modules.get("app.core.ingestion")
+    if ingestion is not None:
+        await ingestion.ingestion_queue.stop()
+    processor = sys.modules.get("app.core.document_processor")
+    if processor is not None:
+        processor.shutdown_executor()
+    llm = sys.modules.get("app.core.llm")
+    if llm is not None:
+        await llm.llm_client.aclose()
+
+
+# module, prefix, tags, on_load; imported on first request when LAZY_ROUTERS is set
+HEAVY_ROUTERS = [
+    ("app.api.routes.chatbot", "/api/v1/chatbot", ["Chatbot"], start_ingestion),
+    ("app.api.routes.email", "/api/v1/email", ["Email"], None),
+    ("app.api.routes.contact", "/api/v1/contact", ["Contact"], None),
+]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup / shutdown hooks"""
+    settings.warn_missing_settings()
+    init_db()
+    await analytics_buffer.start()
+    if settings.LAZY_ROUTERS:
+        # Runs once the server is listening: the first requests don't pay for the imports
+        warmup = asyncio.create_task(warm_up(app, settings.WARMUP_DELAY_SECONDS), name="router-warm-up")
+    else:
+        warmup = None
+        await start_ingestion()
+    retention = (
+        asyncio.create_task(retention_loop(settings.RETENTION_INTERVAL_HOURS), name="analytics-retention")
+        if settings.RETENTION_INTERVAL_HOURS > 0 else None
+    )
+    print(f"🚀 {settings.PROJECT_NAME} started!")
+    yield
+    for task in (warmup, retention):
+        if task is not None:
+            task.cancel()
+    await stop_chatbot()
+    # Drain queued analytics events before the process exits
+    await analytics_buffer.stop()
+    # After the buffer: its last batches go through the writer
+    stop_writer()
+    await async_engine.dispose()
 
 def create_app() -> FastAPI:
     """Application factory"""
@@ -31,9 +83,9 @@ def create_app() -> FastAPI:
         title=settings.PROJECT_NAME,
         version="1.0.0",
         docs_url="/api/docs" if settings.DEBUG else None,
+        lifespan=lifespan,
     )
     
-    app.add_middleware(ProxyHeadersMiddleware)
     # CORS
     app.add_middleware(
         CORSMiddleware,
@@ -43,28 +95,37 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
-    # Custom Middleware
-    # app.add_middleware(AnalyticsMiddleware)
-    app.add_middleware(SecurityHeadersMiddleware)
+    # Response compression (JSON, HTML, streamed exports)
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+        )
+
+    # Per-client token buckets on the API (inside the pipeline: 429s get security headers and analytics)
+    if settings.RATE_LIMIT_ENABLED:
+        app.add_middleware(RateLimitMiddleware)
+
+    # Custom Middleware (proxy scheme, security headers, timing, analytics)
+    app.add_middleware(RequestPipelineMiddleware)
     
     # Static Files
     app.mount(
         "/static",
-        StaticFiles(directory=Path(__file__).parent.parent / "static"),
+        StaticAssets(directory=Path(__file__).parent.parent / "static", manifest=asset_manifest),
         name="static"
     )
     
     # # Routes
     app.include_router(pages.router, tags=["Pages"])
-    app.include_router(chatbot.router, prefix="/api/v1/chatbot", tags=["Chatbot"])
-    app.include_router(email.router, prefix="/api/v1/email", tags=["Email"])
-    app.include_router(contact.router, prefix="/api/v1/contact", tags=["Contact"])
     app.include_router(analytics.router, prefix="/api/v1/analytics", tags=["Analytics"])
-    
-    # @app.lifespan("startup")
-    # async def startup():
-    #     init_db()
-    #     print(f"🚀 {settings.PROJECT_NAME} started!")
+    for module, prefix, tags, on_load in HEAVY_ROUTERS:
+        if settings.LAZY_ROUTERS:
+            include_lazy_router(app, module, prefix, tags, on_load)
+        else:
+            app.include_router(importlib.import_module(module).router, prefix=prefix, tags=tags)
     
     @app.get("/health")
     async def health():
@@ -4,9 +4,12 @@ Uses Pydantic for type-safe settings
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class Settings(BaseSettings):
     """Application settings"""
@@ -20,8 +23,19 @@ class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite:///./portfolio.db"
 
+    # SQLite file databases: WAL, one group-committing writer, a pool of readers
+    SQLITE_READ_POOL_SIZE: int = 4
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # safe with WAL: only the last commits can be lost on power failure
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_CACHE_SIZE_MB: int = 32
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_WRITE_BATCH: int = 256
+    SQLITE_WRITE_WINDOW_MS: float = 0.0  # extra wait to grow a batch (0: only what is already queued)
+
     # Security
     SECRET_KEY: str = "your-secret-key-change-in-production"
+    # Bearer credential for admin-only routes (raw exports); empty disables them
+    ADMIN_API_KEY: str = ""
     ALLOWED_ORIGINS: List[str] = [
         "http://localhost:8080",
         "http://localhost:3000",
@@ -33,20 +47,128 @@ class Settings(BaseSettings):
 
     WEBHOOK_URL: str= ""
 
+    # LLM client (OpenAI-compatible; "stub" = python -m app.core.llm_stub for offline load tests)
+    LLM_PROVIDER: str = "openai"  # openai | groq | stub
+    LLM_BASE_URL: str = ""  # overrides the provider's URL
+    LLM_MODEL: str = ""  # empty: the provider's default chat model
+    LLM_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_HTTP2: bool = True
+    LLM_TIMEOUT_SECONDS: float = 30.0
+    LLM_LATENCY_BUDGET_SECONDS: float = 20.0  # retries stop once the next attempt would overrun this
+    LLM_MAX_RETRIES: int = 4
+    LLM_BATCH_WINDOW_MS: float = 5.0
+    LLM_BATCH_MAX_INPUTS: int = 256
+
+    # Email generator: LLM responses cached on disk, keyed by job text, resume,
+    # model and template version; least recently used entries go past the cap
+    EMAIL_CACHE_ENABLED: bool = True
+    EMAIL_CACHE_PATH: str = "./data/email_cache.sqlite3"
+    EMAIL_CACHE_MAX_MB: int = 64
+    EMAIL_MAX_TOKENS: int = 600
+
     SESSION_TIMEOUT_MINUTES: int = 30
+    SESSION_INDEX_PATH: str = "./data/sessions.sqlite3"
+    SESSION_MEMORY_CAP_MB: int = 256
+    SESSION_MAX_RESIDENT: int = 64
     MAX_UPLOAD_SIZE_MB: int = 30
+    UPLOAD_CHUNK_SIZE_KB: int = 1024
 
     ENABLES_ANALYTICS: bool = False
     TRACK_RESPONSE_TIME: bool = True
 
+    # Analytics ingestion buffer
+    ANALYTICS_BATCH_SIZE: int = 200
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 2.0
+    ANALYTICS_MAX_PENDING: int = 10000
+
+    # Analytics read cache (seconds per endpoint, 0 disables caching)
+    ANALYTICS_CACHE_DEFAULT_TTL: float = 30.0
+    ANALYTICS_CACHE_TTLS: Dict[str, float] = {
+        "summary": 30.0,
+        "visitors_trend": 300.0,
+        "pages_views": 120.0,
+        "projects_popular": 300.0,
+        "chatbot_stats": 60.0,
+        "email_stats": 60.0,
+        "api_performance": 60.0,
+    }
+    ANALYTICS_CACHE_INVALIDATE_ON_WRITE: bool = False
+    ANALYTICS_CACHE_MAX_ENTRIES: int = 1024
+
     IGNORE_COMPANIES: str= ""
     IGNORE_NAMES: str = ""
 
     RATE_LIMIT_PER_MINUTE: int = 60
+    # Token buckets per client IP and route group (0 per minute: group unlimited)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_UPLOADS_PER_MINUTE: int = 6
+    RATE_LIMIT_LLM_PER_MINUTE: int = 20
+    RATE_LIMIT_BACKEND: str = "memory"  # "sqlite": one bucket table shared by every worker process
+    RATE_LIMIT_DB_PATH: str = "./data/ratelimit.sqlite3"
+    # Proxies in front of the app that append to X-Forwarded-For (Cloud Run: 1); 0 keys on the peer address
+    RATE_LIMIT_TRUSTED_PROXY_HOPS: int = 0
 
     ALLOWED_EXTENSIONS: List[str] = [".pdf", ".txt", ".md"]
     UPLOAD_DIR: str= "./uploads"
 
+    # Processed-document cache (content-addressed by PDF SHA-256)
+    DOCUMENT_CACHE_DIR: str = "./data/document_cache"
+    DOCUMENT_CACHE_MAX_MB: int = 512
+
+    # PDF pipeline (0 workers = one per CPU core)
+    PDF_WORKERS: int = 0
+    PDF_BATCH_PAGES: int = 8
+    CHUNK_SIZE_CHARS: int = 1200
+    CHUNK_OVERLAP_CHARS: int = 200
+
+    # Background PDF ingestion (jobs are persisted in the ingestion_jobs table)
+    INGEST_CONCURRENCY: int = 2
+    INGEST_MAX_QUEUED: int = 100
+    INGEST_POLL_SECONDS: float = 5.0
+    INGEST_HEARTBEAT_SECONDS: float = 1.0
+    INGEST_STALE_SECONDS: float = 60.0
+    INGEST_MAX_ATTEMPTS: int = 3
+
+    # Chatbot answer cache (per document, exact + near-duplicate queries)
+    ANSWER_CACHE_MAX_ENTRIES: int = 256
+    ANSWER_CACHE_MAX_DOCUMENTS: int = 128
+    ANSWER_CACHE_SIMILARITY: float = 0.85  # near hits also need the same numbers, negations and content words
+
+    # Streaming answers (server-sent events)
+    SSE_QUEUE_MAX_CHUNKS: int = 64
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+
+    # Pages router: rendered HTML cached with ETag / Last-Modified and gzip + brotli variants
+    PAGE_CACHE_ENABLED: bool = True
+
+    # On-the-fly gzip / brotli for text responses (see benchmarks/bench_compression.py)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 500
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Keyset-paginated listings and streaming raw exports
+    HISTORY_PAGE_SIZE: int = 100
+    HISTORY_MAX_PAGE_SIZE: int = 1000
+    EXPORT_BATCH_ROWS: int = 2000
+
+    # Raw analytics retention (visitors, api_usage): older rows are archived
+    # to monthly CSV.gz files and downsampled to hourly rollups (0 hours = CLI only)
+    RETENTION_RAW_DAYS: int = 90
+    RETENTION_BATCH_ROWS: int = 5000
+    RETENTION_BATCH_PAUSE_MS: float = 50.0
+    RETENTION_INTERVAL_HOURS: float = 0.0
+    ARCHIVE_DIR: str = "./data/archive"
+
+    # Startup: heavy routers (chatbot, email, contact) import on first request,
+    # or in the background this long after the server starts listening
+    LAZY_ROUTERS: bool = True
+    WARMUP_DELAY_SECONDS: float = 1.0
+    # Cold `create_app()` budget enforced by tests/test_api.py
+    STARTUP_BUDGET_SECONDS: float = 2.0
+
     LOG_LEVEL: str= "INFO"
 
     class config:
@@ -112,11 +234,22 @@ class Settings(BaseSettings):
             errors.append("DEBUG must be False in production!")
 
         if "sqlite" in self.DATABASE_URL:
-            print("⚠️ Warning: Using SQLite in production is not recommended!")
+            logger.warning("Using SQLite in production is not recommended!")
 
         if errors:
             raise ValueError(f"Production configuration erros: \n" + "\n".join(f"- {e}" for e in errors))
         
+    def warn_missing_settings(self):
+        """Log (development only) which optional integrations are unconfigured"""
+        if not self.is_development:
+            return
+        if not self.OPENAI_API_KEY:
+            logger.warning("OPENAI_API_KEY not set (chatbot won't work)")
+        if not self.GROQ_API_KEY:
+            logger.warning("GROQ_API_KEY not set (if using Groq)")
+        if not self.WEBHOOK_URL:
+            logger.warning("WEBHOOK_URL not set (contact form webhook disabled)")
+
     def get_upload_path(self, filename: str) -> str:
         """Get full upload path for a file"""
 
@@ -126,12 +259,3 @@ settings = Settings()
 
 if settings.is_producion:
     settings.validate_production_settings()
-
-if settings.is_development:
-    if not settings.OPENAI_API_KEY:
-        print("⚠️ Warning: OPENAI_API_KEY not set (chatbot won't work)")
-    if not settings.GROQ_API_KEY:
-        print("⚠️ Warning: GROQ_API_KEY not set (if using Groq)")
-    if not settings.WEBHOOK_URL:
-        print("⚠️ Warning: WEBHOOK_URL not set (contact form webhook disabled)")
-    
\ No newline at end of file
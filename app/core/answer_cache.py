@@ -0,0 +1,295 @@
+"""
+Answer Cache
+Per-document cache of chatbot answers
+
+- exact tier: the normalized query (casefolded, punctuation stripped,
+  whitespace collapsed) is the key
+- near-duplicate tier: MinHash signatures over character shingles with
+  LSH banding find earlier queries whose estimated Jaccard similarity is
+  above a threshold ("how does it handle missing values" vs "How does it
+  handle the missing values?"). Shingles cannot tell "2019" from "2020" or
+  "did" from "did not", so a near hit also needs the same query terms:
+  numbers, negations and content words (see query_terms)
+
+Entries are grouped per document and tagged with the document's index
+version; a lookup with a different version drops everything cached for that
+document. Both documents and entries inside a document are LRU-bounded.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+from app.config import settings
+import re
+import threading
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+_PUNCTUATION = re.compile(r"[^\w\s]+", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+# 2^61 - 1: Mersenne prime for the universal hash family
+_PRIME = (1 << 61) - 1
+
+# Words that carry no meaning a cached answer depends on
+STOPWORDS = frozenset("""
+    a an the this that these those of in on at to for from by with about into over as and or
+    is are was were be been being do does did have has had can could would should will shall may might must
+    what whats which who whom whose when where why how i me my we our you your it its they them their
+    he him his she her there here please tell explain describe give show
+""".split())
+# Any of these flips a question; contractions lose their apostrophe in normalize_query
+NEGATIONS = frozenset("""
+    not no never none nor neither nobody nothing nowhere without cannot
+    dont doesnt didnt isnt arent wasnt werent cant couldnt wouldnt shouldnt wont havent hasnt hadnt
+""".split())
+NUMBER_WORDS = frozenset("""
+    zero one two three four five six seven eight nine ten eleven twelve
+    first second third fourth fifth last
+""".split())
+
+
+def normalize_query(query: str) -> str:
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = text.replace("'", "")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def query_terms(key: str) -> Tuple[FrozenSet[str], bool, FrozenSet[str]]:
+    """
+    What a near-duplicate must share with a normalized query:
+    (numbers, negated, content words). Stopwords and word order are free to differ
+    """
+    numbers, content = set(), set()
+    negated = False
+    for token in key.split():
+        if token in NEGATIONS:
+            negated = True
+        elif token in NUMBER_WORDS or any(c.isdigit() for c in token):
+            numbers.add(token)
+        elif token not in STOPWORDS:
+            content.add(token)
+    return frozenset(numbers), negated, frozenset(content)
+
+
+class MinHasher:
+    """MinHash signatures of character shingles, vectorized over all permutations"""
+
+    def __init__(self, num_perm: int = 128, shingle: int = 3, seed: int = 7):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle = shingle
+        self.a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> Set[str]:
+        padded = f" {text} "
+        if len(padded) <= self.shingle:
+            return {padded}
+        return {padded[i:i + self.shingle] for i in range(len(padded) - self.shingle + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in self.shingles(text)),
+            dtype=np.uint64,
+        )
+        # (a * x + b) mod p for every (permutation, shingle) pair; crc32 < 2^32 and
+        # a < 2^61 can overflow uint64, which is fine for hashing (consistent wraparound)
+        permuted = (np.outer(self.a, hashes) + self.b[:, None]) % np.uint64(_PRIME)
+        return permuted.min(axis=1)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of the underlying shingle sets"""
+        return float(np.count_nonzero(a == b)) / len(a)
+
+
+@dataclass
+class CachedAnswer:
+    query: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    response_time_ms: float
+    created_at: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+@dataclass
+class _DocumentAnswers:
+    version: str
+    # normalized query -> (answer, MinHash signature, query_terms)
+    entries: "OrderedDict[str, Tuple[CachedAnswer, np.ndarray, Tuple]]" = field(default_factory=OrderedDict)
+    buckets: Dict[Tuple[int, bytes], Set[str]] = field(default_factory=dict)
+
+
+class AnswerCache:
+    """Thread-safe, process-local answer cache keyed by (document, normalized query)"""
+
+    def __init__(
+        self,
+        max_entries_per_document: int = 256,
+        max_documents: int = 128,
+        similarity: float = 0.85,
+        num_perm: int = 128,
+        bands: int = 32,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.max_entries = max_entries_per_document
+        self.max_documents = max_documents
+        self.threshold = similarity
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm=num_perm)
+        self._documents: "OrderedDict[str, _DocumentAnswers]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {
+            "exact_hits": 0,
+            "near_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "time_saved_ms": 0.0,
+        }
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def lookup(self, document: str, version: str, query: str) -> Optional[Tuple[CachedAnswer, str]]:
+        """
+        Cached answer for `query` against `document` at `version`
+        Returns (answer, "exact" | "near") or None
+        """
+        key = normalize_query(query)
+        if not key:
+            return None
+
+        with self._lock:
+            answers = self._answers(document, version, create=False)
+            if answers is None:
+                self.counters["misses"] += 1
+                return None
+
+            cached = answers.entries.get(key)
+            if cached is not None:
+                answers.entries.move_to_end(key)
+                return self._hit(cached[0], "exact")
+
+        # Signatures are computed outside the lock
+        signature = self.hasher.signature(key)
+        terms = query_terms(key)
+        with self._lock:
+            answers = self._answers(document, version, create=False)
+            if answers is not None:
+                best_key, best_score = None, self.threshold
+                for candidate in self._candidates(answers, signature):
+                    entry = answers.entries.get(candidate)
+                    if entry is None or entry[2] != terms:
+                        continue
+                    score = MinHasher.similarity(signature, entry[1])
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    answers.entries.move_to_end(best_key)
+                    return self._hit(answers.entries[best_key][0], "near")
+            self.counters["misses"] += 1
+            return None
+
+    def store(self, document: str, version: str, query: str, answer: CachedAnswer):
+        key = normalize_query(query)
+        if not key:
+            return
+        signature = self.hasher.signature(key)
+        terms = query_terms(key)
+        with self._lock:
+            answers = self._answers(document, version, create=True)
+            if key in answers.entries:
+                self._unindex(answers, key)
+            answers.entries[key] = (answer, signature, terms)
+            answers.entries.move_to_end(key)
+            for band in self._band_keys(signature):
+                answers.buckets.setdefault(band, set()).add(key)
+            while len(answers.entries) > self.max_entries:
+                oldest = next(iter(answers.entries))
+                self._unindex(answers, oldest)
+                self.counters["evictions"] += 1
+            self.counters["stores"] += 1
+
+    def invalidate(self, document: str):
+        with self._lock:
+            if self._documents.pop(document, None) is not None:
+                self.counters["invalidations"] += 1
+
+    def record_saving(self, time_saved_ms: float):
+        with self._lock:
+            self.counters["time_saved_ms"] += max(time_saved_ms, 0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.counters["exact_hits"] + self.counters["near_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "time_saved_ms": round(self.counters["time_saved_ms"], 2),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "documents": len(self._documents),
+                "entries": sum(len(a.entries) for a in self._documents.values()),
+            }
+
+    # ==========================================
+    # INTERNALS (lock held)
+    # ==========================================
+
+    def _answers(self, document: str, version: str, create: bool) -> Optional[_DocumentAnswers]:
+        answers = self._documents.get(document)
+        if answers is not None and answers.version != version:
+            # The document was re-indexed: every cached answer may be stale
+            del self._documents[document]
+            self.counters["invalidations"] += 1
+            answers = None
+        if answers is None:
+            if not create:
+                return None
+            answers = self._documents[document] = _DocumentAnswers(version=version)
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+        self._documents.move_to_end(document)
+        return answers
+
+    def _hit(self, answer: CachedAnswer, kind: str) -> Tuple[CachedAnswer, str]:
+        answer.hits += 1
+        self.counters[f"{kind}_hits"] += 1
+        return answer, kind
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _candidates(self, answers: _DocumentAnswers, signature: np.ndarray) -> Set[str]:
+        found: Set[str] = set()
+        for band in self._band_keys(signature):
+            found |= answers.buckets.get(band, set())
+        return found
+
+    def _unindex(self, answers: _DocumentAnswers, key: str):
+        entry = answers.entries.pop(key, None)
+        if entry is None:
+            return
+        for band in self._band_keys(entry[1]):
+            bucket = answers.buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del answers.buckets[band]
+
+
+answer_cache = AnswerCache(
+    max_entries_per_document=settings.ANSWER_CACHE_MAX_ENTRIES,
+    max_documents=settings.ANSWER_CACHE_MAX_DOCUMENTS,
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+)
@@ -0,0 +1,266 @@
+"""
+Document Cache
+Content-addressed on-disk store of processed document artifacts
+(extracted text, chunks, knowledge graph, indexes), keyed by the PDF's SHA-256
+
+Layout:
+    <root>/<digest[:2]>/<digest>/manifest.json
+    <root>/<digest[:2]>/<digest>/<artifact files>
+
+The manifest records the size and SHA-256 of every artifact; its mtime is
+the entry's last access time for LRU eviction
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from app.config import settings
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 3
+MANIFEST_NAME = "manifest.json"
+
+Artifact = Union[bytes, str, Path]
+
+
+def _sha256_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@dataclass
+class CachedDocument:
+    """A verified cache entry"""
+    digest: str
+    path: Path
+    manifest: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.manifest.get("artifacts", {}))
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.manifest.get("metadata", {})
+
+    def artifact_path(self, name: str) -> Path:
+        if name not in self.manifest.get("artifacts", {}):
+            raise KeyError(name)
+        return self.path / name
+
+    def read_bytes(self, name: str) -> bytes:
+        return self.artifact_path(name).read_bytes()
+
+    def read_json(self, name: str) -> Any:
+        return json.loads(self.read_bytes(name))
+
+
+class DocumentCache:
+    """
+    Size-bounded LRU cache of processed documents
+
+    - put() writes into a temp dir and renames it into place, so readers
+      never see a half-written entry
+    - get() checks every artifact against the manifest (full hash the first
+      time an entry is seen by this process, size afterwards) and drops
+      corrupt entries
+    - once the total size passes `max_bytes` the least recently used
+      entries are evicted
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: Optional[Dict[str, int]] = None
+        self._verified = set()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0,
+            "corrupt": 0,
+        }
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def get(self, digest: str) -> Optional[CachedDocument]:
+        entry_dir = self._entry_dir(digest)
+        manifest = self._load_manifest(entry_dir)
+
+        if manifest is None or manifest.get("version") != CACHE_FORMAT_VERSION:
+            self.counters["misses"] += 1
+            return None
+
+        if not self._verify(digest, entry_dir, manifest):
+            self.counters["corrupt"] += 1
+            self.counters["misses"] += 1
+            logger.warning(f"Document cache entry {digest[:12]} failed integrity check, dropping it")
+            self.remove(digest)
+            return None
+
+        # Touch the manifest: its mtime is the LRU clock
+        try:
+            os.utime(entry_dir / MANIFEST_NAME)
+        except FileNotFoundError:
+            pass
+
+        self.counters["hits"] += 1
+        return CachedDocument(digest=digest, path=entry_dir, manifest=manifest)
+
+    def put(
+        self,
+        digest: str,
+        artifacts: Dict[str, Artifact],
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> CachedDocument:
+        """
+        Store artifacts for `digest`
+        Values may be bytes, str or a Path to a file that is copied in
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=".staging-"))
+
+        try:
+            entries = {}
+            for name, value in artifacts.items():
+                if "/" in name or name == MANIFEST_NAME:
+                    raise ValueError(f"Invalid artifact name: {name}")
+                target = staging / name
+                if isinstance(value, Path):
+                    shutil.copyfile(value, target)
+                else:
+                    target.write_bytes(value.encode("utf-8") if isinstance(value, str) else value)
+                entries[name] = {
+                    "size": target.stat().st_size,
+                    "sha256": _sha256_file(target),
+                }
+
+            manifest = {
+                "version": CACHE_FORMAT_VERSION,
+                "digest": digest,
+                "created_at": time.time(),
+                "artifacts": entries,
+                "metadata": metadata or {},
+            }
+            (staging / MANIFEST_NAME).write_text(json.dumps(manifest))
+
+            entry_dir = self._entry_dir(digest)
+            entry_dir.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock:
+                if entry_dir.exists():
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(staging, entry_dir)
+                self._index()[digest] = sum(e["size"] for e in entries.values())
+                self._verified.add(digest)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.counters["puts"] += 1
+        self._evict(keep=digest)
+        return CachedDocument(digest=digest, path=entry_dir, manifest=manifest)
+
+    def remove(self, digest: str):
+        with self._lock:
+            shutil.rmtree(self._entry_dir(digest), ignore_errors=True)
+            self._index().pop(digest, None)
+            self._verified.discard(digest)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            index = self._index()
+            total = sum(index.values())
+        return {
+            **self.counters,
+            "entries": len(index),
+            "size_bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+    # ==========================================
+    # INTERNALS
+    # ==========================================
+
+    def _entry_dir(self, digest: str) -> Path:
+        if len(digest) < 8 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Invalid content digest: {digest!r}")
+        return self.root / digest[:2] / digest
+
+    @staticmethod
+    def _load_manifest(entry_dir: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((entry_dir / MANIFEST_NAME).read_text())
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            return None
+
+    def _verify(self, digest: str, entry_dir: Path, manifest: Dict[str, Any]) -> bool:
+        full = digest not in self._verified
+        for name, meta in manifest.get("artifacts", {}).items():
+            path = entry_dir / name
+            try:
+                if path.stat().st_size != meta["size"]:
+                    return False
+            except FileNotFoundError:
+                return False
+            if full and _sha256_file(path) != meta["sha256"]:
+                return False
+        self._verified.add(digest)
+        return True
+
+    def _index(self) -> Dict[str, int]:
+        """digest -> bytes on disk, built lazily from a directory scan (lock held)"""
+        if self._sizes is None:
+            self._sizes = {}
+            if self.root.exists():
+                for manifest_path in self.root.glob(f"*/*/{MANIFEST_NAME}"):
+                    manifest = self._load_manifest(manifest_path.parent)
+                    if manifest is None:
+                        continue
+                    self._sizes[manifest_path.parent.name] = sum(
+                        a.get("size", 0) for a in manifest.get("artifacts", {}).values()
+                    )
+        return self._sizes
+
+    def _evict(self, keep: str):
+        with self._lock:
+            index = self._index()
+            total = sum(index.values())
+            if total <= self.max_bytes:
+                return
+
+            def last_access(digest: str) -> float:
+                try:
+                    return (self._entry_dir(digest) / MANIFEST_NAME).stat().st_mtime
+                except FileNotFoundError:
+                    return 0.0
+
+            for digest in sorted(index, key=last_access):
+                if total <= self.max_bytes:
+                    break
+                if digest == keep:
+                    continue
+                total -= index.pop(digest)
+                shutil.rmtree(self._entry_dir(digest), ignore_errors=True)
+                self._verified.discard(digest)
+                self.counters["evictions"] += 1
+                logger.info(f"Evicted document cache entry {digest[:12]}")
+
+
+document_cache = DocumentCache(
+    root=settings.DOCUMENT_CACHE_DIR,
+    max_bytes=settings.DOCUMENT_CACHE_MAX_MB * 1024 * 1024,
+)
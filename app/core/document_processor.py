@@ -1 +1,379 @@
-# Your document processor goes here
\ No newline at end of file
+"""
+Document Processor
+Streaming PDF pipeline: page-by-page text extraction -> normalization -> overlapping chunks
+
+Parsing is CPU-bound, so page ranges are extracted in a ProcessPoolExecutor
+and handed back as they finish; the event loop only stitches pages together.
+Only a bounded window of pages is in flight at any time, so memory stays flat
+regardless of document length.
+"""
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.config import settings
+import asyncio
+import json
+import mmap
+import os
+import re
+import time
+import unicodedata
+
+PathLike = Union[str, Path]
+
+
+class InvalidDocument(ValueError):
+    """The file could not be parsed as a PDF"""
+
+
+@dataclass
+class Page:
+    """Normalized text of one PDF page (1-based number)"""
+    number: int
+    text: str
+
+
+@dataclass
+class Chunk:
+    """Overlapping slice of document text used for retrieval"""
+    id: int
+    text: str
+    page_start: int
+    page_end: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class ProcessingResult:
+    """Summary of a pipeline run that wrote its output to disk"""
+    pages: int
+    chunks: int
+    characters: int
+    seconds: float
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+
+# ==========================================
+# NORMALIZATION
+# ==========================================
+
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+_SOFT_BREAK = re.compile(r"(?<![.!?:\n])\n(?!\n)")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_CONTROL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Clean raw extracted text
+    - NFKC unicode (ligatures, full-width forms)
+    - re-join words hyphenated across line breaks
+    - unwrap hard-wrapped lines, keep paragraph breaks
+    - collapse runs of whitespace
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = _CONTROL.sub("", text)
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    text = _SOFT_BREAK.sub(" ", text)
+    text = _SPACES.sub(" ", text)
+    text = _BLANK_LINES.sub("\n\n", text)
+    return text.strip()
+
+
+# ==========================================
+# EXTRACTION (runs inside worker processes)
+# ==========================================
+
+# Per-process reader cache: consecutive page ranges of the same file reuse the parsed xref
+_reader_cache: Dict[str, Tuple[float, object, mmap.mmap]] = {}
+
+
+def _open_reader(path: str):
+    from pypdf import PdfReader
+
+    mtime = os.path.getmtime(path)
+    cached = _reader_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    for _, _, old_view in _reader_cache.values():
+        old_view.close()
+    _reader_cache.clear()
+
+    # Memory-mapped: the OS pages the file in as pypdf seeks, nothing is copied up front
+    with open(path, "rb") as f:
+        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    reader = PdfReader(view)
+    _reader_cache[path] = (mtime, reader, view)
+    return reader
+
+
+def count_pages(path: PathLike) -> int:
+    try:
+        return len(_open_reader(str(path)).pages)
+    except Exception as e:
+        raise InvalidDocument(f"Could not read PDF: {e}") from None
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract and normalize pages [start, end) - 0-based indexes, 1-based numbers returned"""
+    reader = _open_reader(path)
+    pages = []
+    for index in range(start, min(end, len(reader.pages))):
+        try:
+            raw = reader.pages[index].extract_text() or ""
+        except Exception:
+            # One malformed page shouldn't sink the whole document
+            raw = ""
+        pages.append((index + 1, normalize_text(raw)))
+    return pages
+
+
+# ==========================================
+# PAGE STREAMS
+# ==========================================
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def configured_workers() -> int:
+    """Size of the shared pool: PDF_WORKERS, else one per CPU core"""
+    return settings.PDF_WORKERS or os.cpu_count() or 1
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Shared process pool, sized to the machine unless PDF_WORKERS is set"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=configured_workers())
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def iter_pages(path: PathLike, batch_pages: int = 8) -> Iterator[Page]:
+    """Synchronous, in-process page stream (scripts, tests, benchmarks)"""
+    path = str(path)
+    total = count_pages(path)
+    for start in range(0, total, batch_pages):
+        for number, text in extract_page_range(path, start, start + batch_pages):
+            yield Page(number=number, text=text)
+
+
+async def aiter_pages(
+    path: PathLike,
+    executor: Optional[Executor] = None,
+    batch_pages: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    workers: Optional[int] = None,
+) -> AsyncIterator[Page]:
+    """
+    Stream pages in order while page ranges are parsed in parallel
+
+    At most 2 x `workers` ranges are in flight (default: the shared pool's
+    size, see configured_workers); each is yielded as soon as it and every
+    range before it are done. `progress(pages_done, total_pages)` is called
+    once the page count is known and after every range
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or get_executor()
+    batch_pages = batch_pages or settings.PDF_BATCH_PAGES
+    path = str(path)
+
+    total = await loop.run_in_executor(executor, count_pages, path)
+    ranges = [(start, min(start + batch_pages, total)) for start in range(0, total, batch_pages)]
+    window = max(2, 2 * (workers or configured_workers()))
+    if progress is not None:
+        progress(0, total)
+
+    pending: Dict[int, asyncio.Future] = {}
+    next_submit = 0
+    try:
+        for next_yield in range(len(ranges)):
+            while next_submit < len(ranges) and len(pending) < window:
+                start, end = ranges[next_submit]
+                pending[next_submit] = loop.run_in_executor(executor, extract_page_range, path, start, end)
+                next_submit += 1
+
+            for number, text in await pending.pop(next_yield):
+                yield Page(number=number, text=text)
+            if progress is not None:
+                progress(ranges[next_yield][1], total)
+    finally:
+        for future in pending.values():
+            future.cancel()
+
+
+# ==========================================
+# CHUNKING
+# ==========================================
+
+def chunk_pages(
+    pages: Iterable[Page],
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+) -> Iterator[Chunk]:
+    """
+    Turn a page stream into overlapping chunks of ~chunk_size characters
+
+    Chunks end on whitespace where possible and consecutive chunks share
+    `overlap` characters. Only the unfinished tail is buffered
+    """
+    for chunk in _Chunker(chunk_size, overlap).feed_all(pages):
+        yield chunk
+
+
+class _Chunker:
+    """Incremental chunker shared by the sync and async pipelines"""
+
+    def __init__(self, chunk_size: Optional[int], overlap: Optional[int]):
+        self.chunk_size = chunk_size or settings.CHUNK_SIZE_CHARS
+        self.overlap = min(overlap if overlap is not None else settings.CHUNK_OVERLAP_CHARS, self.chunk_size // 2)
+        self.buffer = ""
+        # (offset in buffer, page number) for every page start inside the buffer
+        self.page_marks: List[Tuple[int, int]] = []
+        self.next_id = 0
+
+    def feed(self, page: Page) -> Iterator[Chunk]:
+        if not page.text:
+            return
+        if self.buffer:
+            self.buffer += "\n\n"
+        self.page_marks.append((len(self.buffer), page.number))
+        self.buffer += page.text
+
+        while len(self.buffer) >= self.chunk_size + self.overlap:
+            yield self._emit(self._cut_point())
+
+    def flush(self) -> Iterator[Chunk]:
+        if self.buffer.strip():
+            yield self._emit(len(self.buffer), final=True)
+
+    def feed_all(self, pages: Iterable[Page]) -> Iterator[Chunk]:
+        for page in pages:
+            yield from self.feed(page)
+        yield from self.flush()
+
+    def _cut_point(self) -> int:
+        cut = self.buffer.rfind(" ", self.chunk_size // 2, self.chunk_size)
+        return cut if cut > 0 else self.chunk_size
+
+    def _page_at(self, offset: int) -> int:
+        number = self.page_marks[0][1]
+        for mark, page_number in self.page_marks:
+            if mark > offset:
+                break
+            number = page_number
+        return number
+
+    def _emit(self, cut: int, final: bool = False) -> Chunk:
+        text = self.buffer[:cut].strip()
+        chunk = Chunk(
+            id=self.next_id,
+            text=text,
+            page_start=self._page_at(0),
+            page_end=self._page_at(max(cut - 1, 0)),
+        )
+        self.next_id += 1
+
+        if final:
+            self.buffer, self.page_marks = "", []
+            return chunk
+
+        # Keep `overlap` chars, starting on a word boundary
+        keep_from = max(cut - self.overlap, 0)
+        space = self.buffer.find(" ", keep_from, cut)
+        if space != -1:
+            keep_from = space + 1
+        start_page = self._page_at(keep_from)
+        self.buffer = self.buffer[keep_from:]
+        self.page_marks = [(0, start_page)] + [
+            (mark - keep_from, number) for mark, number in self.page_marks if mark > keep_from
+        ]
+        return chunk
+
+
+async def aiter_chunks(
+    path: PathLike,
+    executor: Optional[Executor] = None,
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> AsyncIterator[Chunk]:
+    """Async chunk stream over a PDF, parsed in the process pool (`progress` is forwarded to aiter_pages)"""
+    chunker = _Chunker(chunk_size, overlap)
+    async for page in aiter_pages(path, executor=executor, progress=progress):
+        for chunk in chunker.feed(page):
+            yield chunk
+    for chunk in chunker.flush():
+        yield chunk
+
+
+# ==========================================
+# FULL PIPELINE
+# ==========================================
+
+async def process_pdf(
+    path: PathLike,
+    output_dir: PathLike,
+    executor: Optional[Executor] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> ProcessingResult:
+    """
+    Run the pipeline and stream the results to disk
+    - <output_dir>/text.txt      normalized text, pages separated by form feeds
+    - <output_dir>/chunks.jsonl  one chunk per line
+    `progress` is forwarded to aiter_pages
+    """
+    start_time = time.perf_counter()
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    chunker = _Chunker(None, None)
+    pages = chunks = characters = 0
+
+    with open(output_dir / "text.txt", "w", encoding="utf-8") as text_out, \
+            open(output_dir / "chunks.jsonl", "w", encoding="utf-8") as chunks_out:
+
+        def write_chunks(new_chunks: Iterable[Chunk]) -> int:
+            written = 0
+            for chunk in new_chunks:
+                chunks_out.write(json.dumps(chunk.to_dict(), ensure_ascii=False) + "\n")
+                written += 1
+            return written
+
+        async for page in aiter_pages(path, executor=executor, progress=progress):
+            if pages:
+                text_out.write("\f")
+            text_out.write(page.text)
+            pages += 1
+            characters += len(page.text)
+            chunks += write_chunks(chunker.feed(page))
+        chunks += write_chunks(chunker.flush())
+
+    return ProcessingResult(
+        pages=pages,
+        chunks=chunks,
+        characters=characters,
+        seconds=time.perf_counter() - start_time,
+    )
+
+
+def read_chunks(path: PathLike) -> Iterator[Chunk]:
+    """Stream chunks back from a chunks.jsonl artifact"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield Chunk(**json.loads(line))
@@ -1 +1,292 @@
-# Your email generator goes here
\ No newline at end of file
+"""
+Email Generator
+Cold emails from a job posting and a resume, with a disk-backed response cache
+
+- the cache key is a SHA-256 over the normalized prompt inputs: job text,
+  resume fingerprint, model, generation parameters and TEMPLATE_VERSION
+  (bump it whenever the prompt changes, so old answers stop matching)
+- entries live in a SQLite file in WAL mode, shared by every worker and
+  kept across restarts; once the stored emails pass `max_bytes` the least
+  recently used ones are evicted
+- concurrent requests for the same key wait for the one LLM call in flight
+  instead of each paying for it
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.core.llm import llm_client
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_VERSION = 1
+
+EMAIL_SYSTEM_PROMPT = (
+    "You write short, specific cold emails from a candidate to a hiring manager. "
+    "Use only facts from the resume, tie them to the requirements of the job posting, "
+    "and end with a clear call to action. Return the email body only, under 200 words."
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalized text with whitespace collapsed: reformatting a posting keeps its key"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+def resume_fingerprint(resume_text: str) -> str:
+    return hashlib.sha256(normalize_text(resume_text).encode("utf-8")).hexdigest()
+
+
+def cache_key(job_text: str, resume_fp: str, model: str, params: Optional[Dict[str, Any]] = None,
+              template_version: int = TEMPLATE_VERSION) -> str:
+    parts = [template_version, model, resume_fp, normalize_text(job_text), params or {}]
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def email_messages(job_text: str, resume_text: str) -> list:
+    return [
+        {"role": "system", "content": EMAIL_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Job posting:\n{normalize_text(job_text)}\n\nResume:\n{normalize_text(resume_text)}"},
+    ]
+
+
+@dataclass
+class CachedEmail:
+    email: str
+    model: str
+    generation_time_ms: float
+    created_at: float
+    hits: int = 0
+
+
+@dataclass
+class GeneratedEmail:
+    email: str
+    model: str
+    cache_hit: bool
+    generation_time_ms: float
+    time_saved_ms: Optional[float] = None
+
+
+class EmailCache:
+    """Size-bounded LRU of generated emails in a SQLite file"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+        }
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS email_cache ("
+                " key TEXT PRIMARY KEY,"
+                " email TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " generation_time_ms REAL NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_email_cache_last_access ON email_cache(last_access)")
+            self._conn = conn
+        return self._conn
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def get(self, key: str) -> Optional[CachedEmail]:
+        with self._lock:
+            row = self._db().execute(
+                "UPDATE email_cache SET last_access = ?, hits = hits + 1 WHERE key = ?"
+                " RETURNING email, model, generation_time_ms, created_at, hits",
+                (time.time(), key)
+            ).fetchone()
+            if row is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["hits"] += 1
+        return CachedEmail(*row)
+
+    def put(self, key: str, email: str, model: str, generation_time_ms: float):
+        now = time.time()
+        size = len(email.encode("utf-8"))
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO email_cache"
+                " (key, email, model, generation_time_ms, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, email, model, generation_time_ms, size, now, now)
+            )
+            self.counters["stores"] += 1
+            self._evict(keep=key)
+
+    def clear(self):
+        with self._lock:
+            self._db().execute("DELETE FROM email_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM email_cache"
+            ).fetchone()
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "size_bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+    # ==========================================
+    # INTERNALS (lock held)
+    # ==========================================
+
+    def _evict(self, keep: str):
+        db = self._db()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM email_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% of the cap so the next few stores do not each trigger a pass
+        target = self.max_bytes * 0.9
+        victims = []
+        for key, size in db.execute("SELECT key, size FROM email_cache ORDER BY last_access"):
+            if total <= target:
+                break
+            if key == keep:
+                continue
+            victims.append((key,))
+            total -= size
+        db.executemany("DELETE FROM email_cache WHERE key = ?", victims)
+        self.counters["evictions"] += len(victims)
+        logger.info(f"Evicted {len(victims)} email cache entries")
+
+
+class EmailGenerator:
+    """Generates cold emails through the shared LLM client, answering repeats from the cache"""
+
+    def __init__(self, cache: Optional[EmailCache], client=llm_client, max_tokens: int = 600):
+        self.cache = cache
+        self.client = client
+        self.max_tokens = max_tokens
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def configured(self) -> bool:
+        return self.client.configured
+
+    async def generate(self, job_text: str, resume_text: str) -> GeneratedEmail:
+        start_time = time.perf_counter()
+        params = {"max_tokens": self.max_tokens}
+        key = cache_key(job_text, resume_fingerprint(resume_text), self.client.model, params)
+
+        if self.cache is not None:
+            cached = await run_in_threadpool(self.cache.get, key)
+            if cached is not None:
+                return self._hit(cached.email, cached.model, cached.generation_time_ms, start_time)
+
+        # Single flight: identical requests arriving meanwhile share this call
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                generated = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The generating request was cancelled, not this one: try again
+                return await self.generate(job_text, resume_text)
+            return self._hit(generated.email, generated.model, generated.generation_time_ms, start_time)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            completion = await self.client.complete(email_messages(job_text, resume_text), **params)
+            generated = GeneratedEmail(
+                email=completion.text.strip(),
+                model=completion.model,
+                cache_hit=False,
+                generation_time_ms=(time.perf_counter() - start_time) * 1000,
+            )
+            if self.cache is not None and generated.email:
+                await run_in_threadpool(self.cache.put, key, generated.email, generated.model,
+                                        generated.generation_time_ms)
+            future.set_result(generated)
+            return generated
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Followers re-raise it; without one the exception would be reported as never retrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _hit(email: str, model: str, original_ms: float, start_time: float) -> GeneratedEmail:
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        return GeneratedEmail(
+            email=email,
+            model=model,
+            cache_hit=True,
+            generation_time_ms=elapsed_ms,
+            time_saved_ms=max(original_ms - elapsed_ms, 0.0),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "template_version": TEMPLATE_VERSION,
+            "in_flight": len(self._inflight),
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+email_cache = EmailCache(
+    path=settings.EMAIL_CACHE_PATH,
+    max_bytes=settings.EMAIL_CACHE_MAX_MB * 1024 * 1024,
+)
+
+email_generator = EmailGenerator(
+    cache=email_cache if settings.EMAIL_CACHE_ENABLED else None,
+    max_tokens=settings.EMAIL_MAX_TOKENS,
+)
+
+
+__all__ = [
+    'CachedEmail',
+    'EmailCache',
+    'EmailGenerator',
+    'GeneratedEmail',
+    'TEMPLATE_VERSION',
+    'cache_key',
+    'email_cache',
+    'email_generator',
+    'resume_fingerprint',
+]
@@ -1 +1,162 @@
-# Your GraphRAG implementation goes here
\ No newline at end of file
+"""
+GraphRAG
+Retrieval over one processed document: BM25 lexical hits fused with chunks
+reached through the knowledge graph
+
+All artifacts live next to each other in a document cache entry and are
+memory-mapped when a session loads them:
+    chunks.jsonl + chunk_offsets.npy   chunk store with O(1) random access
+    bm25_*                             lexical index (queryengine)
+    kg_*                               entity graph (knowledgegraph)
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Union
+import json
+
+import numpy as np
+
+from app.core.document_processor import Chunk
+from app.core.knowledgegraph import KnowledgeGraph, build_from_chunks, extract_entities
+from app.core.queryengine import BM25Index
+
+PathLike = Union[str, Path]
+
+CHUNKS_NAME = "chunks.jsonl"
+OFFSETS_NAME = "chunk_offsets.npy"
+
+# Reciprocal-rank-fusion constant (standard value from the RRF paper)
+RRF_K = 60
+
+
+@dataclass
+class RetrievedChunk:
+    chunk: Chunk
+    score: float
+    lexical_rank: int = -1
+    graph_hops: int = -1
+
+    def to_dict(self) -> Dict:
+        return {
+            **self.chunk.to_dict(),
+            "score": round(self.score, 6),
+            "lexical_rank": self.lexical_rank,
+            "graph_hops": self.graph_hops,
+        }
+
+
+class GraphRAG:
+    """Read-side handle over a processed document directory"""
+
+    def __init__(self, directory: PathLike, index: BM25Index, graph: KnowledgeGraph, offsets: np.ndarray):
+        self.directory = Path(directory)
+        self.index = index
+        self.graph = graph
+        self.offsets = offsets
+        # Changes whenever the indexes are rebuilt (used to invalidate cached answers)
+        self.version = "-".join(
+            str((self.directory / name).stat().st_mtime_ns)
+            for name in ("bm25_meta.json", "kg_meta.json")
+        )
+
+    # ==========================================
+    # BUILD / LOAD
+    # ==========================================
+
+    @staticmethod
+    def build(directory: PathLike) -> Dict[str, Path]:
+        """
+        Build the indexes for `<directory>/chunks.jsonl` into `directory`
+        Returns {artifact name: path} for everything written (chunks.jsonl included)
+        """
+        directory = Path(directory)
+        chunks_path = directory / CHUNKS_NAME
+
+        offsets = [0]
+        texts = []
+        with open(chunks_path, "rb") as f:
+            for line in f:
+                offsets.append(offsets[-1] + len(line))
+                texts.append(json.loads(line)["text"])
+        np.save(directory / OFFSETS_NAME, np.asarray(offsets, dtype=np.int64), allow_pickle=False)
+
+        files = {CHUNKS_NAME: chunks_path, OFFSETS_NAME: directory / OFFSETS_NAME}
+        files.update(BM25Index.build(texts).save(directory))
+        files.update(build_from_chunks(texts).save(directory))
+        return files
+
+    @classmethod
+    def load(cls, directory: PathLike) -> "GraphRAG":
+        directory = Path(directory)
+        return cls(
+            directory=directory,
+            index=BM25Index.load(directory),
+            graph=KnowledgeGraph.load(directory),
+            offsets=np.load(directory / OFFSETS_NAME, mmap_mode="r", allow_pickle=False),
+        )
+
+    @staticmethod
+    def exists(directory: PathLike) -> bool:
+        directory = Path(directory)
+        return (directory / OFFSETS_NAME).exists() and BM25Index.exists(directory) and KnowledgeGraph.exists(directory)
+
+    # ==========================================
+    # RETRIEVAL
+    # ==========================================
+
+    @property
+    def num_chunks(self) -> int:
+        return len(self.offsets) - 1
+
+    def get_chunk(self, index: int) -> Chunk:
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        with open(self.directory / CHUNKS_NAME, "rb") as f:
+            f.seek(start)
+            return Chunk(**json.loads(f.read(end - start)))
+
+    def retrieve(self, query: str, k: int = 5, hops: int = 1) -> List[RetrievedChunk]:
+        """
+        Top-k chunks for `query`
+        - lexical: BM25 top 2k
+        - graph: entities named in the query (or, failing that, in the best
+          lexical hit) expanded `hops` steps, then the chunks mentioning them
+        Both rankings are merged with reciprocal rank fusion
+        """
+        hits = self.index.search(query, k * 2)
+        scores: Dict[int, float] = {}
+        lexical_rank: Dict[int, int] = {}
+        for rank, hit in enumerate(hits):
+            lexical_rank[hit.index] = rank
+            scores[hit.index] = 1.0 / (RRF_K + rank)
+
+        seeds = [self.graph.entity_id(name) for name, _ in extract_entities(query)]
+        seeds = [s for s in seeds if s >= 0]
+        if not seeds and hits:
+            chunk = self.get_chunk(hits[0].index)
+            seeds = [self.graph.entity_id(name) for name, _ in extract_entities(chunk.text)][:8]
+            seeds = [s for s in seeds if s >= 0]
+
+        graph_hops: Dict[int, int] = {}
+        if seeds:
+            entities, distances = self.graph.k_hop(seeds, hops=hops, max_entities=256)
+            for hop in range(hops + 1):
+                for chunk_index in self.graph.chunks_for(entities[distances == hop]).tolist():
+                    graph_hops.setdefault(chunk_index, hop)
+            # Closer entities rank first, then earlier chunks
+            ranked = sorted(graph_hops, key=lambda c: (graph_hops[c], c))[:k * 2]
+            for rank, chunk_index in enumerate(ranked):
+                scores[chunk_index] = scores.get(chunk_index, 0.0) + 1.0 / (RRF_K + rank)
+
+        best = sorted(scores, key=scores.get, reverse=True)[:k]
+        return [
+            RetrievedChunk(
+                chunk=self.get_chunk(i),
+                score=scores[i],
+                lexical_rank=lexical_rank.get(i, -1),
+                graph_hops=graph_hops.get(i, -1),
+            )
+            for i in best
+        ]
+
+    def memory_usage(self) -> int:
+        return self.index.memory_usage() + self.graph.memory_usage() + int(self.offsets.nbytes)
@@ -0,0 +1,494 @@
+"""
+Document Ingestion Jobs
+Background processing of uploaded chatbot PDFs
+
+Uploads only persist the file and record an IngestionJob row; a bounded pool
+of workers turns queued jobs into cached GraphRAG artifacts:
+
+    queued -> extracting (page progress) -> indexing -> caching -> ready
+                                                                 \\-> failed
+
+Job state lives in the database next to ChatSession, not in memory, so
+- every job write goes through app.database.writer (the single SQLite
+  writer), never through a connection of its own
+- workers claim jobs with a conditional UPDATE (safe across uvicorn workers)
+- a running job keeps `updated_at` fresh; jobs whose heartbeat stops (crash,
+  restart) are put back in the queue, up to `max_attempts` times
+- jobs queued by another process are picked up by the periodic poll
+
+The upload is only input: once its job is done (succeeded, or failed for
+good) the file is unlinked, unless another queued or running job was
+given the same content-addressed path.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database.connection import get_read_db
+from app.database.writer import run_write, write_sync
+from app.database.models import IngestionJob
+from app.core.answer_cache import answer_cache
+from app.core.document_cache import CachedDocument, document_cache
+from app.core.document_processor import InvalidDocument, process_pdf
+from app.core.graphrag import GraphRAG
+import asyncio
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Share of the progress bar reached at the start of each stage
+STAGE_PROGRESS = {
+    "queued": 0.0,
+    "extracting": 0.0,
+    "indexing": 80.0,
+    "caching": 95.0,
+    "ready": 100.0,
+}
+
+
+class QueueFull(Exception):
+    """Too many jobs are already waiting"""
+
+
+@dataclass
+class _JobProgress:
+    """Latest progress of a running job, written out on every heartbeat"""
+    stage: str = "extracting"
+    progress: float = 0.0
+    pages_done: int = 0
+    pages_total: Optional[int] = None
+
+    def report(self, stage: str, done: int = 0, total: int = 0):
+        self.stage = stage
+        self.progress = STAGE_PROGRESS[stage]
+        if stage == "extracting" and total:
+            self.pages_done, self.pages_total = done, total
+            self.progress = STAGE_PROGRESS["indexing"] * done / total
+
+
+async def ingest_document(
+    path: str,
+    sha256: str,
+    filename: str,
+    size_bytes: int,
+    report: Optional[Callable[..., None]] = None,
+) -> CachedDocument:
+    """
+    Extract, chunk and index a PDF into the document cache (a no-op when
+    identical bytes were processed before). Raises InvalidDocument
+    """
+    report = report or (lambda *args: None)
+
+    document = await run_in_threadpool(document_cache.get, sha256)
+    if document is not None:
+        return document
+
+    # Pages are parsed in the process pool and streamed to disk as they finish
+    with tempfile.TemporaryDirectory(prefix="pdf-") as workdir:
+        report("extracting")
+        result = await process_pdf(path, workdir, progress=lambda done, total: report("extracting", done, total))
+
+        # Lexical index + knowledge graph over the chunks
+        report("indexing")
+        index_files = await run_in_threadpool(GraphRAG.build, workdir)
+        answer_cache.invalidate(sha256)
+
+        report("caching")
+        artifacts = {"text.txt": Path(workdir) / "text.txt", **index_files}
+        return await run_in_threadpool(
+            document_cache.put,
+            sha256,
+            artifacts,
+            {
+                "filename": filename,
+                "size_bytes": size_bytes,
+                "pages": result.pages,
+                "chunks": result.chunks,
+                "characters": result.characters,
+                "processing_seconds": round(result.seconds, 3),
+            }
+        )
+
+
+class IngestionQueue:
+    """
+    Database-backed job queue processed by a bounded pool of asyncio tasks
+
+    - submit() records a job (QueueFull once `max_queued` jobs are waiting),
+      notify() wakes a worker instead of waiting for the next poll
+    - at most `concurrency` documents are processed at once by this process
+      (the CPU-bound page parsing itself is bounded by the PDF process pool)
+    - `on_complete(job, document)` / `on_failure(job, error)` let the caller
+      publish the result (attach the session's GraphRAG handle)
+    """
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_queued: int,
+        poll_interval: float,
+        heartbeat_interval: float,
+        stale_after: float,
+        max_attempts: int,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max(1, max_queued)
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = max(stale_after, 3 * heartbeat_interval)
+        self.max_attempts = max(1, max_attempts)
+
+        self.on_complete: Optional[Callable[[Dict[str, Any], CachedDocument], Awaitable[None]]] = None
+        self.on_failure: Optional[Callable[[Dict[str, Any], str], Awaitable[None]]] = None
+
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        # Jobs for the same bytes run one after another; the second one is a cache hit
+        self._document_locks: Dict[str, asyncio.Lock] = {}
+
+        self.counters = {
+            "submitted": 0,
+            "claimed": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retried": 0,
+            "recovered": 0,
+            "rejected_full": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._dispatcher is not None and not self._dispatcher.done()
+
+    # ==========================================
+    # LIFECYCLE
+    # ==========================================
+
+    async def start(self):
+        """Recover interrupted jobs and start dispatching on the running event loop"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        recovered = await run_in_threadpool(self.recover_stale)
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="ingestion-dispatcher")
+        logger.info(f"Ingestion queue started (workers={self.concurrency}, recovered={recovered})")
+
+    async def stop(self):
+        """Stop dispatching and cancel running jobs; they go back to the queue"""
+        tasks = [t for t in (self._dispatcher, *self._running) if t is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._dispatcher = None
+        self._running.clear()
+        logger.info(f"Ingestion queue stopped: {self.counters}")
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def submit(self, job_id: str, session_id: str, sha256: str, filename: str,
+               file_path: str, size_bytes: int) -> Dict[str, Any]:
+        """Record a queued job (blocking: call from a thread) and return it as a dict"""
+        def insert(db):
+            queued = db.query(func.count(IngestionJob.id)).filter(IngestionJob.status == 'queued').scalar()
+            if queued >= self.max_queued:
+                self.counters["rejected_full"] += 1
+                raise QueueFull(f"{queued} documents are already waiting to be processed")
+            job = IngestionJob(
+                job_id=job_id,
+                session_id=session_id,
+                sha256=sha256,
+                pdf_filename=filename,
+                file_path=file_path,
+                file_size_bytes=size_bytes,
+                status='queued',
+                stage='queued',
+                progress=0.0,
+            )
+            db.add(job)
+            db.flush()
+            return job.to_dict()
+
+        snapshot = write_sync(insert)
+        self.counters["submitted"] += 1
+        return snapshot
+
+    def notify(self):
+        """Wake the dispatcher (call on the event loop after submit())"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def record_done(self, job_id: str, session_id: str, sha256: str, filename: str,
+                    file_path: str, size_bytes: int) -> Dict[str, Any]:
+        """Record a job that needs no processing (the document was already cached)"""
+        now = datetime.utcnow()
+
+        def insert(db):
+            job = IngestionJob(
+                job_id=job_id,
+                session_id=session_id,
+                sha256=sha256,
+                pdf_filename=filename,
+                file_path=file_path,
+                file_size_bytes=size_bytes,
+                status='succeeded',
+                stage='ready',
+                progress=100.0,
+                started_at=now,
+                finished_at=now,
+            )
+            db.add(job)
+            db.flush()
+            return job.to_dict()
+
+        return write_sync(insert)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with get_read_db() as db:
+            job = db.query(IngestionJob).filter_by(job_id=job_id).first()
+            return job.to_dict() if job else None
+
+    def upload_for_session(self, session_id: str) -> Optional[str]:
+        """Path of the upload behind a session's job (None: no job)"""
+        with get_read_db() as db:
+            row = db.query(IngestionJob.file_path).filter_by(session_id=session_id).first()
+            return row[0] if row else None
+
+    def file_in_use(self, file_path: str) -> bool:
+        """Whether a queued or running job still needs the upload at `file_path` (uploads are content-addressed)"""
+        with get_read_db() as db:
+            return db.query(IngestionJob.id)\
+                .filter(IngestionJob.file_path == file_path, IngestionJob.status.in_(('queued', 'running')))\
+                .first() is not None
+
+    def discard_upload(self, file_path: str) -> bool:
+        """Unlink a finished job's upload unless a pending job still needs it -> whether it was unlinked"""
+        if self.file_in_use(file_path):
+            return False
+        Path(file_path).unlink(missing_ok=True)
+        return True
+
+    def recover_stale(self) -> int:
+        """Requeue (or fail, once out of attempts) running jobs whose heartbeat stopped"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+
+        def requeue(db) -> int:
+            stale = db.query(IngestionJob)\
+                .filter(IngestionJob.status == 'running', IngestionJob.updated_at < cutoff)\
+                .all()
+            failed = []
+            for job in stale:
+                if job.attempts >= self.max_attempts:
+                    job.status, job.stage = 'failed', 'failed'
+                    job.error_message = "Processing was interrupted too many times"
+                    job.finished_at = datetime.utcnow()
+                    failed.append(job.file_path)
+                else:
+                    job.status, job.stage = 'queued', 'queued'
+            return len(stale), failed
+
+        recovered, failed = write_sync(requeue)
+        self.counters["recovered"] += recovered
+        for file_path in failed:
+            self.discard_upload(file_path)
+        return recovered
+
+    def stats(self) -> Dict[str, Any]:
+        with get_read_db() as db:
+            by_status = dict(
+                db.query(IngestionJob.status, func.count(IngestionJob.id))
+                .group_by(IngestionJob.status)
+                .all()
+            )
+        return {
+            **self.counters,
+            "jobs": by_status,
+            "concurrency": self.concurrency,
+            "active": len(self._running),
+            "running": self.running,
+        }
+
+    # ==========================================
+    # WORKERS
+    # ==========================================
+
+    async def _dispatch(self):
+        """Claim jobs one at a time while a worker slot is free"""
+        slots = asyncio.Semaphore(self.concurrency)
+        last_recovery = asyncio.get_running_loop().time()
+
+        def release(task: asyncio.Task):
+            self._running.discard(task)
+            slots.release()
+
+        while True:
+            await slots.acquire()
+            self._wakeup.clear()
+            job = await run_in_threadpool(self._claim)
+            if job is not None:
+                task = asyncio.create_task(self._run(job), name=f"ingestion-{job['job_id']}")
+                self._running.add(task)
+                task.add_done_callback(release)
+                continue
+
+            slots.release()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                now = asyncio.get_running_loop().time()
+                if now - last_recovery >= self.stale_after:
+                    last_recovery = now
+                    await run_in_threadpool(self.recover_stale)
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Atomically move the oldest queued job to running; None when there is nothing to do"""
+        def claim(db) -> Optional[Dict[str, Any]]:
+            while True:
+                job = db.query(IngestionJob)\
+                    .filter(IngestionJob.status == 'queued')\
+                    .order_by(IngestionJob.created_at.asc(), IngestionJob.id.asc())\
+                    .first()
+                if job is None:
+                    return None
+                claimed = db.query(IngestionJob)\
+                    .filter(IngestionJob.id == job.id, IngestionJob.status == 'queued')\
+                    .update({
+                        'status': 'running',
+                        'stage': 'extracting',
+                        'attempts': IngestionJob.attempts + 1,
+                        'started_at': datetime.utcnow(),
+                        'updated_at': datetime.utcnow(),
+                        'error_message': None,
+                    }, synchronize_session=False)
+                if claimed:
+                    db.refresh(job)
+                    return {
+                        **job.to_dict(),
+                        'sha256': job.sha256,
+                        'file_path': job.file_path,
+                        'file_size_bytes': job.file_size_bytes,
+                    }
+                # Another process won the race: try the next one
+                db.expire(job)
+
+        job = write_sync(claim)
+        if job is not None:
+            self.counters["claimed"] += 1
+        return job
+
+    async def _run(self, job: Dict[str, Any]):
+        progress = _JobProgress()
+        heartbeat = asyncio.create_task(self._heartbeat(job['job_id'], progress))
+        lock = self._document_locks.setdefault(job['sha256'], asyncio.Lock())
+        try:
+            async with lock:
+                document = await ingest_document(
+                    job['file_path'], job['sha256'], job['filename'],
+                    job['file_size_bytes'], report=progress.report,
+                )
+            heartbeat.cancel()
+            if self.on_complete is not None:
+                await self.on_complete(job, document)
+            await run_in_threadpool(self._finish, job['job_id'], 'succeeded', 'ready', progress, None)
+            self.counters["succeeded"] += 1
+            # The artifacts are in the document cache now
+            await run_in_threadpool(self.discard_upload, job['file_path'])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start picks it up
+            await self._release(job['job_id'])
+            raise
+        except Exception as e:
+            heartbeat.cancel()
+            error = str(e) or e.__class__.__name__
+            retry = not isinstance(e, InvalidDocument) and job['attempts'] < self.max_attempts
+            if retry:
+                logger.warning(f"Ingestion job {job['job_id']} failed (attempt {job['attempts']}), retrying: {error}")
+                await run_in_threadpool(self._finish, job['job_id'], 'queued', 'queued', progress, error)
+                self.counters["retried"] += 1
+            else:
+                logger.error(f"Ingestion job {job['job_id']} failed: {error}")
+                await run_in_threadpool(self._finish, job['job_id'], 'failed', 'failed', progress, error)
+                self.counters["failed"] += 1
+                await run_in_threadpool(self.discard_upload, job['file_path'])
+                if self.on_failure is not None:
+                    await self.on_failure(job, error)
+        finally:
+            heartbeat.cancel()
+            if not lock.locked() and not getattr(lock, "_waiters", None) \
+                    and self._document_locks.get(job['sha256']) is lock:
+                del self._document_locks[job['sha256']]
+
+    async def _heartbeat(self, job_id: str, progress: _JobProgress):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await run_in_threadpool(self._write_progress, job_id, progress)
+            except Exception as e:
+                logger.warning(f"Ingestion heartbeat for {job_id} failed: {e}")
+
+    def _write_progress(self, job_id: str, progress: _JobProgress):
+        values = {
+            'stage': progress.stage,
+            'progress': progress.progress,
+            'pages_done': progress.pages_done,
+            'pages_total': progress.pages_total,
+            'updated_at': datetime.utcnow(),
+        }
+        write_sync(_update_job, job_id, values)
+
+    def _finish(self, job_id: str, status: str, stage: str, progress: _JobProgress, error: Optional[str]):
+        done = status in ('succeeded', 'failed')
+        write_sync(_update_job, job_id, {
+            'status': status,
+            'stage': stage,
+            'progress': STAGE_PROGRESS['ready'] if status == 'succeeded' else progress.progress,
+            'pages_done': progress.pages_done,
+            'pages_total': progress.pages_total,
+            'error_message': error,
+            'finished_at': datetime.utcnow() if done else None,
+            'updated_at': datetime.utcnow(),
+        })
+
+    async def _release(self, job_id: str):
+        try:
+            await run_write(_update_job, job_id, {
+                'status': 'queued',
+                'stage': 'queued',
+                'attempts': IngestionJob.attempts - 1,
+                'updated_at': datetime.utcnow(),
+            })
+        except Exception as e:
+            # recover_stale() requeues it once the heartbeat is old enough
+            logger.warning(f"Could not release ingestion job {job_id}: {e}")
+
+
+def _update_job(db, job_id: str, values: Dict[str, Any]) -> int:
+    return db.query(IngestionJob).filter(IngestionJob.job_id == job_id).update(values, synchronize_session=False)
+
+
+ingestion_queue = IngestionQueue(
+    concurrency=settings.INGEST_CONCURRENCY,
+    max_queued=settings.INGEST_MAX_QUEUED,
+    poll_interval=settings.INGEST_POLL_SECONDS,
+    heartbeat_interval=settings.INGEST_HEARTBEAT_SECONDS,
+    stale_after=settings.INGEST_STALE_SECONDS,
+    max_attempts=settings.INGEST_MAX_ATTEMPTS,
+)
+
+__all__ = [
+    'IngestionQueue',
+    'QueueFull',
+    'ingest_document',
+    'ingestion_queue',
+    'STAGE_PROGRESS',
+]
@@ -1 +1,369 @@
-# Your knowledge graph goes here
\ No newline at end of file
+"""
+Knowledge Graph
+Compact entity/relation store for GraphRAG, backed by NumPy arrays
+
+    names[e], entity_types[e]        interned entity table (entity id = position)
+    name_order                       argsort of names, for binary-search lookup
+    indptr[e]:indptr[e+1]            adjacency slice of entity e (CSR, both directions)
+    neighbors[i], edge_types[i]      neighbor id and relation type of each edge
+    edge_weights[i]                  how many times the relation was observed
+    mention_indptr / mention_chunks  entity -> chunk indexes it appears in
+
+Neighborhood queries expand a whole BFS frontier per step with array ops
+instead of walking Python dicts. Everything is saved as .npy and can be
+memory-mapped on load.
+"""
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import json
+import re
+
+import numpy as np
+
+PathLike = Union[str, Path]
+
+FILE_PREFIX = "kg_"
+
+
+class KnowledgeGraphBuilder:
+    """
+    Accumulates entities and relations in flat buffers, then freezes them
+    into a KnowledgeGraph (edges deduplicated, weights summed)
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._types = array("H")
+        self.entity_type_names: List[str] = []
+        self.relation_names: List[str] = []
+        self._src = array("i")
+        self._dst = array("i")
+        self._rel = array("H")
+        self._mention_entity = array("i")
+        self._mention_chunk = array("i")
+
+    @staticmethod
+    def _intern(table: List[str], value: str) -> int:
+        try:
+            return table.index(value)
+        except ValueError:
+            table.append(value)
+            return len(table) - 1
+
+    def add_entity(self, name: str, entity_type: str = "entity") -> int:
+        entity_id = self._ids.get(name)
+        if entity_id is None:
+            entity_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._types.append(self._intern(self.entity_type_names, entity_type))
+        return entity_id
+
+    def add_relation(self, source: str, relation: str, target: str):
+        src, dst = self.add_entity(source), self.add_entity(target)
+        if src == dst:
+            return
+        self._src.append(src)
+        self._dst.append(dst)
+        self._rel.append(self._intern(self.relation_names, relation))
+
+    def add_mention(self, name: str, chunk: int, entity_type: str = "entity"):
+        self._mention_entity.append(self.add_entity(name, entity_type))
+        self._mention_chunk.append(chunk)
+
+    def build(self) -> "KnowledgeGraph":
+        n = len(self._names)
+        src = np.frombuffer(self._src, dtype=np.int32)
+        dst = np.frombuffer(self._dst, dtype=np.int32)
+        rel = np.frombuffer(self._rel, dtype=np.uint16)
+
+        # Store both directions so BFS follows relations either way
+        rows = np.concatenate([src, dst]).astype(np.int64)
+        cols = np.concatenate([dst, src]).astype(np.int64)
+        rels = np.concatenate([rel, rel]).astype(np.int64)
+
+        # Deduplicate (row, col, relation) and count repeats as weights
+        num_rel = max(len(self.relation_names), 1)
+        keys = (rows * n + cols) * num_rel + rels
+        keys, counts = np.unique(keys, return_counts=True)
+        rels = keys % num_rel
+        cols = (keys // num_rel) % max(n, 1)
+        rows = keys // num_rel // max(n, 1)
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+        mention_indptr, mention_chunks = _group(
+            np.frombuffer(self._mention_entity, dtype=np.int32),
+            np.frombuffer(self._mention_chunk, dtype=np.int32),
+            n,
+        )
+
+        names = np.array(self._names, dtype=f"<U{max((len(s) for s in self._names), default=1)}")
+        return KnowledgeGraph(
+            names=names,
+            name_order=np.argsort(names, kind="stable").astype(np.int32),
+            entity_types=np.frombuffer(self._types, dtype=np.uint16).copy(),
+            indptr=indptr,
+            neighbors=cols.astype(np.int32),
+            edge_types=rels.astype(np.uint16),
+            edge_weights=counts.astype(np.uint32),
+            mention_indptr=mention_indptr,
+            mention_chunks=mention_chunks,
+            entity_type_names=list(self.entity_type_names),
+            relation_names=list(self.relation_names),
+        )
+
+
+def _group(keys: np.ndarray, values: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR of unique (key, value) pairs, values sorted within each key"""
+    pairs = np.unique(keys.astype(np.int64) << 32 | values.astype(np.int64))
+    keys, values = pairs >> 32, pairs & 0xFFFFFFFF
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=indptr[1:])
+    return indptr, values.astype(np.int32)
+
+
+class KnowledgeGraph:
+    """Immutable CSR knowledge graph; build with KnowledgeGraphBuilder"""
+
+    ARRAYS = (
+        "names", "name_order", "entity_types",
+        "indptr", "neighbors", "edge_types", "edge_weights",
+        "mention_indptr", "mention_chunks",
+    )
+
+    def __init__(
+        self,
+        names: np.ndarray,
+        name_order: np.ndarray,
+        entity_types: np.ndarray,
+        indptr: np.ndarray,
+        neighbors: np.ndarray,
+        edge_types: np.ndarray,
+        edge_weights: np.ndarray,
+        mention_indptr: np.ndarray,
+        mention_chunks: np.ndarray,
+        entity_type_names: List[str],
+        relation_names: List[str],
+    ):
+        self.names = names
+        self.name_order = name_order
+        self.entity_types = entity_types
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.edge_types = edge_types
+        self.edge_weights = edge_weights
+        self.mention_indptr = mention_indptr
+        self.mention_chunks = mention_chunks
+        self.entity_type_names = entity_type_names
+        self.relation_names = relation_names
+
+    @property
+    def num_entities(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_edges(self) -> int:
+        """Stored (directed) adjacency entries; each relation is stored twice"""
+        return len(self.neighbors)
+
+    def memory_usage(self) -> int:
+        return int(sum(getattr(self, name).nbytes for name in self.ARRAYS))
+
+    # ==========================================
+    # LOOKUPS
+    # ==========================================
+
+    def entity_id(self, name: str) -> int:
+        """Entity id for an exact name, or -1"""
+        pos = int(np.searchsorted(self.names, name, sorter=self.name_order))
+        if pos < self.num_entities and self.names[self.name_order[pos]] == name:
+            return int(self.name_order[pos])
+        return -1
+
+    def relation_id(self, relation: str) -> int:
+        try:
+            return self.relation_names.index(relation)
+        except ValueError:
+            return -1
+
+    def neighbors_of(self, entity: int) -> List[Tuple[str, str, int]]:
+        """(neighbor name, relation, weight) for one entity"""
+        start, end = self.indptr[entity], self.indptr[entity + 1]
+        return [
+            (str(self.names[n]), self.relation_names[r], int(w))
+            for n, r, w in zip(self.neighbors[start:end], self.edge_types[start:end], self.edge_weights[start:end])
+        ]
+
+    # ==========================================
+    # TRAVERSAL
+    # ==========================================
+
+    def k_hop(
+        self,
+        seeds: Sequence[int],
+        hops: int = 2,
+        relations: Optional[Iterable[str]] = None,
+        max_entities: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Entities within `hops` steps of the seeds (1-3 is the useful range)
+
+        Each step gathers every adjacency slice of the frontier at once.
+        Returns (entity ids, hop distance), seeds included at distance 0, in
+        BFS order. `relations` restricts the edge types followed;
+        `max_entities` stops once that many entities were reached
+        """
+        n = self.num_entities
+        frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+        frontier = frontier[(frontier >= 0) & (frontier < n)]
+        allowed = None
+        if relations is not None:
+            ids = [self.relation_id(r) for r in relations]
+            allowed = np.zeros(max(len(self.relation_names), 1), dtype=bool)
+            allowed[[i for i in ids if i >= 0]] = True
+
+        visited = np.zeros(n, dtype=bool)
+        visited[frontier] = True
+        found = [frontier]
+        distances = [np.zeros(len(frontier), dtype=np.int8)]
+        total = len(frontier)
+
+        for hop in range(1, hops + 1):
+            if len(frontier) == 0 or (max_entities is not None and total >= max_entities):
+                break
+            edges = _slice_indexes(self.indptr[frontier], self.indptr[frontier + 1])
+            if allowed is not None:
+                edges = edges[allowed[self.edge_types[edges]]]
+            reached = self.neighbors[edges]
+            frontier = np.unique(reached[~visited[reached]]).astype(np.int64)
+            if max_entities is not None:
+                frontier = frontier[:max(max_entities - total, 0)]
+            visited[frontier] = True
+            found.append(frontier)
+            distances.append(np.full(len(frontier), hop, dtype=np.int8))
+            total += len(frontier)
+
+        return np.concatenate(found), np.concatenate(distances)
+
+    def chunks_for(self, entities: Sequence[int]) -> np.ndarray:
+        """Sorted unique chunk indexes mentioning any of the entities"""
+        entities = np.asarray(entities, dtype=np.int64)
+        if len(entities) == 0:
+            return np.array([], dtype=np.int32)
+        idx = _slice_indexes(self.mention_indptr[entities], self.mention_indptr[entities + 1])
+        return np.unique(self.mention_chunks[idx])
+
+    # ==========================================
+    # PERSISTENCE
+    # ==========================================
+
+    def save(self, directory: PathLike) -> Dict[str, Path]:
+        """Write kg_*.npy + kg_meta.json into `directory`; returns {file name: path}"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for name in self.ARRAYS:
+            path = directory / f"{FILE_PREFIX}{name}.npy"
+            np.save(path, getattr(self, name), allow_pickle=False)
+            files[path.name] = path
+        meta_path = directory / f"{FILE_PREFIX}meta.json"
+        meta_path.write_text(json.dumps({
+            "entity_type_names": self.entity_type_names,
+            "relation_names": self.relation_names,
+            "num_entities": self.num_entities,
+            "num_edges": self.num_edges,
+        }))
+        files[meta_path.name] = meta_path
+        return files
+
+    @classmethod
+    def load(cls, directory: PathLike, mmap: bool = True) -> "KnowledgeGraph":
+        directory = Path(directory)
+        meta = json.loads((directory / f"{FILE_PREFIX}meta.json").read_text())
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(directory / f"{FILE_PREFIX}{name}.npy", mmap_mode=mode, allow_pickle=False)
+            for name in cls.ARRAYS
+        }
+        return cls(
+            entity_type_names=meta["entity_type_names"],
+            relation_names=meta["relation_names"],
+            **arrays,
+        )
+
+    @staticmethod
+    def exists(directory: PathLike) -> bool:
+        return (Path(directory) / f"{FILE_PREFIX}meta.json").exists()
+
+
+def _slice_indexes(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of range(s, e) for every (s, e) pair, without a Python loop"""
+    lengths = (ends - starts).astype(np.int64)
+    total = int(lengths.sum())
+    if total == 0:
+        return np.array([], dtype=np.int64)
+    offsets = np.repeat(starts.astype(np.int64) - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total, dtype=np.int64)
+
+
+# ==========================================
+# ENTITY EXTRACTION
+# ==========================================
+
+# Runs of capitalized words / acronyms, allowing lowercase connectors ("Bank of America")
+_ENTITY = re.compile(
+    r"\b(?:[A-Z][\w&'.-]*[A-Za-z0-9]|[A-Z]{2,})"
+    r"(?:\s+(?:of|for|de|the)?\s*(?:[A-Z][\w&'.-]*[A-Za-z0-9]|[A-Z]{2,}))*"
+)
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_LEADING = frozenset("""
+A An And As At But By For From He Her His How I If In Into It Its Our She So That
+The Their Then There These They This To We What When Where Which While Who Why With You
+""".split())
+
+
+def extract_entities(sentence: str) -> List[Tuple[str, str]]:
+    """
+    Heuristic (name, type) extraction: capitalized phrases and acronyms
+    Good enough to link chunks that talk about the same things
+    """
+    entities = []
+    for match in _ENTITY.finditer(sentence):
+        words = match.group(0).split()
+        while words and words[0] in _LEADING:
+            words = words[1:]
+        if not words:
+            continue
+        name = " ".join(words)
+        if len(name) < 3:
+            continue
+        entity_type = "acronym" if name.isupper() and len(words) == 1 else "phrase"
+        entities.append((name, entity_type))
+    return entities
+
+
+def build_from_chunks(chunks: Iterable[str], max_entities_per_sentence: int = 12) -> KnowledgeGraph:
+    """
+    Build a graph from chunk texts
+    - every entity records which chunks mention it
+    - entities in the same sentence get a `co_sentence` relation
+    - consecutive entities across sentences of a chunk get `co_chunk`
+    """
+    builder = KnowledgeGraphBuilder()
+    for chunk_index, text in enumerate(chunks):
+        previous: List[str] = []
+        for sentence in _SENTENCE.split(text):
+            found = extract_entities(sentence)[:max_entities_per_sentence]
+            names = list(dict.fromkeys(name for name, _ in found))
+            for name, entity_type in found:
+                builder.add_mention(name, chunk_index, entity_type)
+            for i, source in enumerate(names):
+                for target in names[i + 1:]:
+                    builder.add_relation(source, "co_sentence", target)
+            if previous and names:
+                builder.add_relation(previous[-1], "co_chunk", names[0])
+            previous = names or previous
+    return builder.build()
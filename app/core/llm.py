@@ -0,0 +1,354 @@
+"""
+LLM Client
+One pooled, concurrency-limited client for OpenAI-compatible HTTP APIs
+
+- a single shared httpx.AsyncClient: connections are pooled and kept
+  alive, over HTTP/2 when `h2` is installed (https providers then
+  multiplex every request over one connection)
+- a global semaphore caps the requests in flight to the provider; queued
+  callers wait for a slot instead of piling up connections
+- connect errors, timeouts, 429 and 5xx are retried with full-jitter
+  exponential backoff (Retry-After honoured), but only while the next
+  attempt still fits in the request's latency budget
+- streams are retried only until the response starts: after the first
+  token the caller has already shown output
+- embedding calls made within LLM_BATCH_WINDOW_MS of each other go out as
+  one request (the endpoint takes a list of inputs; chat completions
+  do not, so those are only bounded, never merged)
+
+OpenAI, Groq and the bundled stub server (app/core/llm_stub.py) all speak
+the OpenAI wire format; LLM_PROVIDER picks the base URL, key and default
+model.
+"""
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from app.config import settings
+import asyncio
+import httpx
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# provider -> (base URL, default chat model)
+PROVIDERS = {
+    "openai": ("https://api.openai.com/v1", "gpt-4o-mini"),
+    "groq": ("https://api.groq.com/openai/v1", "llama-3.1-8b-instant"),
+    "stub": ("http://127.0.0.1:8001/v1", "stub-chat"),
+}
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LLMError(Exception):
+    """The provider refused the request, or kept failing until the latency budget ran out"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class Completion:
+    text: str
+    model: str
+    usage: Dict[str, int]
+    latency_ms: float
+    attempts: int
+
+
+class LLMClient:
+    """Shared HTTP client for chat completions (plain and streamed) and embeddings"""
+
+    def __init__(self, base_url: str, api_key: str = "", model: str = "", embedding_model: str = "",
+                 max_concurrency: int = 8, max_connections: int = 20, keepalive_seconds: float = 30.0,
+                 http2: bool = True, timeout: float = 30.0, latency_budget: float = 20.0,
+                 max_retries: int = 4, backoff_base: float = 0.25, backoff_cap: float = 4.0,
+                 batch_window_ms: float = 5.0, batch_max_inputs: int = 256,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.embedding_model = embedding_model
+        self.max_connections = max_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.timeout = timeout
+        self.latency_budget = latency_budget
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.batch_window = batch_window_ms / 1000
+        self.batch_max_inputs = max(1, batch_max_inputs)
+        self.transport = transport
+        self.max_concurrency = max(1, max_concurrency)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pending_embeddings: List[Tuple[str, asyncio.Future]] = []
+        self._batch_task: Optional[asyncio.Task] = None
+        self.in_flight = 0
+
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "embedding_requests": 0,
+            "embedded_inputs": 0,
+        }
+
+        if http2 and not HTTP2_AVAILABLE:
+            logger.info("h2 not installed: LLM client falls back to HTTP/1.1 keep-alive")
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_seconds,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=min(5.0, self.timeout)),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                transport=self.transport,
+            )
+        return self._client
+
+    # ==========================================
+    # TRANSPORT
+    # ==========================================
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def _send(self, path: str, payload: Dict[str, Any], stream: bool = False) -> Tuple[httpx.Response, int]:
+        """
+        POST with retries -> (successful response, attempts)
+
+        With stream=True the body is left unread and the concurrency slot stays
+        taken: the caller must hand the response to _finish_stream()
+        """
+        deadline = time.monotonic() + self.latency_budget
+        attempt = 0
+        while True:
+            response = None
+            await self._semaphore.acquire()
+            self.in_flight += 1
+            keep_slot = False
+            try:
+                remaining = max(deadline - time.monotonic(), 0.1)
+                request = self._http().build_request(
+                    "POST", path, json=payload,
+                    timeout=httpx.Timeout(min(self.timeout, remaining), connect=min(5.0, remaining)),
+                )
+                self.counters["requests"] += 1
+                response = await self._http().send(request, stream=stream)
+                if response.status_code < 400:
+                    keep_slot = stream
+                    return response, attempt + 1
+                body = (await response.aread()).decode("utf-8", "replace")
+                await response.aclose()
+                error = LLMError(f"{response.status_code} from {path}: {body[:200]}", response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    self.counters["failures"] += 1
+                    raise error
+            except httpx.TransportError as e:
+                error = LLMError(f"{type(e).__name__} on {path}: {e}")
+            finally:
+                if not keep_slot:
+                    self.in_flight -= 1
+                    self._semaphore.release()
+
+            delay = self._backoff(attempt, response)
+            attempt += 1
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                self.counters["failures"] += 1
+                raise error
+            self.counters["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def _finish_stream(self, response: httpx.Response):
+        try:
+            await response.aclose()
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def _count_usage(self, usage: Optional[Dict[str, int]]):
+        if usage:
+            self.counters["prompt_tokens"] += usage.get("prompt_tokens", 0)
+            self.counters["completion_tokens"] += usage.get("completion_tokens", 0)
+
+    # ==========================================
+    # CHAT
+    # ==========================================
+
+    async def complete(self, messages: List[Dict[str, str]], model: Optional[str] = None, **params) -> Completion:
+        started = time.perf_counter()
+        response, attempts = await self._send(
+            "/chat/completions", {"model": model or self.model, "messages": messages, **params}
+        )
+        data = response.json()
+        self._count_usage(data.get("usage"))
+        return Completion(
+            text=data["choices"][0]["message"]["content"] or "",
+            model=data.get("model", model or self.model),
+            usage=data.get("usage") or {},
+            latency_ms=(time.perf_counter() - started) * 1000,
+            attempts=attempts,
+        )
+
+    async def complete_many(self, conversations: List[List[Dict[str, str]]], **params) -> List[Completion]:
+        """Several independent completions, concurrently (bounded by the client's semaphore)"""
+        return list(await asyncio.gather(*(self.complete(messages, **params) for messages in conversations)))
+
+    async def stream(self, messages: List[Dict[str, str]], model: Optional[str] = None, **params) -> AsyncIterator[str]:
+        """Yield content deltas as the provider produces them"""
+        response, _ = await self._send(
+            "/chat/completions",
+            {"model": model or self.model, "messages": messages, "stream": True,
+             "stream_options": {"include_usage": True}, **params},
+            stream=True,
+        )
+        try:
+            done = False
+            # Read to the end even after [DONE]: a fully read response returns its connection to the pool
+            async for line in response.aiter_lines():
+                if done or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    done = True
+                    continue
+                chunk = json.loads(data)
+                self._count_usage(chunk.get("usage"))
+                for choice in chunk.get("choices") or ():
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        yield piece
+        except httpx.TransportError as e:
+            self.counters["failures"] += 1
+            raise LLMError(f"Stream interrupted: {e}") from e
+        finally:
+            await self._finish_stream(response)
+
+    # ==========================================
+    # EMBEDDINGS (micro-batched)
+    # ==========================================
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._pending_embeddings.append((text, future))
+            futures.append(future)
+        if self._batch_task is None:
+            self._batch_task = asyncio.create_task(self._flush_embeddings(), name="llm-embedding-batch")
+        return list(await asyncio.gather(*futures))
+
+    async def _flush_embeddings(self):
+        await asyncio.sleep(self.batch_window)
+        # Calls arriving from here on start the next batch
+        self._batch_task = None
+        pending, self._pending_embeddings = self._pending_embeddings, []
+        batches = [pending[i:i + self.batch_max_inputs] for i in range(0, len(pending), self.batch_max_inputs)]
+        await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        try:
+            response, _ = await self._send(
+                "/embeddings", {"model": self.embedding_model, "input": [text for text, _ in batch]}
+            )
+            data = response.json()
+            self.counters["embedding_requests"] += 1
+            self.counters["embedded_inputs"] += len(batch)
+            self._count_usage(data.get("usage"))
+            for item in data["data"]:
+                future = batch[item["index"]][1]
+                if not future.done():
+                    future.set_result(item["embedding"])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    # ==========================================
+    # LIFECYCLE
+    # ==========================================
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "http2": self.http2,
+            "base_url": self.base_url,
+            "model": self.model,
+        }
+
+
+def create_llm_client(**overrides) -> LLMClient:
+    """LLMClient configured from settings (LLM_PROVIDER and the LLM_* knobs)"""
+    base_url, default_model = PROVIDERS[settings.LLM_PROVIDER]
+    api_key = {
+        "openai": settings.OPENAI_API_KEY,
+        "groq": settings.GROQ_API_KEY,
+        "stub": "stub",
+    }[settings.LLM_PROVIDER]
+    options = dict(
+        base_url=settings.LLM_BASE_URL or base_url,
+        api_key=api_key,
+        model=settings.LLM_MODEL or default_model,
+        embedding_model=settings.LLM_EMBEDDING_MODEL,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        http2=settings.LLM_HTTP2,
+        timeout=settings.LLM_TIMEOUT_SECONDS,
+        latency_budget=settings.LLM_LATENCY_BUDGET_SECONDS,
+        max_retries=settings.LLM_MAX_RETRIES,
+        batch_window_ms=settings.LLM_BATCH_WINDOW_MS,
+        batch_max_inputs=settings.LLM_BATCH_MAX_INPUTS,
+    )
+    options.update(overrides)
+    return LLMClient(**options)
+
+
+llm_client = create_llm_client()
+
+
+__all__ = [
+    'Completion',
+    'LLMClient',
+    'LLMError',
+    'create_llm_client',
+    'llm_client',
+]
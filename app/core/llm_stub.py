@@ -0,0 +1,198 @@
+"""
+LLM Stub Server
+Offline stand-in for an OpenAI-compatible provider, for load tests
+
+Serves /v1/chat/completions (plain and `stream: true` server-sent events)
+and /v1/embeddings with provider-like latency:
+- time to first token drawn around `ttft_ms`, then `token_ms` per token
+- a configurable share of requests fails with 429 (Retry-After) or 503,
+  to exercise client retries
+Answers are deterministic in the prompt, so caches see stable output.
+GET /stats reports requests, peak concurrency and the number of distinct
+client connections (one per connection the client opened: pooling shows
+up as a small number).
+
+Usage:
+    python -m app.core.llm_stub [--port 8001] [--ttft-ms 300] [--token-ms 15] [--error-rate 0.02]
+    LLM_PROVIDER=stub uvicorn app.app:app ...
+"""
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import struct
+import time
+
+WORDS = (
+    "the document describes a graph of entities linked by relations and the answer draws on "
+    "retrieved passages that mention the query terms together with their neighbours"
+).split()
+
+
+@dataclass
+class StubConfig:
+    ttft_ms: float = 300.0
+    token_ms: float = 15.0
+    tokens: int = 60
+    error_rate: float = 0.0
+    embedding_ms: float = 40.0
+    embedding_dim: int = 64
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    errors_injected: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    connections: set = field(default_factory=set)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["connections"] = len(self.connections)
+        return data
+
+
+def _answer(messages: List[Dict[str, str]], tokens: int) -> List[str]:
+    prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    rng = random.Random(hashlib.sha256(prompt.encode()).digest())
+    head = f"Stub answer to: {prompt[:60]}".split()
+    return [w + " " for w in head + [rng.choice(WORDS) for _ in range(max(0, tokens - len(head)))]]
+
+
+def _vector(text: str, dim: int) -> List[float]:
+    digest = hashlib.shake_256(text.encode()).digest(4 * dim)
+    return [round(v / 2 ** 31 - 1, 6) for v in struct.unpack(f"<{dim}I", digest)]
+
+
+def create_stub_app(config: StubConfig = None) -> Starlette:
+    config = config or StubConfig()
+    stats = StubStats()
+
+    def begin(request: Request):
+        stats.requests += 1
+        client = request.scope.get("client")
+        if client:
+            stats.connections.add(tuple(client))
+
+    def injected_error():
+        if config.error_rate and random.random() < config.error_rate:
+            stats.errors_injected += 1
+            if random.random() < 0.5:
+                return JSONResponse({"error": {"message": "rate limited (stub)"}}, 429, headers={"Retry-After": "0"})
+            return JSONResponse({"error": {"message": "overloaded (stub)"}}, 503)
+        return None
+
+    async def track(coro):
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        try:
+            return await coro
+        finally:
+            stats.in_flight -= 1
+
+    async def ttft():
+        await asyncio.sleep(random.uniform(0.5, 1.5) * config.ttft_ms / 1000)
+
+    async def chat(request: Request):
+        begin(request)
+        error = injected_error()
+        if error is not None:
+            return error
+        body = await request.json()
+        pieces = _answer(body.get("messages", []), int(body.get("max_tokens") or config.tokens))
+        model = body.get("model", "stub-chat")
+        usage = {"prompt_tokens": sum(len(m.get("content", "").split()) for m in body.get("messages", [])),
+                 "completion_tokens": len(pieces)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not body.get("stream"):
+            async def generate():
+                await ttft()
+                await asyncio.sleep(config.token_ms * len(pieces) / 1000)
+            await track(generate())
+            return JSONResponse({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        async def events():
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            try:
+                await ttft()
+                for i, piece in enumerate(pieces):
+                    if i:
+                        await asyncio.sleep(config.token_ms / 1000)
+                    chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "model": model,
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield f"data: {json.dumps({'id': 'chatcmpl-stub', 'choices': [], 'usage': usage})}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                stats.in_flight -= 1
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def embeddings(request: Request):
+        begin(request)
+        error = injected_error()
+        if error is not None:
+            return error
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        # Batches cost a fixed overhead plus a little per input, like real providers
+        await track(asyncio.sleep((config.embedding_ms + 0.05 * len(inputs)) / 1000))
+        return JSONResponse({
+            "object": "list", "model": body.get("model", "stub-embedding"),
+            "data": [{"object": "embedding", "index": i, "embedding": _vector(text, config.embedding_dim)}
+                     for i, text in enumerate(inputs)],
+            "usage": {"prompt_tokens": sum(len(t.split()) for t in inputs), "total_tokens": sum(len(t.split()) for t in inputs)},
+        })
+
+    async def get_stats(request: Request):
+        return JSONResponse({**stats.to_dict(), "config": asdict(config)})
+
+    app = Starlette(routes=[
+        Route("/v1/chat/completions", chat, methods=["POST"]),
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+        Route("/stats", get_stats),
+    ])
+    app.state.config = config
+    app.state.stats = stats
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.core.llm_stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    config = StubConfig(ttft_ms=args.ttft_ms, token_ms=args.token_ms, tokens=args.tokens, error_rate=args.error_rate)
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+__all__ = [
+    'StubConfig',
+    'create_stub_app',
+]
+
+
+if __name__ == "__main__":
+    main()
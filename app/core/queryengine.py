@@ -1 +1,305 @@
-# Your query engine goes here
\ No newline at end of file
+"""
+Query Engine
+Array-backed BM25 lexical index over document chunks
+
+Postings are stored CSR-style in flat NumPy arrays:
+    vocab[t]                          sorted term strings (term id = position)
+    indptr[t]:indptr[t+1]             slice of the postings for term t
+    postings[i], weights[i]           chunk index and precomputed BM25 weight
+
+Postings of a term are sorted by chunk index. The BM25 term weight (idf *
+saturated tf with length normalization) is computed once at build time, so
+a query only sums precomputed weights before an argpartition for the top k.
+Every array is saved as .npy and can be memory-mapped on load.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+import json
+import re
+
+import numpy as np
+
+PathLike = Union[str, Path]
+
+FILE_PREFIX = "bm25_"
+MAX_TERM_LENGTH = 32
+# Postings budget for the candidate-generating (rarest) query terms in search()
+SPARSE_MAX_POSTINGS = 8192
+
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its
+me my no not of on or our she so than that the their them then there these they
+this to was we were what when where which who will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, stopwords and single characters dropped"""
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in _TOKEN.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+@dataclass
+class SearchHit:
+    """One retrieved chunk (index into the chunk list the index was built from)"""
+    index: int
+    score: float
+
+
+class BM25Index:
+    """
+    Immutable BM25 index; build with BM25Index.build(), persist with save()/load()
+    """
+
+    def __init__(
+        self,
+        vocab: np.ndarray,
+        indptr: np.ndarray,
+        postings: np.ndarray,
+        weights: np.ndarray,
+        max_weights: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings = postings
+        self.weights = weights
+        self.max_weights = max_weights
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def num_terms(self) -> int:
+        return len(self.vocab)
+
+    # ==========================================
+    # BUILD
+    # ==========================================
+
+    @classmethod
+    def build(cls, texts: Iterable[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index an iterable of chunk texts (streamed, one pass)"""
+        term_ids: Dict[str, int] = {}
+        rows: List[np.ndarray] = []
+        cols: List[np.ndarray] = []
+        tfs: List[np.ndarray] = []
+        doc_lengths: List[int] = []
+
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            if not counts:
+                continue
+            ids = [term_ids.setdefault(term, len(term_ids)) for term in counts]
+            rows.append(np.asarray(ids, dtype=np.int64))
+            cols.append(np.full(len(ids), doc, dtype=np.int32))
+            tfs.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+
+        lengths = np.asarray(doc_lengths, dtype=np.int32)
+        num_docs = len(lengths)
+        if not term_ids:
+            return cls(
+                vocab=np.array([], dtype=f"<U{MAX_TERM_LENGTH}"),
+                indptr=np.zeros(1, dtype=np.int64),
+                postings=np.array([], dtype=np.int32),
+                weights=np.array([], dtype=np.float32),
+                max_weights=np.array([], dtype=np.float32),
+                doc_lengths=lengths, k1=k1, b=b,
+            )
+
+        # Renumber terms in sorted order so lookups can binary-search the vocab array
+        terms = np.array(list(term_ids), dtype=f"<U{MAX_TERM_LENGTH}")
+        order = np.argsort(terms, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        term_col = rank[np.concatenate(rows)]
+        doc_col = np.concatenate(cols)
+        tf = np.concatenate(tfs)
+
+        # Group postings by term (stable keeps chunk order inside a term)
+        by_term = np.argsort(term_col, kind="stable")
+        term_col, doc_col, tf = term_col[by_term], doc_col[by_term], tf[by_term]
+        df = np.bincount(term_col, minlength=len(terms))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+
+        avgdl = max(float(lengths.mean()), 1.0)
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = k1 * (1.0 - b + b * lengths[doc_col] / avgdl)
+        weights = (idf[term_col] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+        # Upper bound of each term's contribution, used to prune in search()
+        max_weights = np.maximum.reduceat(weights, indptr[:-1])
+
+        return cls(
+            vocab=terms[order],
+            indptr=indptr,
+            postings=doc_col,
+            weights=weights,
+            max_weights=max_weights,
+            doc_lengths=lengths,
+            k1=k1,
+            b=b,
+        )
+
+    # ==========================================
+    # QUERY
+    # ==========================================
+
+    def term_id(self, term: str) -> int:
+        """Vocabulary position of `term`, or -1"""
+        pos = int(np.searchsorted(self.vocab, term))
+        if pos < len(self.vocab) and self.vocab[pos] == term:
+            return pos
+        return -1
+
+    def scores(self, query: str) -> np.ndarray:
+        """Dense BM25 score vector over all chunks"""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.term_id(term)
+            if t < 0:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            # A chunk appears at most once per term, so fancy-index += is safe
+            scores[self.postings[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query: str, k: int = 10) -> List[SearchHit]:
+        """
+        Top-k chunks by BM25 score, best first
+
+        MaxScore-style evaluation that never touches the full chunk range:
+        - rare query terms (up to SPARSE_MAX_POSTINGS postings in total) are
+          merged with unique + bincount into a candidate set
+        - common terms only add their weights to those candidates, found by
+          binary search in their doc-sorted postings
+        - if a chunk outside the candidates could still beat the k-th score
+          (the common terms' max weights sum above it) fall back to a dense
+          accumulation
+        """
+        if k <= 0:
+            return []
+        terms = []
+        for term in set(tokenize(query)):
+            t = self.term_id(term)
+            if t >= 0:
+                terms.append((int(self.indptr[t + 1] - self.indptr[t]), t))
+        if not terms:
+            return []
+        terms.sort()
+
+        essential, common, budget = [], [], 0
+        for df, t in terms:
+            if not essential or budget + df <= SPARSE_MAX_POSTINGS:
+                essential.append(t)
+                budget += df
+            else:
+                common.append(t)
+
+        candidates, totals = self._merge_postings(essential)
+        for t in common:
+            docs, weights = self._postings(t)
+            pos = np.searchsorted(docs, candidates)
+            pos[pos == len(docs)] = 0
+            hit = docs[pos] == candidates
+            totals[hit] += weights[pos[hit]]
+
+        if common:
+            outside_bound = float(self.max_weights[common].sum())
+            kth = np.partition(totals, -k)[-k] if len(totals) >= k else 0.0
+            if kth < outside_bound:
+                candidates, totals = self._dense_top(essential + common, k)
+
+        if len(candidates) > k:
+            top = np.argpartition(totals, -k)[-k:]
+            candidates, totals = candidates[top], totals[top]
+        order = np.argsort(-totals, kind="stable")
+        return [SearchHit(index=int(candidates[i]), score=float(totals[i])) for i in order]
+
+    def _postings(self, t: int):
+        start, end = self.indptr[t], self.indptr[t + 1]
+        return self.postings[start:end], self.weights[start:end]
+
+    def _merge_postings(self, term_ids: List[int]):
+        """(sorted chunk indexes, summed weights) over the union of the terms' postings"""
+        if len(term_ids) == 1:
+            docs, weights = self._postings(term_ids[0])
+            return np.array(docs), weights.astype(np.float64)
+        parts = [self._postings(t) for t in term_ids]
+        candidates, inverse = np.unique(np.concatenate([d for d, _ in parts]), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate([w for _, w in parts]))
+        return candidates, totals
+
+    def _dense_top(self, term_ids: List[int], k: int):
+        """Exact fallback: scatter every posting into a dense vector, then select"""
+        dense = np.zeros(self.num_docs, dtype=np.float64)
+        for t in term_ids:
+            docs, weights = self._postings(t)
+            dense[docs] += weights
+        # Only chunks with a posting can score; gather them (duplicates included) and dedupe the top
+        docs = np.concatenate([self._postings(t)[0] for t in term_ids])
+        take = min(len(docs), k * len(term_ids))
+        top = np.argpartition(dense[docs], -take)[-take:]
+        candidates = np.unique(docs[top])
+        return candidates, dense[candidates]
+
+    def memory_usage(self) -> int:
+        """Bytes referenced by the index arrays (memory-mapped ones live in the page cache)"""
+        return int(sum(getattr(self, name).nbytes for name in self.ARRAYS))
+
+    # ==========================================
+    # PERSISTENCE
+    # ==========================================
+
+    ARRAYS = ("vocab", "indptr", "postings", "weights", "max_weights", "doc_lengths")
+
+    def save(self, directory: PathLike) -> Dict[str, Path]:
+        """Write bm25_*.npy + bm25_meta.json into `directory`; returns {file name: path}"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for name in self.ARRAYS:
+            path = directory / f"{FILE_PREFIX}{name}.npy"
+            np.save(path, getattr(self, name), allow_pickle=False)
+            files[path.name] = path
+        meta_path = directory / f"{FILE_PREFIX}meta.json"
+        meta_path.write_text(json.dumps({
+            "k1": self.k1,
+            "b": self.b,
+            "num_docs": self.num_docs,
+            "num_terms": self.num_terms,
+        }))
+        files[meta_path.name] = meta_path
+        return files
+
+    @classmethod
+    def load(cls, directory: PathLike, mmap: bool = True) -> "BM25Index":
+        """Open a saved index; with mmap=True the arrays are paged in lazily by the OS"""
+        directory = Path(directory)
+        meta = json.loads((directory / f"{FILE_PREFIX}meta.json").read_text())
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(directory / f"{FILE_PREFIX}{name}.npy", mmap_mode=mode, allow_pickle=False)
+            for name in cls.ARRAYS
+        }
+        return cls(k1=meta["k1"], b=meta["b"], **arrays)
+
+    @staticmethod
+    def exists(directory: PathLike) -> bool:
+        return (Path(directory) / f"{FILE_PREFIX}meta.json").exists()
+
@@ -0,0 +1,190 @@
+"""
+Analytics Ingestion Buffer
+In-process queue that batches Visitor / ApiUsage rows and bulk-inserts
+them from a background task, so request handling never waits on the DB
+"""
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.database.crud import bulk_insert
+from app.database.writer import run_write
+from app.database.models import Visitor, ApiUsage
+from app.database.rollups import record_visitor_rollups, record_api_rollups
+from app.config import settings
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Event kinds accepted by the buffer, mapped to the table they land in
+EVENT_MODELS = {
+    "visitor": Visitor,
+    "api": ApiUsage,
+}
+
+
+class AnalyticsBuffer:
+    """
+    Bounded in-memory queue with a background flusher
+
+    - submit() is O(1) and never touches the database
+    - a batch is flushed as soon as `batch_size` events are pending,
+      or after `flush_interval` seconds, whichever comes first
+    - once `max_pending` events are queued new events are dropped
+      (and counted) instead of growing memory without bound
+    - stop() drains whatever is still queued
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.batch_size, max_pending)
+
+        self._pending: Deque[Tuple[str, Dict[str, Any]]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+        self.counters = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped_full": 0,
+            "dropped_errors": 0,
+            "batches": 0,
+            "size_flushes": 0,
+            "deadline_flushes": 0,
+            "high_watermark": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def submit(self, kind: str, row: Dict[str, Any]) -> bool:
+        """
+        Queue one event for insertion
+        Returns False if the event was dropped because the queue is full
+        """
+        if kind not in EVENT_MODELS:
+            raise ValueError(f"Unknown analytics event kind: {kind}")
+
+        if len(self._pending) >= self.max_pending:
+            self.counters["dropped_full"] += 1
+            return False
+
+        self._pending.append((kind, row))
+        self.counters["enqueued"] += 1
+
+        pending = len(self._pending)
+        if pending > self.counters["high_watermark"]:
+            self.counters["high_watermark"] = pending
+
+        if pending >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    async def start(self):
+        """Start the background flusher on the running event loop"""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="analytics-flusher")
+        logger.info(
+            f"Analytics buffer started (batch={self.batch_size}, "
+            f"interval={self.flush_interval}s, max_pending={self.max_pending})"
+        )
+
+    async def stop(self):
+        """Stop the flusher and drain everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        while self._pending:
+            await self.flush()
+        logger.info(f"Analytics buffer drained: {self.stats()}")
+
+    async def _run(self):
+        while True:
+            deadline_hit = False
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                deadline_hit = True
+            self._wakeup.clear()
+
+            if not self._pending:
+                continue
+
+            if deadline_hit:
+                self.counters["deadline_flushes"] += 1
+            else:
+                self.counters["size_flushes"] += 1
+
+            # Keep flushing while full batches are waiting
+            await self.flush()
+            while len(self._pending) >= self.batch_size:
+                await self.flush()
+
+    async def flush(self):
+        """Write at most one batch of pending events"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            batch = self._take_batch()
+            if not batch:
+                return
+            try:
+                await run_write(self._write_batch, batch)
+                self.counters["written"] += len(batch)
+                self.counters["batches"] += 1
+            except Exception as e:
+                # Analytics must never take the app down; count and move on
+                self.counters["dropped_errors"] += len(batch)
+                logger.error(f"Analytics flush failed ({len(batch)} events dropped): {e}")
+
+    def _take_batch(self) -> List[Tuple[str, Dict[str, Any]]]:
+        size = min(self.batch_size, len(self._pending))
+        return [self._pending.popleft() for _ in range(size)]
+
+    @staticmethod
+    def _write_batch(db, batch: List[Tuple[str, Dict[str, Any]]]):
+        """Bulk insert a batch, multi-row INSERTs per table, plus its rollups"""
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for kind, row in batch:
+            grouped.setdefault(kind, []).append(row)
+
+        # Same transaction, so raw rows and rollups (row counts included) never drift apart
+        for kind, rows in grouped.items():
+            bulk_insert(db, EVENT_MODELS[kind], rows)
+
+        record_visitor_rollups(db, grouped.get("visitor", ()))
+        record_api_rollups(db, grouped.get("api", ()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "pending": len(self._pending),
+            "running": self.running,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "max_pending": self.max_pending,
+        }
+
+
+analytics_buffer = AnalyticsBuffer(
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.ANALYTICS_MAX_PENDING,
+)
+
+__all__ = [
+    'AnalyticsBuffer',
+    'analytics_buffer',
+    'EVENT_MODELS',
+]
@@ -2,10 +2,13 @@
 Database Connection Management
 Handles database initilization and session management
 """
-from sqlalchemy import Engine, create_engine, event
+from sqlalchemy import Engine, create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from contextlib import contextmanager
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, List
 from app.config import settings
 import logging
 
@@ -16,37 +19,191 @@ engine_kwargs = {
     "pool_pre_ping": True,
 }
 
-if "sqlite" in settings.DATABASE_URL:
-    engine_kwargs.update({
+
+# ==========================================
+# SQLITE TUNING
+# ==========================================
+
+def _is_sqlite_file(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:")
+
+
+# File-backed SQLite runs single-writer / multi-reader: WAL journal, one write
+# connection (fed by the group-commit writer in app.database.writer) and a
+# small pool of query_only read connections that never wait for writers
+SQLITE_SINGLE_WRITER = _is_sqlite_file(settings.DATABASE_URL)
+
+
+def sqlite_pragmas(read_only: bool = False) -> List[str]:
+    pragmas = [
+        "PRAGMA foreign_keys=ON",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        # Negative cache_size is in KiB (per connection)
+        f"PRAGMA cache_size={-settings.SQLITE_CACHE_SIZE_MB * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+    else:
+        pragmas.insert(0, "PRAGMA journal_mode=WAL")
+    return pragmas
+
+
+def configure_sqlite(sync_engine: Engine, read_only: bool = False):
+    """
+    Apply the pragmas on every new connection
+
+    Write connections also take transaction control away from the sqlite3
+    module (isolation_level=None + explicit BEGIN IMMEDIATE), so SAVEPOINTs
+    work and the write lock is taken up front instead of on the first write
+    """
+    pragmas = sqlite_pragmas(read_only)
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        if not read_only:
+            dbapi_conn.isolation_level = None
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    if not read_only:
+        @event.listens_for(sync_engine, "begin")
+        def begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+if SQLITE_SINGLE_WRITER:
+    engine = create_engine(settings.DATABASE_URL, **{
+        **engine_kwargs,
         "connect_args": {"check_same_thread": False},
-        "poolclass": StaticPool,
+        # The one write connection: sessions queue for it instead of racing for the file lock
+        "poolclass": QueuePool,
+        "pool_size": 1,
+        "max_overflow": 0,
+        "pool_timeout": 30,
     })
+    configure_sqlite(engine)
 
-elif "postgresql" in settings.DATABASE_URL:
-    engine_kwargs.update({
-        "pool_size": 5,
-        "max_overflow": 10,
+    read_engine = create_engine(settings.DATABASE_URL, **{
+        **engine_kwargs,
+        "connect_args": {"check_same_thread": False},
+        "poolclass": QueuePool,
+        "pool_size": settings.SQLITE_READ_POOL_SIZE,
+        "max_overflow": 0,
         "pool_timeout": 30,
-        "pool_recycle": 3600,
     })
+    configure_sqlite(read_engine, read_only=True)
 
-else: logger.warning(f"Using default database configuration for: {settings.DATABASE_URL.split('://')[0]}")
-
-engine = create_engine(settings.DATABASE_URL, **engine_kwargs)
+elif "sqlite" in settings.DATABASE_URL:
+    # In-memory database: every session must share the one connection
+    engine = create_engine(settings.DATABASE_URL, **{
+        **engine_kwargs,
+        "connect_args": {"check_same_thread": False},
+        "poolclass": StaticPool,
+    })
+    read_engine = engine
 
-if "sqlite" in settings.DATABASE_URL:
     @event.listens_for(engine, "connect")
     def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor = dbapi_conn.cursor()
         cursor.execute("PRAGMA foreign_keys=ON")
         cursor.close()
 
+else:
+    if "postgresql" in settings.DATABASE_URL:
+        engine_kwargs.update({
+            "pool_size": 5,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+            "pool_recycle": 3600,
+        })
+    else:
+        logger.warning(f"Using default database configuration for: {settings.DATABASE_URL.split('://')[0]}")
+
+    engine = create_engine(settings.DATABASE_URL, **engine_kwargs)
+    read_engine = engine
+
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine
 )
 
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=read_engine
+)
+
+
+# ==========================================
+# ASYNC ENGINE (route handlers)
+# ==========================================
+
+# Async drivers for the sync URLs used everywhere else
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for: {backend}")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+async_engine_kwargs = {
+    "echo": settings.DEBUG,
+    "pool_pre_ping": True,
+}
+
+if SQLITE_SINGLE_WRITER:
+    async_engine_kwargs.update({
+        # Readers only: writes go through app.database.writer.run_write().
+        # aiosqlite runs each connection on its own thread; keep a few open instead
+        # of the dialect's default NullPool (a new thread + connect per session)
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.SQLITE_READ_POOL_SIZE,
+        "max_overflow": 0,
+        "pool_timeout": 30,
+        "connect_args": {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000},
+    })
+
+elif "postgresql" in settings.DATABASE_URL:
+    async_engine_kwargs.update({
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 30,
+        "pool_recycle": 3600,
+    })
+
+elif "sqlite" in settings.DATABASE_URL:
+    async_engine_kwargs["poolclass"] = StaticPool
+
+async_engine = create_async_engine(async_database_url(settings.DATABASE_URL), **async_engine_kwargs)
+
+if SQLITE_SINGLE_WRITER:
+    configure_sqlite(async_engine.sync_engine, read_only=True)
+
+# Same Session subclass as SessionLocal, so session event hooks (rollups,
+# cache invalidation) registered on SessionLocal fire for async sessions too
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=SessionLocal.class_,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 
 @contextmanager
 def get_db():
@@ -61,6 +218,33 @@ def get_db():
     finally:
         db.close()
 
+@contextmanager
+def get_read_db():
+    """Read-only session (SQLite: one of the query_only reader connections, never blocked by writes)"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Async counterpart of get_db() for route handlers: commits on success, rolls back on error
+    With file-backed SQLite the async engine only has reader connections;
+    writes go through app.database.writer.run_write()
+    """
+    db = AsyncSessionLocal()
+    try:
+        yield db
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Database error: {e}")
+        raise
+    finally:
+        await db.close()
+
 def get_db_dependency():
     """
     FastAPI dependency for database sessions
@@ -77,6 +261,19 @@ def get_db_dependency():
     finally:
         db.close()
 
+async def get_async_db_dependency() -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI dependency for async database sessions
+
+    Usage:
+        @app.get("/users")
+        async def get_users(db: AsyncSession = Depends(get_async_db_dependency)):
+            return (await db.scalars(select(User))).all()
+    """
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """
     Initialize database - create all tables
@@ -84,8 +281,12 @@ def init_db():
     """
 
     from app.database.models import Base
+    from app.database.rollups import seed_rollups_if_empty
     try:
         Base.metadata.create_all(bind=engine)
+        add_missing_columns(Base.metadata)
+        add_missing_indexes(Base.metadata)
+        seed_rollups_if_empty()
 
         db_type = "SQLite" if "sqlite" in settings.DATABASE_URL else "PostgreSQL"
         logger.info(f"✅ Database initialized successfully ({db_type})")
@@ -98,6 +299,40 @@ def init_db():
         logger.error(f" Database initialization failed: {e}")
         raise
 
+def add_missing_columns(metadata):
+    """
+    Add nullable columns that were added to a model after its table was created
+    create_all() never alters existing tables; there are no migrations for additive changes
+    """
+    with engine.begin() as conn:
+        # Inspect on the same connection: the SQLite write engine has only one
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+                logger.info(f"Added column {table.name}.{column.name}")
+
+def add_missing_indexes(metadata):
+    """Create indexes that were added to a model after its table was created"""
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    logger.info(f"Added index {table.name}.{index.name}")
+
 def drop_all_tables():
     """
     Drop all tabels - Use with caution!
@@ -157,38 +392,51 @@ def get_database_info() -> dict:
     }
 
 
+async def get_table_counts_async() -> dict:
+    """get_table_counts() through the async engine"""
+
+    from app.database.rollups import read_table_counts
+
+    async with get_async_db() as db:
+        counts = await db.run_sync(read_table_counts)
+    counts['total'] = sum(counts.values())
+
+    return counts
+
+
 def get_table_counts() -> dict:
     """
     Get row counts for all tables
+    Read from the table_row_counts rollup instead of COUNT(*) scans
     """
 
-    from app.database.models import (
-        ContactMessage, ChatSession, ChatQuery,
-        EmailGeneration, Visitor, ProjectView, ApiUsage
-    )
+    from app.database.rollups import read_table_counts
 
-    counts = {}
-    with get_db() as db:
-        counts['contact_messages'] = db.query(ContactMessage).count()
-        counts['chat_sessions'] = db.query(ChatSession).count()
-        counts['chat_queries'] = db.query(ChatQuery).count()
-        counts['email_generations'] = db.query(EmailGeneration).count()
-        counts['visitors'] = db.query(Visitor).count()
-        counts['project_views'] = db.query(ProjectView).count()
-        counts['api_usage'] = db.query(ApiUsage).count()
-        counts['total'] = sum(counts.values())
+    with get_read_db() as db:
+        counts = read_table_counts(db)
+    counts['total'] = sum(counts.values())
 
     return counts
 
 __all__ = [
     'engine',
+    'read_engine',
     'SessionLocal',
+    'ReadSessionLocal',
+    'SQLITE_SINGLE_WRITER',
+    'async_engine',
+    'AsyncSessionLocal',
+    'async_database_url',
     'get_db',
+    'get_read_db',
+    'get_async_db',
     'get_db_dependency',
+    'get_async_db_dependency',
     'init_db',
     'drop_all_tables',
     'reset_database',
     'check_database_connection',
     'get_database_info',
-    'get_table_counts'
+    'get_table_counts',
+    'get_table_counts_async'
 ]
\ No newline at end of file
@@ -1 +1,272 @@
-# CRUD operations go here
\ No newline at end of file
+"""
+CRUD Operations
+SQLAlchemy Core statements for the writes and common reads behind the routes
+
+- inserts are `insert(table).values([...])`: one multi-row INSERT per batch
+  instead of one ORM object (and flush) per row
+- counters are bumped in place with `UPDATE ... SET x = x + n RETURNING ...`,
+  never loaded, modified in Python and flushed back
+- read statements are built once at import with bind parameters, so every
+  call reuses the engine's compiled form instead of rebuilding the query
+- long listings are keyset-paginated on (timestamp, id), see app/utils/pagination.py
+
+Every function takes a (sync) Session as its first argument and works
+unchanged under `run_write(fn, ...)`, `with get_db() as db` and
+`await async_db.run_sync(fn, ...)`. Core statements skip the ORM flush hooks,
+so table_row_counts (row counts and the summary figures) is kept in step here.
+"""
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from app.database.models import ApiUsage, ChatQuery, ChatSession, ContactMessage, EmailGeneration
+from app.database.rollups import (
+    ACTIVE_SESSIONS, COUNTED_TABLES, SESSION_AVG_SUM, UNREAD_MESSAGES, bump_row_counts, to_us
+)
+from app.utils.pagination import Position, after, cursor_timestamp, encode_cursor
+
+# SQLite (>= 3.32) and PostgreSQL both cap a statement at 32766 bound parameters
+MAX_BIND_PARAMS = 32766
+
+
+# ==========================================
+# INSERTS
+# ==========================================
+
+def bulk_insert(db, model, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Insert rows with multi-row INSERT ... VALUES statements
+    Rows are grouped by the columns they set (column defaults fill the rest);
+    each group is split to stay under MAX_BIND_PARAMS. Returns rows inserted
+    """
+    table = model.__table__
+    total = 0
+    keyed = sorted(((tuple(sorted(row)), row) for row in rows), key=lambda item: item[0])
+    for columns, group in groupby(keyed, key=lambda item: item[0]):
+        group = [row for _, row in group]
+        per_statement = max(1, MAX_BIND_PARAMS // max(1, len(columns)))
+        for start in range(0, len(group), per_statement):
+            db.execute(insert(table).values(group[start:start + per_statement]))
+        total += len(group)
+
+    if total and table.name in COUNTED_TABLES:
+        bump_row_counts(db, {table.name: total})
+    return total
+
+
+def create_chat_session(db, session_id: str, pdf_filename: str, file_size_bytes: Optional[int] = None,
+                        ip_hash: Optional[str] = None, user_agent: Optional[str] = None) -> None:
+    bulk_insert(db, ChatSession, [{
+        "session_id": session_id,
+        "pdf_filename": pdf_filename,
+        "file_size_bytes": file_size_bytes,
+        "ip_hash": ip_hash,
+        "user_agent": user_agent,
+    }])
+
+
+def create_contact_message(db, name: str, email: str, message: str) -> None:
+    bulk_insert(db, ContactMessage, [{"name": name, "email": email, "message": message}])
+    bump_row_counts(db, {UNREAD_MESSAGES: 1})
+
+
+def record_email_generation(db, job_url: Optional[str], job_title: Optional[str], company_name: Optional[str],
+                            resume_filename: Optional[str], generated_email: Optional[str],
+                            generation_time_ms: float, cache_hit: bool = False,
+                            time_saved_ms: Optional[float] = None, ip_hash: Optional[str] = None,
+                            user_agent: Optional[str] = None, error_message: Optional[str] = None) -> None:
+    bulk_insert(db, EmailGeneration, [{
+        "job_url": job_url,
+        "job_title": job_title,
+        "company_name": company_name,
+        "resume_filename": resume_filename,
+        "generated_email": generated_email,
+        "generation_time_ms": generation_time_ms,
+        "cache_hit": cache_hit,
+        "time_saved_ms": time_saved_ms,
+        "ip_hash": ip_hash,
+        "user_agent": user_agent,
+        "success": error_message is None,
+        "error_message": error_message,
+    }])
+
+
+# ==========================================
+# CHAT QUERIES
+# ==========================================
+
+_chat_sessions = ChatSession.__table__
+
+_BUMP_SESSION_STATS_PLAIN = (
+    update(_chat_sessions)
+    .where(_chat_sessions.c.session_id == bindparam("match_session_id"))
+    .values(
+        queries_count=func.coalesce(_chat_sessions.c.queries_count, 0) + 1,
+        total_response_time_ms=func.coalesce(_chat_sessions.c.total_response_time_ms, 0.0) + bindparam("response_time_ms"),
+        # SET expressions see the row as it was before the UPDATE
+        avg_response_time_ms=(
+            (func.coalesce(_chat_sessions.c.total_response_time_ms, 0.0) + bindparam("response_time_ms"))
+            / (func.coalesce(_chat_sessions.c.queries_count, 0) + 1)
+        ),
+        last_activity=func.now(),
+    )
+)
+
+_BUMP_SESSION_STATS = _BUMP_SESSION_STATS_PLAIN.returning(
+    _chat_sessions.c.queries_count, _chat_sessions.c.recent_ttft_ms, _chat_sessions.c.total_response_time_ms
+)
+
+_SESSION_TTFT = (
+    select(_chat_sessions.c.queries_count, _chat_sessions.c.recent_ttft_ms, _chat_sessions.c.total_response_time_ms)
+    .where(_chat_sessions.c.session_id == bindparam("match_session_id"))
+)
+
+_SESSION_AVERAGE = (
+    select(_chat_sessions.c.queries_count, _chat_sessions.c.avg_response_time_ms)
+    .where(_chat_sessions.c.session_id == bindparam("match_session_id"))
+)
+
+_SET_SESSION_TTFT = (
+    update(_chat_sessions)
+    .where(_chat_sessions.c.session_id == bindparam("match_session_id"))
+)
+
+
+def update_session_stats(db, session_id: str, response_time_ms: float, ttft_ms: Optional[float] = None) -> Optional[int]:
+    """
+    Count one answered query against a session, atomically in the database
+    Returns the new queries_count, or None if the session does not exist
+    """
+    params = {"match_session_id": session_id, "response_time_ms": response_time_ms}
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(_BUMP_SESSION_STATS, params).first()
+    else:
+        result = db.execute(_BUMP_SESSION_STATS_PLAIN, params)
+        row = db.execute(_SESSION_TTFT, params).first() if result.rowcount else None
+    if row is None:
+        return None
+
+    queries_count, recent_ttft_ms, total_ms = row
+    # The session's average moved from (total - this) / (count - 1) to total / count
+    average_us = to_us(total_ms / queries_count)
+    if queries_count == 1:
+        bump_row_counts(db, {ACTIVE_SESSIONS: 1, SESSION_AVG_SUM: average_us})
+    else:
+        previous_us = to_us((total_ms - response_time_ms) / (queries_count - 1))
+        bump_row_counts(db, {SESSION_AVG_SUM: average_us - previous_us})
+
+    if ttft_ms is not None:
+        # The UPDATE above holds the row lock until commit, so nothing can
+        # slip into the window between reading and writing it back
+        db.execute(
+            _SET_SESSION_TTFT.values(ChatSession.ttft_window(recent_ttft_ms, ttft_ms)),
+            {"match_session_id": session_id},
+        )
+    return queries_count
+
+
+def record_query(db, session_id: str, query: str, response_text: str, response_time_ms: float,
+                 ttft_ms: Optional[float], cache_hit: bool = False, time_saved_ms: Optional[float] = None,
+                 error_message: Optional[str] = None) -> None:
+    """Log a chatbot query; successful ones also count towards the session's stats"""
+    bulk_insert(db, ChatQuery, [{
+        "session_id": session_id,
+        "query": query,
+        "response": response_text,
+        "response_time_ms": response_time_ms,
+        "ttft_ms": ttft_ms,
+        "cache_hit": cache_hit,
+        "time_saved_ms": time_saved_ms,
+        "error": error_message is not None,
+        "error_message": error_message,
+    }])
+    if error_message is None:
+        update_session_stats(db, session_id, response_time_ms, ttft_ms)
+
+
+def delete_chat_session(db, session_id: str) -> Tuple[int, int]:
+    """Delete a session and its query log -> (sessions deleted, queries deleted)"""
+    stats = db.execute(_SESSION_AVERAGE, {"match_session_id": session_id}).first()
+    queries = db.execute(
+        delete(ChatQuery.__table__).where(ChatQuery.__table__.c.session_id == session_id)
+    ).rowcount
+    sessions = db.execute(
+        delete(_chat_sessions).where(_chat_sessions.c.session_id == session_id)
+    ).rowcount
+    deltas = {
+        ChatQuery.__tablename__: -max(queries, 0),
+        ChatSession.__tablename__: -max(sessions, 0),
+    }
+    if sessions > 0 and stats is not None and stats.queries_count:
+        deltas[ACTIVE_SESSIONS] = -1
+        deltas[SESSION_AVG_SUM] = -to_us(stats.avg_response_time_ms or 0.0)
+    bump_row_counts(db, deltas)
+    return sessions, queries
+
+
+# ==========================================
+# READS
+# ==========================================
+
+_SESSION_BY_ID = select(ChatSession).where(ChatSession.session_id == bindparam("session_id"))
+
+# Served by idx_chat_session_time (session_id, timestamp); the id tiebreak is the rowid it carries
+_SESSION_QUERIES = (
+    select(ChatQuery, cursor_timestamp(ChatQuery.timestamp))
+    .where(ChatQuery.session_id == bindparam("session_id"))
+    .order_by(ChatQuery.timestamp.asc(), ChatQuery.id.asc())
+)
+
+_API_USAGE = (
+    select(ApiUsage, cursor_timestamp(ApiUsage.timestamp))
+    .order_by(ApiUsage.timestamp.asc(), ApiUsage.id.asc())
+)
+
+
+def get_chat_session(db, session_id: str) -> Optional[ChatSession]:
+    return db.scalar(_SESSION_BY_ID, {"session_id": session_id})
+
+
+def _keyset_page(db, stmt, model, limit: int, position: Optional[Position], params: Dict[str, Any]):
+    """One page of a (timestamp, id) ordered select -> (objects, next cursor or None)"""
+    stmt = stmt.where(after(model.timestamp, model.id, position, db.get_bind().dialect.name)).limit(limit + 1)
+    rows = db.execute(stmt, params).all()
+    if len(rows) <= limit:
+        return [obj for obj, _ in rows], None
+    rows = rows[:limit]
+    last, last_timestamp = rows[-1]
+    return [obj for obj, _ in rows], encode_cursor(last_timestamp, last.id)
+
+
+def get_session_history(db, session_id: str, limit: int,
+                        position: Optional[Position] = None) -> Tuple[Optional[ChatSession], List[ChatQuery], Optional[str]]:
+    """
+    A session and one page of its queries, oldest first
+    -> (session, queries, next cursor); (None, [], None) if the session does not exist
+    """
+    session = get_chat_session(db, session_id)
+    if session is None:
+        return None, [], None
+    queries, next_cursor = _keyset_page(db, _SESSION_QUERIES, ChatQuery, limit, position, {"session_id": session_id})
+    return session, queries, next_cursor
+
+
+def get_api_usage_page(db, limit: int, position: Optional[Position] = None,
+                       endpoint: Optional[str] = None) -> Tuple[List[ApiUsage], Optional[str]]:
+    """Raw api_usage rows, oldest first (one endpoint: served by idx_api_endpoint_time)"""
+    stmt = _API_USAGE if endpoint is None else _API_USAGE.where(ApiUsage.endpoint == endpoint)
+    return _keyset_page(db, stmt, ApiUsage, limit, position, {})
+
+
+__all__ = [
+    'MAX_BIND_PARAMS',
+    'bulk_insert',
+    'create_chat_session',
+    'create_contact_message',
+    'record_email_generation',
+    'update_session_stats',
+    'record_query',
+    'delete_chat_session',
+    'get_chat_session',
+    'get_session_history',
+    'get_api_usage_page',
+]
@@ -0,0 +1,101 @@
+"""
+Raw Table Exports
+Streams visitors / api_usage / chat_queries rows as NDJSON or CSV
+
+Rows come off a server-side cursor (`stream_results` + `yield_per`) on the
+async read engine and are encoded one partition at a time, so memory stays
+flat however many rows match. Order is (timestamp, id), the same keyset the
+paginated endpoints use: an interrupted export resumes with `cursor` set to
+the last row written.
+"""
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+from sqlalchemy import select
+from app.database.connection import async_engine
+from app.database.models import ApiUsage, ChatQuery, Visitor
+from app.utils.pagination import Position, after
+import csv
+import io
+import json
+
+# name -> (model, column that narrows the export through its (column, timestamp) index)
+EXPORT_TABLES = {
+    "visitors": (Visitor, "page"),            # idx_visitor_page_time
+    "api_usage": (ApiUsage, "endpoint"),      # idx_api_endpoint_time
+    "chat_queries": (ChatQuery, "session_id"),  # idx_chat_session_time
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_statement(table: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     key: Optional[str] = None, position: Optional[Position] = None):
+    """SELECT for one export; raises KeyError for tables that cannot be exported"""
+    model, key_column = EXPORT_TABLES[table]
+    stmt = select(model.__table__).order_by(model.timestamp.asc(), model.id.asc())
+    if key is not None:
+        stmt = stmt.where(getattr(model, key_column) == key)
+    if since is not None:
+        stmt = stmt.where(model.timestamp >= since)
+    if until is not None:
+        stmt = stmt.where(model.timestamp < until)
+    if position is not None:
+        stmt = stmt.where(after(model.timestamp, model.id, position, async_engine.dialect.name))
+    return stmt
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+async def _partitions(stmt, batch_rows: int) -> AsyncIterator[Sequence[Any]]:
+    async with async_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=batch_rows))
+        async for partition in result.partitions():
+            yield partition
+
+
+async def iter_ndjson(stmt, batch_rows: int) -> AsyncIterator[str]:
+    """One JSON object per line"""
+    async for partition in _partitions(stmt, batch_rows):
+        yield "".join(
+            json.dumps({k: _plain(v) for k, v in row._mapping.items()}) + "\n"
+            for row in partition
+        )
+
+
+async def iter_csv(stmt, batch_rows: int) -> AsyncIterator[str]:
+    """Header row, then one CSV line per row (NULL -> empty field)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in stmt.selected_columns])
+    async for partition in _partitions(stmt, batch_rows):
+        writer.writerows([_plain(v) for v in row] for row in partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_export(stmt, fmt: str, batch_rows: int) -> AsyncIterator[str]:
+    return iter_csv(stmt, batch_rows) if fmt == "csv" else iter_ndjson(stmt, batch_rows)
+
+
+def export_headers(table: str, fmt: str) -> Dict[str, str]:
+    filename = f"{table}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return {"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+
+
+__all__ = [
+    'EXPORT_TABLES',
+    'EXPORT_FORMATS',
+    'export_statement',
+    'iter_export',
+    'export_headers',
+]
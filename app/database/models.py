@@ -2,11 +2,12 @@
 Database Models
 SQLAlchemy models for the portfolio application with comprehensive tracking
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Float, Index, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, Boolean, Float, Index, ForeignKey, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import json
 
 Base = declarative_base()
 
@@ -66,6 +67,11 @@ class ChatSession(Base):
     queries_count = Column(Integer, default=0)
     avg_response_time_ms = Column(Float)
     total_response_time_ms = Column(Float, default=0.0)
+
+    # Time to first token (streamed answers); percentiles over the last TTFT_WINDOW queries
+    recent_ttft_ms = Column(Text)  # JSON list
+    ttft_p50_ms = Column(Float)
+    ttft_p95_ms = Column(Float)
     
     # Timestamps
     created_at = Column(DateTime, default=func.now(), index=True)
@@ -85,16 +91,36 @@ class ChatSession(Base):
             'pdf_filename': self.pdf_filename,
             'queries_count': self.queries_count,
             'avg_response_time_ms': round(self.avg_response_time_ms, 2) if self.avg_response_time_ms else None,
+            'ttft_p50_ms': round(self.ttft_p50_ms, 2) if self.ttft_p50_ms is not None else None,
+            'ttft_p95_ms': round(self.ttft_p95_ms, 2) if self.ttft_p95_ms is not None else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'last_activity': self.last_activity.isoformat() if self.last_activity else None
         }
     
-    def update_stats(self, response_time_ms: float):
+    TTFT_WINDOW = 50
+
+    def update_stats(self, response_time_ms: float, ttft_ms: Optional[float] = None):
         """Update session statistics with new query"""
         self.queries_count += 1
         self.total_response_time_ms += response_time_ms
         self.avg_response_time_ms = self.total_response_time_ms / self.queries_count
         self.last_activity = datetime.utcnow()
+
+        if ttft_ms is not None:
+            for key, value in self.ttft_window(self.recent_ttft_ms, ttft_ms).items():
+                setattr(self, key, value)
+
+    @classmethod
+    def ttft_window(cls, recent_ttft_ms: Optional[str], ttft_ms: float) -> Dict[str, Any]:
+        """Column values after adding `ttft_ms` to the rolling TTFT window"""
+        recent = json.loads(recent_ttft_ms or "[]")[-(cls.TTFT_WINDOW - 1):]
+        recent.append(round(ttft_ms, 2))
+        ordered = sorted(recent)
+        return {
+            'recent_ttft_ms': json.dumps(recent),
+            'ttft_p50_ms': ordered[int(0.50 * (len(ordered) - 1))],
+            'ttft_p95_ms': ordered[int(0.95 * (len(ordered) - 1))],
+        }
     
     def __repr__(self):
         return f"<ChatSession(session_id='{self.session_id}', queries={self.queries_count})>"
@@ -113,7 +139,12 @@ class ChatQuery(Base):
     
     # Performance tracking
     response_time_ms = Column(Float)
+    ttft_ms = Column(Float)  # Time to first token; equals response_time_ms when not streamed
     timestamp = Column(DateTime, default=func.now(), index=True)
+
+    # Answer cache
+    cache_hit = Column(Boolean, default=False)
+    time_saved_ms = Column(Float)  # Original answer time minus cached lookup time
     
     # Error tracking
     error = Column(Boolean, default=False)
@@ -121,6 +152,8 @@ class ChatQuery(Base):
     
     __table_args__ = (
         Index('idx_chat_session_time', 'session_id', 'timestamp'),
+        # TTFT percentiles (analytics): ranks are read off the index, never sorted
+        Index('idx_chat_query_ttft', 'error', 'ttft_ms'),
     )
     
     def to_dict(self) -> Dict[str, Any]:
@@ -130,7 +163,9 @@ class ChatQuery(Base):
             'query': self.query,
             'response': self.response,
             'response_time_ms': round(self.response_time_ms, 2) if self.response_time_ms else None,
+            'ttft_ms': round(self.ttft_ms, 2) if self.ttft_ms is not None else None,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
+            'cache_hit': bool(self.cache_hit),
             'error': self.error
         }
     
@@ -138,6 +173,67 @@ class ChatQuery(Base):
         return f"<ChatQuery(id={self.id}, session='{self.session_id[:8]}...')>"
 
 
+class IngestionJob(Base):
+    """Background processing of an uploaded chatbot PDF (one per ChatSession)"""
+    __tablename__ = 'ingestion_jobs'
+
+    STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(36), unique=True, nullable=False, index=True)
+    session_id = Column(String(100), nullable=False, index=True)
+
+    # Input (the upload is persisted to UPLOAD_DIR before the job is queued;
+    # uploads of already-cached documents are not kept)
+    sha256 = Column(String(64), nullable=False)
+    pdf_filename = Column(String(500))
+    file_path = Column(String(1000), nullable=False)
+    file_size_bytes = Column(Integer)
+
+    # Progress
+    status = Column(String(20), default='queued', nullable=False)
+    stage = Column(String(20), default='queued')  # queued, extracting, indexing, caching, ready, failed
+    progress = Column(Float, default=0.0)  # 0-100
+    pages_done = Column(Integer, default=0)
+    pages_total = Column(Integer)
+    attempts = Column(Integer, default=0)
+    error_message = Column(Text)
+
+    # Timestamps (updated_at doubles as the heartbeat of a running job)
+    created_at = Column(DateTime, default=func.now(), index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('idx_ingestion_status', 'status', 'created_at'),
+    )
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'session_id': self.session_id,
+            'filename': self.pdf_filename,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress or 0.0, 1),
+            'pages_done': self.pages_done,
+            'pages_total': self.pages_total,
+            'attempts': self.attempts,
+            'error': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<IngestionJob(job_id='{self.job_id}', status='{self.status}', stage='{self.stage}')>"
+
+
 class EmailGeneration(Base):
     """Track cold email generations"""
     __tablename__ = 'email_generations'
@@ -153,7 +249,11 @@ class EmailGeneration(Base):
     resume_filename = Column(String(500))
     generated_email = Column(Text)
     generation_time_ms = Column(Float)
-    
+
+    # Response cache
+    cache_hit = Column(Boolean, default=False)
+    time_saved_ms = Column(Float)  # Original generation time minus cached lookup time
+
     # Metadata
     created_at = Column(DateTime, default=func.now(), index=True)
     ip_hash = Column(String(64))
@@ -175,6 +275,7 @@ class EmailGeneration(Base):
             'company_name': self.company_name,
             'resume_filename': self.resume_filename,
             'generation_time_ms': round(self.generation_time_ms, 2) if self.generation_time_ms else None,
+            'cache_hit': bool(self.cache_hit),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'success': self.success
         }
@@ -301,4 +402,138 @@ class ApiUsage(Base):
     
     def __repr__(self):
         return f"<ApiUsage(endpoint='{self.endpoint}', status={self.status_code})>"
- 
\ No newline at end of file
+
+
+# ==========================================
+# ROLLUPS (maintained incrementally on write, see app/database/rollups.py)
+# ==========================================
+
+class DailyPageStat(Base):
+    """Rollup - page views per day, page and device type"""
+    __tablename__ = 'daily_page_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    day = Column(Date, nullable=False)
+    page = Column(String(200), nullable=False)
+    device_type = Column(String(50), nullable=False, default='unknown')
+
+    views = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('day', 'page', 'device_type', name='uq_daily_page_device'),
+        Index('idx_daily_page_day', 'day'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'page': self.page,
+            'device_type': self.device_type,
+            'views': self.views
+        }
+
+    def __repr__(self):
+        return f"<DailyPageStat(day='{self.day}', page='{self.page}', views={self.views})>"
+
+
+class DailyApiStat(Base):
+    """Rollup - API request counts and latency sums per day and endpoint"""
+    __tablename__ = 'daily_api_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    day = Column(Date, nullable=False)
+    endpoint = Column(String(200), nullable=False)
+
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    total_response_time_ms = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint('day', 'endpoint', name='uq_daily_api_endpoint'),
+        Index('idx_daily_api_day', 'day'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'endpoint': self.endpoint,
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_response_time_ms': round(self.total_response_time_ms / self.requests, 2) if self.requests else None
+        }
+
+    def __repr__(self):
+        return f"<DailyApiStat(day='{self.day}', endpoint='{self.endpoint}', requests={self.requests})>"
+
+
+class HourlyPageStat(Base):
+    """Rollup - page views per hour, page and device type (written when raw visitors are archived)"""
+    __tablename__ = 'hourly_page_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    hour = Column(DateTime, nullable=False)
+    page = Column(String(200), nullable=False)
+    device_type = Column(String(50), nullable=False, default='unknown')
+
+    views = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint('hour', 'page', 'device_type', name='uq_hourly_page_device'),
+        Index('idx_hourly_page_hour', 'hour'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hour': self.hour.isoformat() if self.hour else None,
+            'page': self.page,
+            'device_type': self.device_type,
+            'views': self.views
+        }
+
+    def __repr__(self):
+        return f"<HourlyPageStat(hour='{self.hour}', page='{self.page}', views={self.views})>"
+
+
+class HourlyApiStat(Base):
+    """Rollup - API request counts and latency sums per hour and endpoint (written when raw api_usage is archived)"""
+    __tablename__ = 'hourly_api_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+
+    hour = Column(DateTime, nullable=False)
+    endpoint = Column(String(200), nullable=False)
+
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    total_response_time_ms = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        UniqueConstraint('hour', 'endpoint', name='uq_hourly_api_endpoint'),
+        Index('idx_hourly_api_hour', 'hour'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'hour': self.hour.isoformat() if self.hour else None,
+            'endpoint': self.endpoint,
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_response_time_ms': round(self.total_response_time_ms / self.requests, 2) if self.requests else None
+        }
+
+    def __repr__(self):
+        return f"<HourlyApiStat(hour='{self.hour}', endpoint='{self.endpoint}', requests={self.requests})>"
+
+
+class TableRowCount(Base):
+    """Rollup - running row count per tracked table (replaces COUNT(*) scans)"""
+    __tablename__ = 'table_row_counts'
+
+    table_name = Column(String(100), primary_key=True)
+    row_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<TableRowCount(table='{self.table_name}', rows={self.row_count})>"
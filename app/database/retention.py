@@ -0,0 +1,376 @@
+"""
+Analytics Retention
+Keeps the raw visitors / api_usage tables to a rolling window
+
+Rows older than RETENTION_RAW_DAYS are, batch by batch:
+1. written to ARCHIVE_DIR/<table>/<YYYY-MM>/<first id>-<last id>.csv.gz.part
+2. folded into hourly_page_stats / hourly_api_stats and deleted, in one
+   short write transaction (through the SQLite writer, so requests keep
+   writing in between; batches are bounded and paced)
+3. renamed to .csv.gz once that transaction has committed
+
+A crash between 1 and 3 leaves a .part file behind; the next run keeps it
+if its rows are gone from the database and drops it otherwise, so nothing
+is archived twice or lost. daily_page_stats / daily_api_stats already cover
+every row (they are maintained on insert) and are left alone.
+
+One pass runs at a time: a pass holds an exclusive lock on
+ARCHIVE_DIR/.retention.lock and every worker that finds it taken skips
+its turn. As a second line, a batch whose delete finds rows already gone
+raises inside its write, so it is rolled back (nothing folded into the
+hourly rollups) and its .part files are dropped.
+
+The archive is read back with MonthlyArchive.iter_rows(). Passes run from
+the CLI below, or in the app every RETENTION_INTERVAL_HOURS when set.
+
+Usage:
+    python -m app.database.retention run [--days 90] [--dry-run]
+    python -m app.database.retention months <table>
+    python -m app.database.retention read <table> [--since 2026-01-01] [--until 2026-02-01] [--limit 20]
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from sqlalchemy import delete, func, select
+from app.config import settings
+from app.database.connection import get_read_db
+from app.database.models import ApiUsage, Visitor
+from app.database.rollups import bump_row_counts, record_hourly_api_rollups, record_hourly_visitor_rollups
+from app.database.writer import write_sync
+from starlette.concurrency import run_in_threadpool
+import argparse
+import asyncio
+import csv
+import fcntl
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# table -> (model, hourly rollup fed with the rows before they are deleted)
+RETAINED_TABLES: Dict[str, Tuple[Any, Callable[[Any, List[Dict[str, Any]]], None]]] = {
+    "visitors": (Visitor, record_hourly_visitor_rollups),
+    "api_usage": (ApiUsage, record_hourly_api_rollups),
+}
+
+PART_SUFFIX = ".csv.gz.part"
+FILE_SUFFIX = ".csv.gz"
+LOCK_NAME = ".retention.lock"
+
+
+class RetentionConflict(RuntimeError):
+    """Some rows of a batch were deleted by someone else first"""
+
+
+def _month(timestamp: datetime) -> str:
+    return f"{timestamp:%Y-%m}"
+
+
+def _months_between(since: Optional[datetime], until: Optional[datetime], month: str) -> bool:
+    if since is not None and month < _month(since):
+        return False
+    if until is not None and month > _month(until):
+        return False
+    return True
+
+
+class MonthlyArchive:
+    """CSV.gz files of archived rows, one directory per table and month"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _columns(self, table: str):
+        return RETAINED_TABLES[table][0].__table__.columns
+
+    # ==========================================
+    # WRITING
+    # ==========================================
+
+    def write_part(self, table: str, month: str, rows: List[Dict[str, Any]]) -> Path:
+        """Write rows (ascending id) to a .part file, durably; commit_part() publishes it"""
+        directory = self.root / table / month
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{rows[0]['id']:012d}-{rows[-1]['id']:012d}{PART_SUFFIX}"
+
+        names = [c.name for c in self._columns(table)]
+        with open(path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as gz:
+                text = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+                writer = csv.writer(text)
+                writer.writerow(names)
+                writer.writerows(
+                    [row[n].isoformat() if isinstance(row[n], datetime) else row[n] for n in names]
+                    for row in rows
+                )
+                text.flush()
+                text.detach()
+            raw.flush()
+            os.fsync(raw.fileno())
+        return path
+
+    @staticmethod
+    def commit_part(path: Path) -> Path:
+        final = path.with_name(path.name[:-len(PART_SUFFIX)] + FILE_SUFFIX)
+        os.replace(path, final)
+        return final
+
+    def recover(self, table: str, row_exists: Callable[[int], bool]) -> Dict[str, int]:
+        """Resolve .part files left by an interrupted run"""
+        kept = dropped = 0
+        for path in sorted((self.root / table).glob(f"*/*{PART_SUFFIX}")):
+            first_id = int(path.name.split("-", 1)[0])
+            if row_exists(first_id):
+                # Its delete never committed: the rows get archived again
+                path.unlink()
+                dropped += 1
+            else:
+                self.commit_part(path)
+                kept += 1
+        if kept or dropped:
+            logger.warning(f"Archive recovery for {table}: {kept} parts kept, {dropped} dropped")
+        return {"kept": kept, "dropped": dropped}
+
+    # ==========================================
+    # READING
+    # ==========================================
+
+    def months(self, table: str) -> List[str]:
+        directory = self.root / table
+        if not directory.is_dir():
+            return []
+        return sorted(p.name for p in directory.iterdir() if p.is_dir() and any(p.glob(f"*{FILE_SUFFIX}")))
+
+    def files(self, table: str, since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[Path]:
+        return [
+            path
+            for month in self.months(table) if _months_between(since, until, month)
+            for path in sorted((self.root / table / month).glob(f"*{FILE_SUFFIX}"))
+        ]
+
+    def iter_rows(self, table: str, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Archived rows of `table` with since <= timestamp < until, typed like the
+        model's columns, in id order within each month. Streams file by file
+        """
+        if table not in RETAINED_TABLES:
+            raise KeyError(table)
+        parsers = {c.name: _parser(c.type.python_type) for c in self._columns(table)}
+
+        for path in self.files(table, since, until):
+            with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+                for raw in csv.DictReader(f):
+                    row = {name: parsers[name](value) for name, value in raw.items()}
+                    timestamp = row.get("timestamp")
+                    if since is not None and (timestamp is None or timestamp < since):
+                        continue
+                    if until is not None and (timestamp is None or timestamp >= until):
+                        continue
+                    yield row
+
+    def stats(self) -> Dict[str, Any]:
+        result = {}
+        for table in RETAINED_TABLES:
+            files = self.files(table)
+            result[table] = {
+                "months": self.months(table),
+                "files": len(files),
+                "bytes": sum(p.stat().st_size for p in files),
+            }
+        return result
+
+
+def _parser(python_type) -> Callable[[str], Any]:
+    def parse(value: str) -> Any:
+        if value == "":
+            return None
+        if python_type is bool:
+            return value == "True"
+        if python_type is datetime:
+            return datetime.fromisoformat(value)
+        return python_type(value)
+    return parse
+
+
+# ==========================================
+# RETENTION RUN
+# ==========================================
+
+@contextmanager
+def retention_lock(root: str) -> Iterator[bool]:
+    """Non-blocking, exclusive lock on the archive (across processes) -> whether it was acquired"""
+    Path(root).mkdir(parents=True, exist_ok=True)
+    with open(Path(root) / LOCK_NAME, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _downsample_and_delete(db, table: str, rows: List[Dict[str, Any]]) -> int:
+    model, record_hourly = RETAINED_TABLES[table]
+    # Table columns only: an ORM attribute here would make the rollups'
+    # bulk-delete hook count these rows a second time
+    columns = model.__table__.c
+    deleted = db.execute(delete(model.__table__).where(columns.id.in_([r["id"] for r in rows]))).rowcount
+    if deleted != len(rows):
+        # Rolls the whole write back: the rows someone else deleted were
+        # folded and archived by them, and must not be again
+        raise RetentionConflict(f"{len(rows) - deleted} of {len(rows)} {table} rows were already deleted")
+    record_hourly(db, rows)
+    bump_row_counts(db, {table: -deleted})
+    return deleted
+
+
+def _row_exists(model) -> Callable[[int], bool]:
+    def exists(row_id: int) -> bool:
+        with get_read_db() as db:
+            return db.scalar(select(model.id).where(model.id == row_id)) is not None
+    return exists
+
+
+def archive_table(table: str, cutoff: datetime, archive: MonthlyArchive,
+                  batch_rows: int, pause: float) -> Dict[str, int]:
+    """Archive, downsample and delete every row of `table` older than `cutoff`"""
+    model, _ = RETAINED_TABLES[table]
+    archive.recover(table, _row_exists(model))
+    stmt = select(model.__table__).where(model.timestamp < cutoff).order_by(model.id).limit(batch_rows)
+
+    archived = batches = conflicts = 0
+    while True:
+        with get_read_db() as db:
+            rows = [dict(r) for r in db.execute(stmt).mappings()]
+        if not rows:
+            break
+
+        parts = [
+            archive.write_part(table, month, list(group))
+            for month, group in groupby(sorted(rows, key=lambda r: (_month(r["timestamp"]), r["id"])),
+                                        key=lambda r: _month(r["timestamp"]))
+        ]
+        try:
+            archived += write_sync(_downsample_and_delete, table, rows)
+        except RetentionConflict as e:
+            for part in parts:
+                part.unlink(missing_ok=True)
+            logger.warning(f"Retention {table} stopped: {e}")
+            conflicts += 1
+            break
+        for part in parts:
+            archive.commit_part(part)
+        batches += 1
+
+        if len(rows) < batch_rows:
+            break
+        # Let queued request writes through between batches
+        time.sleep(pause)
+
+    return {"archived": archived, "batches": batches, "conflicts": conflicts}
+
+
+def run_retention(days: Optional[int] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """One retention pass over every retained table (skipped while another process runs one)"""
+    days = settings.RETENTION_RAW_DAYS if days is None else days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    archive = MonthlyArchive(settings.ARCHIVE_DIR)
+
+    result: Dict[str, Any] = {"cutoff": cutoff.isoformat()}
+    if dry_run:
+        for table, (model, _) in RETAINED_TABLES.items():
+            with get_read_db() as db:
+                result[table] = {"would_archive": db.scalar(
+                    select(func.count(model.id)).where(model.timestamp < cutoff)
+                )}
+        return result
+
+    with retention_lock(settings.ARCHIVE_DIR) as acquired:
+        if not acquired:
+            logger.info("Retention pass skipped: another process is running one")
+            result["skipped"] = True
+            return result
+        for table in RETAINED_TABLES:
+            started = time.time()
+            result[table] = archive_table(
+                table, cutoff, archive,
+                batch_rows=settings.RETENTION_BATCH_ROWS,
+                pause=settings.RETENTION_BATCH_PAUSE_MS / 1000,
+            )
+            result[table]["seconds"] = round(time.time() - started, 2)
+            logger.info(f"Retention {table}: {result[table]}")
+    return result
+
+
+async def retention_loop(interval_hours: float, first_delay: float = 300.0):
+    """Background task: a retention pass shortly after startup, then every `interval_hours`"""
+    delay = first_delay
+    while True:
+        await asyncio.sleep(delay)
+        delay = interval_hours * 3600
+        try:
+            await run_in_threadpool(run_retention)
+        except Exception as e:
+            logger.error(f"Retention pass failed: {e}")
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.database.retention")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="archive, downsample and delete expired raw rows")
+    run.add_argument("--days", type=int, default=None, help=f"keep this many days raw (default {settings.RETENTION_RAW_DAYS})")
+    run.add_argument("--dry-run", action="store_true")
+
+    months = commands.add_parser("months", help="list archived months")
+    months.add_argument("table", choices=sorted(RETAINED_TABLES))
+
+    read = commands.add_parser("read", help="print archived rows as NDJSON")
+    read.add_argument("table", choices=sorted(RETAINED_TABLES))
+    read.add_argument("--since")
+    read.add_argument("--until")
+    read.add_argument("--limit", type=int, default=0, help="0 = all")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "run":
+        from app.database.connection import init_db
+        from app.database.writer import stop_writer
+        init_db()
+        try:
+            print(json.dumps(run_retention(args.days, args.dry_run), indent=2))
+        finally:
+            stop_writer()
+        return
+
+    archive = MonthlyArchive(settings.ARCHIVE_DIR)
+    if args.command == "months":
+        for month in archive.months(args.table):
+            print(month)
+        return
+
+    rows = archive.iter_rows(args.table, _parse_date(args.since), _parse_date(args.until))
+    for n, row in enumerate(rows, 1):
+        print(json.dumps(row, default=str))
+        if args.limit and n >= args.limit:
+            break
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
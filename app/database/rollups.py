@@ -0,0 +1,379 @@
+"""
+Analytics Rollups
+Keeps daily_page_stats, daily_api_stats and table_row_counts up to date as
+rows are written, so the analytics endpoints never scan the raw tables
+
+Besides a row count per tracked table, table_row_counts carries the
+summary figures ("<table>.<figure>" rows, see SUMMARY_COUNTERS): unread
+contact messages, chat sessions with answered queries, and the sum of
+those sessions' average response times (integer microseconds)
+
+Usage (rebuild rollups from the raw data and the hourly rollups of archived rows):
+    python -m app.database.rollups backfill
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, date
+from typing import Any, Dict, Iterable, List, Tuple
+from sqlalchemy import event, func, insert, update, delete, select, case
+from sqlalchemy.orm import Session
+from app.database.connection import SessionLocal, get_db
+from app.database.models import (
+    ContactMessage, ChatSession, ChatQuery, EmailGeneration,
+    Visitor, ProjectView, ApiUsage,
+    DailyPageStat, DailyApiStat, HourlyPageStat, HourlyApiStat, TableRowCount
+)
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Tables whose row counts are tracked in table_row_counts
+COUNTED_MODELS = (
+    ContactMessage, ChatSession, ChatQuery,
+    EmailGeneration, Visitor, ProjectView, ApiUsage
+)
+COUNTED_TABLES = tuple(m.__tablename__ for m in COUNTED_MODELS)
+
+UNREAD_MESSAGES = "contact_messages.unread"
+ACTIVE_SESSIONS = "chat_sessions.active"  # queries_count > 0
+SESSION_AVG_SUM = "chat_sessions.avg_response_us"  # sum of the active sessions' avg_response_time_ms
+SUMMARY_COUNTERS = (UNREAD_MESSAGES, ACTIVE_SESSIONS, SESSION_AVG_SUM)
+
+
+def to_us(ms: float) -> int:
+    return int(round(ms * 1000))
+
+
+def _day(timestamp: Any) -> date:
+    if isinstance(timestamp, datetime):
+        return timestamp.date()
+    if isinstance(timestamp, date):
+        return timestamp
+    return datetime.utcnow().date()
+
+
+def _hour(timestamp: Any) -> datetime:
+    if isinstance(timestamp, datetime):
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+
+def _dialect_insert(db):
+    """Pick the INSERT construct that supports ON CONFLICT for this backend"""
+    bind = db if hasattr(db, "dialect") else db.get_bind()
+    name = bind.dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert
+    return None
+
+
+def _upsert_increment(db, model, key_cols: Tuple[str, ...], rows: List[Dict[str, Any]], counters: Tuple[str, ...]):
+    """
+    Add each row's counter values onto the existing rollup row with the same key,
+    creating it if missing, in one executemany
+    """
+    if not rows:
+        return
+
+    dialect_insert = _dialect_insert(db)
+    if dialect_insert is not None:
+        stmt = dialect_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(key_cols),
+            set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in counters}
+        )
+        db.execute(stmt, rows)
+        return
+
+    # Generic fallback: UPDATE, then INSERT when nothing matched
+    for row in rows:
+        result = db.execute(
+            update(model)
+            .where(*(getattr(model, k) == row[k] for k in key_cols))
+            .values({c: getattr(model, c) + row[c] for c in counters})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(model).values(row))
+
+
+# ==========================================
+# INCREMENTAL UPDATES
+# ==========================================
+
+def record_visitor_rollups(db, visitors: Iterable[Dict[str, Any]]):
+    """Fold a batch of visitor rows into daily_page_stats"""
+    views = Counter()
+    for v in visitors:
+        views[(_day(v.get("timestamp")), v["page"], v.get("device_type") or "unknown")] += 1
+
+    _upsert_increment(
+        db, DailyPageStat, ("day", "page", "device_type"),
+        [{"day": d, "page": p, "device_type": dev, "views": n} for (d, p, dev), n in views.items()],
+        ("views",)
+    )
+
+
+def record_api_rollups(db, calls: Iterable[Dict[str, Any]]):
+    """Fold a batch of api_usage rows into daily_api_stats"""
+    stats: Dict[Tuple[date, str], List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    for c in calls:
+        entry = stats[(_day(c.get("timestamp")), c["endpoint"])]
+        entry[0] += 1
+        entry[1] += 1 if (c.get("status_code") or 0) >= 400 else 0
+        entry[2] += c.get("response_time_ms") or 0.0
+
+    _upsert_increment(
+        db, DailyApiStat, ("day", "endpoint"),
+        [
+            {"day": d, "endpoint": e, "requests": r, "errors": err, "total_response_time_ms": t}
+            for (d, e), (r, err, t) in stats.items()
+        ],
+        ("requests", "errors", "total_response_time_ms")
+    )
+
+
+def record_hourly_visitor_rollups(db, visitors: Iterable[Dict[str, Any]]):
+    """Fold visitor rows into hourly_page_stats (retention: before raw rows are archived)"""
+    views = Counter()
+    for v in visitors:
+        views[(_hour(v.get("timestamp")), v["page"], v.get("device_type") or "unknown")] += 1
+
+    _upsert_increment(
+        db, HourlyPageStat, ("hour", "page", "device_type"),
+        [{"hour": h, "page": p, "device_type": dev, "views": n} for (h, p, dev), n in views.items()],
+        ("views",)
+    )
+
+
+def record_hourly_api_rollups(db, calls: Iterable[Dict[str, Any]]):
+    """Fold api_usage rows into hourly_api_stats (retention: before raw rows are archived)"""
+    stats: Dict[Tuple[datetime, str], List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    for c in calls:
+        entry = stats[(_hour(c.get("timestamp")), c["endpoint"])]
+        entry[0] += 1
+        entry[1] += 1 if (c.get("status_code") or 0) >= 400 else 0
+        entry[2] += c.get("response_time_ms") or 0.0
+
+    _upsert_increment(
+        db, HourlyApiStat, ("hour", "endpoint"),
+        [
+            {"hour": h, "endpoint": e, "requests": r, "errors": err, "total_response_time_ms": t}
+            for (h, e), (r, err, t) in stats.items()
+        ],
+        ("requests", "errors", "total_response_time_ms")
+    )
+
+
+def bump_row_counts(db, deltas: Dict[str, int]):
+    """Apply +/- row count deltas to table_row_counts"""
+    rows = [{"table_name": t, "row_count": n} for t, n in deltas.items() if n]
+    _upsert_increment(db, TableRowCount, ("table_name",), rows, ("row_count",))
+
+
+def _row_dict(obj) -> Dict[str, Any]:
+    # Read loaded state only; expired server defaults must not trigger a SELECT mid-flush
+    return {c.key: obj.__dict__.get(c.key) for c in obj.__table__.columns}
+
+
+def _rollups_after_flush(session: Session, flush_context):
+    """Keep rollups in step with ORM inserts/deletes in the same transaction"""
+    deltas: Counter = Counter()
+    visitors, calls = [], []
+
+    for obj in session.new:
+        table = getattr(obj, "__tablename__", None)
+        if table in COUNTED_TABLES:
+            deltas[table] += 1
+        if isinstance(obj, ContactMessage) and not obj.__dict__.get("read"):
+            deltas[UNREAD_MESSAGES] += 1
+        elif isinstance(obj, Visitor):
+            visitors.append(_row_dict(obj))
+        elif isinstance(obj, ApiUsage):
+            calls.append(_row_dict(obj))
+
+    for obj in session.deleted:
+        table = getattr(obj, "__tablename__", None)
+        if table in COUNTED_TABLES:
+            deltas[table] -= 1
+        if isinstance(obj, ContactMessage) and not obj.__dict__.get("read"):
+            deltas[UNREAD_MESSAGES] -= 1
+        elif isinstance(obj, ChatSession) and obj.__dict__.get("queries_count"):
+            deltas[ACTIVE_SESSIONS] -= 1
+            deltas[SESSION_AVG_SUM] -= to_us(obj.__dict__.get("avg_response_time_ms") or 0.0)
+
+    if not (deltas or visitors or calls):
+        return
+
+    conn = session.connection()
+    record_visitor_rollups(conn, visitors)
+    record_api_rollups(conn, calls)
+    bump_row_counts(conn, deltas)
+
+
+def _rollups_on_bulk_delete(orm_execute_state):
+    """
+    Bulk deletes (query(...).delete() and session.execute(delete(...)),
+    sync or async) bypass the flush, so count those rows here
+    """
+    if not orm_execute_state.is_delete or orm_execute_state.bind_mapper is None:
+        return None
+    table = orm_execute_state.bind_mapper.local_table.name
+    if table not in COUNTED_TABLES:
+        return None
+    result = orm_execute_state.invoke_statement()
+    rowcount = result.rowcount
+    if rowcount and rowcount > 0:
+        bump_row_counts(orm_execute_state.session.connection(), {table: -rowcount})
+    return result
+
+
+# Registered on the imported module only; running this file as a script
+# imports it again via init_db, and the hooks must not fire twice
+if __name__ != "__main__":
+    event.listen(SessionLocal, "after_flush", _rollups_after_flush)
+    event.listen(SessionLocal, "do_orm_execute", _rollups_on_bulk_delete)
+
+
+# ==========================================
+# READS
+# ==========================================
+
+def read_table_counts(db) -> Dict[str, int]:
+    """Row counts for every tracked table, from table_row_counts"""
+    stored = dict(db.execute(select(TableRowCount.table_name, TableRowCount.row_count)).all())
+    return {table: stored.get(table, 0) for table in COUNTED_TABLES}
+
+
+def read_summary_counters(db) -> Dict[str, int]:
+    """The SUMMARY_COUNTERS figures, from table_row_counts"""
+    stored = dict(db.execute(
+        select(TableRowCount.table_name, TableRowCount.row_count)
+        .where(TableRowCount.table_name.in_(SUMMARY_COUNTERS))
+    ).all())
+    return {name: stored.get(name, 0) for name in SUMMARY_COUNTERS}
+
+
+# ==========================================
+# BACKFILL
+# ==========================================
+
+def backfill_rollups(db) -> Dict[str, int]:
+    """
+    Rebuild the daily rollups and table_row_counts
+    Daily stats are summed from hourly_page_stats / hourly_api_stats (rows
+    that retention archived and deleted) plus the raw rows still in the
+    database; the two never overlap. Full scans - run once after deploying
+    rollups, or after manual data fixes
+    """
+    db.execute(delete(DailyPageStat))
+    db.execute(delete(DailyApiStat))
+    db.execute(delete(TableRowCount))
+
+    page_views: Counter = Counter()
+    visitor_day = func.date(Visitor.timestamp)
+    raw_device = func.coalesce(Visitor.device_type, 'unknown')
+    hourly_day = func.date(HourlyPageStat.hour)
+    for source in (
+        select(visitor_day, Visitor.page, raw_device, func.count(Visitor.id))
+        .group_by(visitor_day, Visitor.page, raw_device),
+        select(hourly_day, HourlyPageStat.page, HourlyPageStat.device_type, func.sum(HourlyPageStat.views))
+        .group_by(hourly_day, HourlyPageStat.page, HourlyPageStat.device_type),
+    ):
+        for d, p, dev, n in db.execute(source):
+            page_views[(_parse_day(d), p, dev)] += n
+    if page_views:
+        db.execute(insert(DailyPageStat), [
+            {"day": d, "page": p, "device_type": dev, "views": n}
+            for (d, p, dev), n in page_views.items()
+        ])
+
+    api_stats: Dict[Tuple[date, str], List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    api_day = func.date(ApiUsage.timestamp)
+    hourly_api_day = func.date(HourlyApiStat.hour)
+    for source in (
+        select(
+            api_day, ApiUsage.endpoint,
+            func.count(ApiUsage.id),
+            func.sum(case((ApiUsage.status_code >= 400, 1), else_=0)),
+            func.coalesce(func.sum(ApiUsage.response_time_ms), 0.0)
+        ).group_by(api_day, ApiUsage.endpoint),
+        select(
+            hourly_api_day, HourlyApiStat.endpoint,
+            func.sum(HourlyApiStat.requests),
+            func.sum(HourlyApiStat.errors),
+            func.coalesce(func.sum(HourlyApiStat.total_response_time_ms), 0.0)
+        ).group_by(hourly_api_day, HourlyApiStat.endpoint),
+    ):
+        for d, e, r, err, t in db.execute(source):
+            entry = api_stats[(_parse_day(d), e)]
+            entry[0] += r
+            entry[1] += int(err or 0)
+            entry[2] += t
+    if api_stats:
+        db.execute(insert(DailyApiStat), [
+            {"day": d, "endpoint": e, "requests": r, "errors": err, "total_response_time_ms": t}
+            for (d, e), (r, err, t) in api_stats.items()
+        ])
+
+    counts = {m.__tablename__: db.query(m).count() for m in COUNTED_MODELS}
+    summary = _count_summary(db)
+    db.execute(insert(TableRowCount), [
+        {"table_name": t, "row_count": n} for t, n in {**counts, **summary}.items()
+    ])
+
+    logger.info(f"Rollups backfilled: {len(page_views)} page-days, {len(api_stats)} endpoint-days")
+    return {
+        "daily_page_stats": len(page_views),
+        "daily_api_stats": len(api_stats),
+        **counts,
+        **summary
+    }
+
+
+def _count_summary(db) -> Dict[str, int]:
+    """SUMMARY_COUNTERS from the raw tables (full scans)"""
+    active, avg_sum = db.execute(
+        select(func.count(ChatSession.id), func.coalesce(func.sum(ChatSession.avg_response_time_ms), 0.0))
+        .where(ChatSession.queries_count > 0)
+    ).one()
+    return {
+        UNREAD_MESSAGES: db.scalar(select(func.count(ContactMessage.id)).where(ContactMessage.read.is_(False))),
+        ACTIVE_SESSIONS: active,
+        SESSION_AVG_SUM: to_us(avg_sum),
+    }
+
+
+def seed_rollups_if_empty():
+    """Backfill once on a database that predates the rollup tables (or just the summary figures)"""
+    with get_db() as db:
+        if db.query(TableRowCount).first() is None:
+            backfill_rollups(db)
+        elif db.get(TableRowCount, UNREAD_MESSAGES) is None:
+            db.execute(insert(TableRowCount), [
+                {"table_name": t, "row_count": n} for t, n in _count_summary(db).items()
+            ])
+
+
+def _parse_day(value: Any) -> date:
+    # func.date() returns a string on SQLite and a date on PostgreSQL
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return _day(value)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print("Usage: python -m app.database.rollups backfill")
+        sys.exit(1)
+
+    logging.basicConfig(level=logging.INFO)
+    from app.database.connection import init_db
+    init_db()
+    with get_db() as db:
+        result = backfill_rollups(db)
+    for name, value in result.items():
+        print(f"{name}: {value}")
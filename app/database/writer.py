@@ -0,0 +1,223 @@
+"""
+Group-Commit Writer
+Single writer thread for file-backed SQLite
+
+SQLite allows one writer at a time and every commit pays for a WAL sync.
+Instead of letting request handlers and background tasks race for the file
+lock, writes are queued to one thread that owns the write connection:
+
+- each queued write is `fn(session, *args)` against a Session on the write
+  connection (ORM or Core; rollup and cache hooks fire as usual)
+- everything queued while the previous batch was committing is applied in
+  one transaction, each write in its own SAVEPOINT, then committed once
+- a failing write only rolls back its savepoint; its caller gets the
+  exception, the rest of the batch still commits
+
+Other backends have no use for a single writer: run_write() runs the same
+function through an async session instead.
+"""
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.database.connection import SQLITE_SINGLE_WRITER, SessionLocal, get_async_db, get_db
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Write:
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+    future: Future = field(default_factory=Future)
+
+
+class GroupCommitWriter:
+    """
+    Queue of write functions applied by one thread in group-committed batches
+
+    `fn` runs on the writer thread with the batch's session; it must not open
+    sessions of its own on the write engine (there is only one connection)
+    """
+
+    def __init__(self, session_factory: Callable[[], Any], max_batch: int = 256, window: float = 0.0):
+        self.session_factory = session_factory
+        self.max_batch = max(1, max_batch)
+        self.window = window
+
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.counters = {
+            "writes": 0,
+            "failed": 0,
+            "batches": 0,
+            "commit_errors": 0,
+            "largest_batch": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queue `fn(session, *args, **kwargs)`; the future resolves once its batch has committed"""
+        if not self.running:
+            self.start()
+        write = _Write(fn, args, kwargs)
+        self._queue.put(write)
+        return write.future
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+            self._thread.start()
+        logger.info(f"SQLite writer started (max_batch={self.max_batch}, window={self.window * 1000:.1f}ms)")
+
+    def stop(self, timeout: float = 10.0):
+        """Apply everything already queued, then stop the thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+        logger.info(f"SQLite writer stopped: {self.stats()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "pending": self._queue.qsize(),
+            "running": self.running,
+            "avg_batch": round(self.counters["writes"] / self.counters["batches"], 2) if self.counters["batches"] else 0.0,
+        }
+
+    # ==========================================
+    # WRITER THREAD
+    # ==========================================
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch, stopping = self._take_batch(first)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _take_batch(self, first: _Write) -> Tuple[List[_Write], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                write = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if write is None:
+                return batch, True
+            batch.append(write)
+        return batch, False
+
+    def _commit(self, batch: List[_Write]):
+        batch = [w for w in batch if w.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        results: List[Tuple[_Write, Any, Optional[BaseException]]] = []
+        session = self.session_factory()
+        try:
+            if len(batch) == 1:
+                # Nothing to isolate it from: no savepoint
+                write = batch[0]
+                try:
+                    results.append((write, write.fn(session, *write.args, **write.kwargs), None))
+                except Exception as e:
+                    session.rollback()
+                    results.append((write, None, e))
+            else:
+                for write in batch:
+                    try:
+                        with session.begin_nested():
+                            result = write.fn(session, *write.args, **write.kwargs)
+                        results.append((write, result, None))
+                    except Exception as e:
+                        results.append((write, None, e))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.counters["commit_errors"] += 1
+            logger.error(f"SQLite writer batch of {len(batch)} failed: {e}")
+            results = [(write, None, error or e) for write, _, error in results]
+            done = {id(write) for write, _, _ in results}
+            results += [(write, None, e) for write in batch if id(write) not in done]
+        finally:
+            session.close()
+
+        self.counters["batches"] += 1
+        self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+        for write, result, error in results:
+            self.counters["writes"] += 1
+            if error is not None:
+                self.counters["failed"] += 1
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
+
+
+# Objects written in a batch stay readable after the commit
+db_writer: Optional[GroupCommitWriter] = GroupCommitWriter(
+    session_factory=lambda: SessionLocal(expire_on_commit=False),
+    max_batch=settings.SQLITE_WRITE_BATCH,
+    window=settings.SQLITE_WRITE_WINDOW_MS / 1000,
+) if SQLITE_SINGLE_WRITER else None
+
+
+async def run_write(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run `fn(session, *args, **kwargs)` in a write transaction and return its result
+    SQLite: queued to the group-commit writer; otherwise an async session (run_sync)
+    """
+    if db_writer is not None:
+        return await db_writer.run(fn, *args, **kwargs)
+    async with get_async_db() as db:
+        return await db.run_sync(fn, *args, **kwargs)
+
+
+def write_sync(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Blocking run_write() for worker threads and scripts (never call it on the event loop)"""
+    if db_writer is not None:
+        return db_writer.submit(fn, *args, **kwargs).result()
+    with get_db() as db:
+        return fn(db, *args, **kwargs)
+
+
+def stop_writer():
+    if db_writer is not None:
+        db_writer.stop()
+
+
+__all__ = [
+    'GroupCommitWriter',
+    'db_writer',
+    'run_write',
+    'write_sync',
+    'stop_writer',
+]
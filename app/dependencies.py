@@ -0,0 +1,32 @@
+"""
+Route Dependencies
+Shared FastAPI dependencies
+"""
+from typing import Optional
+from fastapi import Header, HTTPException
+from app.config import settings
+import hmac
+
+
+def require_admin(authorization: Optional[str] = Header(None), x_admin_key: Optional[str] = Header(None)):
+    """
+    Guard for admin-only routes (raw exports)
+    Accepts `Authorization: Bearer <ADMIN_API_KEY>` or `X-Admin-Key: <ADMIN_API_KEY>`;
+    with no ADMIN_API_KEY configured the routes are disabled
+    """
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(403, detail="Admin routes are disabled (ADMIN_API_KEY is not set)")
+
+    supplied = x_admin_key
+    if supplied is None and authorization:
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer":
+            supplied = token.strip()
+
+    if not supplied or not hmac.compare_digest(supplied.encode(), settings.ADMIN_API_KEY.encode()):
+        raise HTTPException(401, detail="Admin credential required", headers={"WWW-Authenticate": "Bearer"})
+
+
+__all__ = [
+    'require_admin',
+]
@@ -9,8 +9,7 @@ from pathlib import Path
 from app.config import settings
 # from app.database.connection import init_db
 from app.api.routes import pages, chatbot, email, contact, analytics
-from app.api.middleware.analytics import AnalyticsMiddleware
-from app.api.middleware.security import SecurityHeadersMiddleware
+from app.api.middleware.pipeline import RequestPipelineMiddleware
 
 def create_app() -> FastAPI:
     """Application factory"""
@@ -31,8 +30,7 @@ def create_app() -> FastAPI:
     )
     
     # Custom Middleware
-    app.add_middleware(AnalyticsMiddleware)
-    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RequestPipelineMiddleware)
     
     # Static Files
     app.mount(
@@ -0,0 +1,258 @@
+"""
+Static Asset Pipeline
+Fingerprinted, precompressed copies of /static and the handler that serves them
+
+`build` copies every file under static/ to static/dist/ with a content hash
+in its name (css/base.css -> dist/css/base.3f9a1c0e2b7d.css), writes .gz and
+.br siblings for text assets, and records the mapping in
+static/dist/manifest.json. Files with identical bytes share one output file.
+Relative url(...) references in CSS are rewritten to the hashed targets.
+
+At runtime the manifest makes `url_for('static', path=...)` in templates
+resolve to the hashed name, as a host-relative URL (no scheme or Host), so
+rendered pages do not depend on the Host header. StaticAssets serves those names with
+`Cache-Control: immutable`, choosing the .br / .gz sibling by
+Accept-Encoding. Anything not in the manifest (or everything, before the
+first build) is served from static/ as before.
+
+Usage:
+    python -m app.utils.assets build
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Tuple
+from jinja2 import pass_context
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+from app.utils.page_cache import accepted_encoding
+import brotli
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import sys
+
+STATIC_DIR = Path(__file__).parent.parent.parent / "static"
+DIST_NAME = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Only text formats are worth compressing (AVIF / PNG / fonts already are)
+COMPRESSIBLE = {".css", ".js", ".mjs", ".svg", ".json", ".txt", ".xml", ".html", ".map"}
+# Keep a compressed sibling only if it saves at least this fraction
+MIN_SAVING = 0.1
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+SUFFIX_ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+# ==========================================
+# MANIFEST
+# ==========================================
+
+@dataclass
+class AssetManifest:
+    files: Dict[str, str] = field(default_factory=dict)  # logical path -> dist path (both relative to static/)
+    encodings: Dict[str, List[str]] = field(default_factory=dict)  # dist path -> precompressed encodings
+    mtime: float = 0.0  # of the manifest file as loaded (0: not built)
+
+    @classmethod
+    def load(cls, path: Path) -> "AssetManifest":
+        """Empty manifest (identity mapping) when the assets have not been built"""
+        try:
+            data = json.loads(Path(path).read_text())
+            mtime = os.stat(path).st_mtime
+        except (OSError, ValueError):
+            return cls()
+        return cls(files=data.get("files", {}), encodings=data.get("encodings", {}), mtime=mtime)
+
+    def resolve(self, path: str) -> str:
+        return self.files.get(path.lstrip("/"), path)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+
+def install_url_for(templates, manifest: AssetManifest):
+    """Make url_for(...) in `templates` emit host-relative URLs, fingerprinted for static files"""
+
+    @pass_context
+    def url_for(context, name: str, **path_params) -> str:
+        if name == "static" and "path" in path_params:
+            path_params["path"] = manifest.resolve(path_params["path"])
+        return context["request"].url_for(name, **path_params).path
+
+    templates.env.globals["url_for"] = url_for
+
+
+# ==========================================
+# SERVING
+# ==========================================
+
+class StaticAssets(StaticFiles):
+    """StaticFiles that serves manifest entries immutable and precompressed"""
+
+    def __init__(self, directory: Path, manifest: AssetManifest, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        # dist path -> encoding -> (file, stat); hashed files never change, stat them once
+        self.variants: Dict[str, Dict[str, Tuple[str, os.stat_result]]] = {}
+        for dist_path in set(manifest.files.values()):
+            full_path = os.path.join(directory, dist_path)
+            try:
+                variants = {"identity": (full_path, os.stat(full_path))}
+                for encoding in manifest.encodings.get(dist_path, ()):
+                    compressed = full_path + SUFFIX_ENCODINGS[encoding]
+                    variants[encoding] = (compressed, os.stat(compressed))
+            except OSError:
+                continue
+            self.variants[dist_path] = variants
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        variants = self.variants.get(path.replace(os.sep, "/"))
+        if variants is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding = "identity"
+        if len(variants) > 1:
+            encoding = accepted_encoding(request_headers.get("accept-encoding", ""), variants)
+        full_path, stat_result = variants[encoding]
+
+        headers = {"Cache-Control": IMMUTABLE}
+        if len(variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        response = FileResponse(
+            full_path,
+            stat_result=stat_result,
+            method=scope["method"],
+            media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+            headers=headers,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# ==========================================
+# BUILD
+# ==========================================
+
+def _fingerprint(path: str, digest: str) -> str:
+    stem, ext = posixpath.splitext(path)
+    return f"{DIST_NAME}/{stem}.{digest[:12]}{ext}"
+
+
+def _rewrite_css(source: str, css_path: str, files: Dict[str, str]) -> str:
+    """Point relative url(...) references at the hashed files"""
+    css_dir = posixpath.dirname(css_path)
+
+    def replace(match: re.Match) -> str:
+        quote, ref = match.groups()
+        if ref.startswith(("data:", "http:", "https:", "//", "/", "#")):
+            return match.group(0)
+        target, _, suffix = ref.partition("?")
+        logical = posixpath.normpath(posixpath.join(css_dir, target))
+        if logical not in files:
+            return match.group(0)
+        hashed = posixpath.relpath(files[logical], posixpath.dirname(files[css_path]))
+        return f"url({quote}{hashed}{'?' + suffix if suffix else ''}{quote})"
+
+    return CSS_URL.sub(replace, source)
+
+
+def _compress(full_path: Path, data: bytes) -> List[str]:
+    encodings = []
+    for encoding, compressed in (
+        ("br", brotli.compress(data, quality=11)),
+        ("gzip", gzip.compress(data, compresslevel=9, mtime=0)),
+    ):
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            Path(str(full_path) + SUFFIX_ENCODINGS[encoding]).write_bytes(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build_assets(static_dir: Path = STATIC_DIR) -> Dict[str, int]:
+    """(Re)build static/dist and its manifest"""
+    static_dir = Path(static_dir)
+    dist_dir = static_dir / DIST_NAME
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+
+    sources = sorted(
+        p.relative_to(static_dir).as_posix()
+        for p in static_dir.rglob("*")
+        if p.is_file() and p.relative_to(static_dir).parts[0] != DIST_NAME and not p.name.startswith(".")
+    )
+    # CSS last: its url(...) references are rewritten to already-hashed files
+    sources.sort(key=lambda p: posixpath.splitext(p)[1] == ".css")
+
+    files: Dict[str, str] = {}
+    encodings: Dict[str, List[str]] = {}
+    by_digest: Dict[str, str] = {}
+    stats = {"files": 0, "outputs": 0, "deduplicated": 0, "bytes": 0, "gzip_bytes": 0, "br_bytes": 0}
+
+    for path in sources:
+        data = (static_dir / path).read_bytes()
+        if path.endswith(".css"):
+            # Hash the rewritten bytes, so the name changes when a referenced file does
+            provisional = _fingerprint(path, hashlib.sha256(data).hexdigest())
+            files[path] = provisional
+            data = _rewrite_css(data.decode("utf-8"), path, files).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        stats["files"] += 1
+
+        if digest in by_digest:
+            files[path] = by_digest[digest]
+            stats["deduplicated"] += 1
+            continue
+
+        dist_path = _fingerprint(path, digest)
+        files[path] = by_digest[digest] = dist_path
+        target = static_dir / dist_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        stats["outputs"] += 1
+        stats["bytes"] += len(data)
+
+        if posixpath.splitext(path)[1].lower() in COMPRESSIBLE:
+            encodings[dist_path] = _compress(target, data)
+            for encoding in encodings[dist_path]:
+                size = os.path.getsize(str(target) + SUFFIX_ENCODINGS[encoding])
+                stats["br_bytes" if encoding == "br" else "gzip_bytes"] += size
+
+    manifest = {"files": files, "encodings": {k: v for k, v in encodings.items() if v}}
+    (dist_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return stats
+
+
+asset_manifest = AssetManifest.load(STATIC_DIR / DIST_NAME / MANIFEST_NAME)
+
+
+__all__ = [
+    'AssetManifest',
+    'StaticAssets',
+    'asset_manifest',
+    'build_assets',
+    'install_url_for',
+]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("Usage: python -m app.utils.assets build")
+        sys.exit(1)
+
+    result = build_assets()
+    for name, value in result.items():
+        print(f"{name}: {value}")
@@ -0,0 +1,194 @@
+"""
+Response Cache
+Async TTL cache with single-flight miss coalescing and tag-based invalidation
+"""
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Tuple
+from sqlalchemy import event
+import asyncio
+import time
+
+
+class SingleFlightCache:
+    """
+    TTL cache for expensive async computations
+
+    - entries expire `ttl` seconds after they were computed
+    - concurrent misses on the same key share one computation
+      (the first caller computes, the rest await its result)
+    - entries carry tags (table names) so writes can invalidate them
+    - failures are never cached; every waiter sees the exception
+    - at most `max_entries` are kept: expired entries are swept first, then
+      the least recently used go
+    - a computation that was already running when its tags were invalidated
+      returns its value to the callers but does not store it
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, frozenset]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # tag -> number of invalidations so far
+        self._generations: Dict[str, int] = {}
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "stale_discarded": 0,
+        }
+
+    async def get_or_compute(
+        self,
+        key: Hashable,
+        ttl: float,
+        compute: Callable[[], Awaitable[Any]],
+        tags: Iterable[str] = (),
+    ) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.counters["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The computing request was cancelled, not this one: try again
+                return await self.get_or_compute(key, ttl, compute, tags)
+
+        self.counters["misses"] += 1
+        tags = frozenset(tags)
+        generation = self._generation(tags)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so an un-awaited failure doesn't log a warning
+            future.exception()
+            raise
+        else:
+            if ttl > 0:
+                if self._generation(tags) == generation:
+                    self._store(key, (time.monotonic() + ttl, value, tags))
+                else:
+                    # Written to while computing: the value may predate the write
+                    self.counters["stale_discarded"] += 1
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry tagged with any of `tags`"""
+        tags = set(tags)
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+        # May run on a worker thread (DB commits), so iterate over a snapshot
+        stale = [k for k, (_, _, entry_tags) in list(self._entries.items()) if entry_tags & tags]
+        for k in stale:
+            self._entries.pop(k, None)
+        self.counters["invalidations"] += len(stale)
+        return len(stale)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _generation(self, tags: frozenset) -> int:
+        return sum(self._generations.get(tag, 0) for tag in tags)
+
+    def _store(self, key: Hashable, entry: Tuple[float, Any, frozenset]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for k in [k for k, (expires, _, _) in list(self._entries.items()) if expires <= now]:
+            self._entries.pop(k, None)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hit_rate": round((self.counters["hits"] + self.counters["coalesced"]) / lookups * 100, 2) if lookups else 0,
+        }
+
+
+def cached_endpoint(
+    cache: SingleFlightCache,
+    name: str,
+    ttl: Callable[[str], float],
+    tags: Iterable[str] = (),
+):
+    """
+    Cache an async route handler keyed by `name` and its call arguments
+
+    `ttl` is looked up per call so TTLs can be changed through settings at runtime
+    """
+    tags = tuple(tags)
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return await cache.get_or_compute(
+                key, ttl(name), lambda: func(*args, **kwargs), tags
+            )
+        return wrapper
+
+    return decorator
+
+
+def install_write_invalidation(session_factory, cache: SingleFlightCache):
+    """
+    Invalidate cache entries tagged with any table written in a committed transaction
+
+    Covers ORM flushes as well as Core INSERT/UPDATE/DELETE run through the session
+    """
+
+    def _written(session) -> set:
+        return session.info.setdefault("written_tables", set())
+
+    def after_flush(session, flush_context):
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            table = getattr(obj, "__tablename__", None)
+            if table:
+                _written(session).add(table)
+
+    def do_orm_execute(state):
+        if state.is_insert or state.is_update or state.is_delete:
+            table = getattr(state.statement, "table", None)
+            if table is not None:
+                _written(state.session).add(table.name)
+
+    def after_commit(session):
+        tables = session.info.pop("written_tables", None)
+        if tables:
+            cache.invalidate_tags(tables)
+
+    def after_rollback(session):
+        session.info.pop("written_tables", None)
+
+    event.listen(session_factory, "after_flush", after_flush)
+    # Ahead of handlers that run the statement themselves (rollups' bulk-delete
+    # counting returns the result, which ends the do_orm_execute chain)
+    event.listen(session_factory, "do_orm_execute", do_orm_execute, insert=True)
+    event.listen(session_factory, "after_commit", after_commit)
+    event.listen(session_factory, "after_rollback", after_rollback)
@@ -0,0 +1,204 @@
+"""
+Rendered Page Cache
+Template output cached as bytes, with validators and precompressed variants
+
+The pages router only renders static content: url_for() emits host-relative
+links (see app/utils/assets.py), so the output of a template depends on
+nothing in the request but its path. Each template is rendered once, on
+first hit, and kept as
+- identity, gzip and brotli bodies
+- a strong ETag per encoding and a Last-Modified (newest template mtime, or
+  the asset manifest's if that is newer: a rebuild changes the links)
+
+Conditional GETs (If-None-Match, then If-Modified-Since) get a 304 without
+touching the template. With `watch` on (development) the templates
+directory is re-stat'ed on every request and any change drops the cache.
+"""
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, Optional
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+import brotli
+import gzip
+import hashlib
+import os
+
+# Preference order when the client accepts several
+ENCODINGS = ("br", "gzip")
+
+
+@dataclass
+class RenderedPage:
+    bodies: Dict[str, bytes]  # encoding ("identity", "gzip", "br") -> body
+    etags: Dict[str, str]
+    last_modified: int  # newest template / asset manifest mtime (whole seconds, as HTTP dates are)
+
+    @property
+    def last_modified_header(self) -> str:
+        return formatdate(self.last_modified, usegmt=True)
+
+
+def accepted_encoding(header: str, available: Iterable[str] = ENCODINGS) -> str:
+    """Best encoding in `available` acceptable per an Accept-Encoding header, else "identity" """
+    weights: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = "identity", 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _etag_matches(header: str, etags: Iterable[str]) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or any(etag in candidates for etag in etags)
+
+
+class PageCache:
+    """
+    Rendered templates keyed by template name
+
+    `assets_mtime` is the mtime of the asset manifest the templates' static
+    URLs resolve through; Last-Modified is never older than it
+    """
+
+    def __init__(self, templates: Jinja2Templates, directory: Path, watch: bool = False,
+                 enabled: bool = True, assets_mtime: float = 0.0):
+        self.templates = templates
+        self.directory = Path(directory)
+        self.watch = watch
+        self.enabled = enabled
+        self.assets_mtime = assets_mtime
+
+        self._pages: Dict[str, RenderedPage] = {}
+        self._lock = Lock()
+        self._generation = self._templates_mtime()
+
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "not_modified": 0,
+            "invalidations": 0,
+        }
+
+    def _templates_mtime(self) -> float:
+        newest = 0.0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                newest = max(newest, os.stat(os.path.join(root, name)).st_mtime)
+        return newest
+
+    def _check_templates(self):
+        if not self.watch:
+            return
+        current = self._templates_mtime()
+        if current != self._generation:
+            self.invalidate()
+            self._generation = current
+
+    def _render(self, request: Request, name: str, context: Optional[Dict[str, Any]]) -> RenderedPage:
+        html = self.templates.get_template(name).render({"request": request, **(context or {})})
+        body = html.encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        bodies = {
+            "identity": body,
+            "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+            "br": brotli.compress(body, quality=11, mode=brotli.MODE_TEXT),
+        }
+        etags = {
+            encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+            for encoding in bodies
+        }
+        return RenderedPage(bodies, etags, int(max(self._generation, self.assets_mtime)))
+
+    async def get(self, request: Request, name: str, context: Optional[Dict[str, Any]] = None) -> RenderedPage:
+        self._check_templates()
+        with self._lock:
+            page = self._pages.get(name)
+            if page is not None:
+                self.counters["hits"] += 1
+                return page
+
+        self.counters["misses"] += 1
+        # Precompression (brotli quality 11) is too slow for the event loop
+        page = await run_in_threadpool(self._render, request, name, context)
+        with self._lock:
+            self._pages[name] = page
+        return page
+
+    async def response(self, request: Request, name: str, context: Optional[Dict[str, Any]] = None) -> Response:
+        """The page as a response: 304 when the client's copy is current, else the best encoding"""
+        if not self.enabled:
+            return self.templates.TemplateResponse(name, {"request": request, **(context or {})})
+
+        page = await self.get(request, name, context)
+        encoding = accepted_encoding(request.headers.get("accept-encoding", ""))
+        headers = {
+            "ETag": page.etags[encoding],
+            "Last-Modified": page.last_modified_header,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding",
+        }
+
+        if self._not_modified(request, page):
+            self.counters["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(page.bodies[encoding], media_type="text/html", headers=headers)
+
+    @staticmethod
+    def _not_modified(request: Request, page: RenderedPage) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # Any encoding of the current content is a match
+            return _etag_matches(if_none_match, page.etags.values())
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= page.last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def invalidate(self):
+        with self._lock:
+            self._pages.clear()
+        self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached = sorted(self._pages)
+            size = {
+                encoding: sum(len(page.bodies[encoding]) for page in self._pages.values())
+                for encoding in ("identity", "gzip", "br")
+            }
+        return {**self.counters, "pages": cached, "bytes": size, "watch": self.watch, "enabled": self.enabled}
+
+
+__all__ = [
+    'PageCache',
+    'RenderedPage',
+    'accepted_encoding',
+]
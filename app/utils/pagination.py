@@ -0,0 +1,69 @@
+"""
+Keyset Pagination
+Opaque cursors for paging through (timestamp, id) ordered rows
+
+A cursor is the position of the last row of a page; the next page is
+`WHERE (timestamp, id) > (cursor)` on the same ordering, which an index on
+(..., timestamp) serves directly however deep the page is (no OFFSET scan).
+
+SQLite stores DATETIME as text, and rows written with `func.now()` lack the
+microseconds that bound datetimes carry, so comparing against a re-rendered
+datetime would skip or repeat rows that share a second. There the cursor
+keeps the stored text and compares text to text.
+"""
+from datetime import datetime
+from typing import Optional, Tuple, Union
+from sqlalchemy import String, literal, true, tuple_, type_coerce
+import base64
+import json
+
+Position = Tuple[str, int]
+
+
+def cursor_timestamp(timestamp_col):
+    """Select alongside a page: the timestamp as the database stores it, for encode_cursor()"""
+    return type_coerce(timestamp_col, String).label("cursor_timestamp")
+
+
+def encode_cursor(timestamp: Union[str, datetime], row_id: int) -> str:
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.isoformat(sep=" ")
+    raw = json.dumps([timestamp, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Position:
+    """Raises ValueError on anything encode_cursor() did not produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        datetime.fromisoformat(timestamp)
+        return timestamp, int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def after(timestamp_col, id_col, position: Optional[Position], dialect_name: str):
+    """WHERE clause for rows after `position` in (timestamp, id) order (None: from the start)"""
+    if position is None:
+        return true()
+    timestamp, row_id = position
+    if dialect_name == "sqlite":
+        return tuple_(type_coerce(timestamp_col, String), id_col) > tuple_(literal(timestamp, String), row_id)
+    return tuple_(timestamp_col, id_col) > tuple_(datetime.fromisoformat(timestamp), row_id)
+
+
+def clamp_limit(limit: Optional[int], default: int, maximum: int) -> int:
+    if limit is None:
+        return default
+    return max(1, min(limit, maximum))
+
+
+__all__ = [
+    'Position',
+    'cursor_timestamp',
+    'encode_cursor',
+    'decode_cursor',
+    'after',
+    'clamp_limit',
+]
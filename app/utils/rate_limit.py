@@ -0,0 +1,172 @@
+"""
+Rate Limiting
+Token buckets keyed by (route group, hashed client IP)
+
+Each key owns a bucket of `capacity` tokens refilled at `rate` tokens per
+second; a request takes one token or is refused with the time until one
+is available. Two backends:
+- MemoryRateLimiter (the default): one process. Buckets are spread over
+  shards, each with its own lock, so threads rarely contend and a sweep
+  only ever walks one shard; cheap enough to call on the event loop
+- SQLiteRateLimiter: every worker process shares one bucket table. The
+  refill, check and take happen in a single UPSERT ... RETURNING, so two
+  workers can never spend the same token. `acquire` does file I/O (and
+  may wait on another worker's lock), so async callers run it in a thread
+
+Buckets idle for `idle_seconds` have refilled completely and are dropped
+(per-minute limits refill within a minute).
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+import math
+import sqlite3
+import threading
+import time
+
+
+@dataclass
+class Decision:
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float  # seconds until a token is available (0 when allowed)
+    reset_after: float  # seconds until the bucket is full again
+
+    def headers(self, window_seconds: int) -> Dict[str, str]:
+        """Standard RateLimit-* headers (plus Retry-After when refused)"""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+            "RateLimit-Policy": f"{self.limit};w={window_seconds}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _decide(tokens: float, allowed: bool, capacity: int, rate: float) -> Decision:
+    return Decision(
+        allowed=allowed,
+        limit=capacity,
+        remaining=max(0, int(tokens)),
+        retry_after=0.0 if allowed else (1 - tokens) / rate,
+        reset_after=(capacity - tokens) / rate,
+    )
+
+
+class MemoryRateLimiter:
+    """In-process token buckets, sharded by key"""
+
+    blocking = False
+
+    def __init__(self, shards: int = 16, max_keys_per_shard: int = 4096, idle_seconds: float = 60.0):
+        self.max_keys_per_shard = max_keys_per_shard
+        self.idle_seconds = idle_seconds
+        # key -> [tokens, last refill (monotonic)]
+        self._shards: List[Dict[str, List[float]]] = [{} for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+
+    def acquire(self, key: str, rate: float, capacity: int, now: Optional[float] = None) -> Decision:
+        now = time.monotonic() if now is None else now
+        index = hash(key) % len(self._shards)
+        buckets = self._shards[index]
+        with self._locks[index]:
+            bucket = buckets.get(key)
+            if bucket is None:
+                if len(buckets) >= self.max_keys_per_shard:
+                    self._sweep(buckets, now)
+                bucket = buckets[key] = [float(capacity), now]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            bucket[0], bucket[1] = tokens, now
+        return _decide(tokens, allowed, capacity, rate)
+
+    def _sweep(self, buckets: Dict[str, List[float]], now: float):
+        """Make room in a full shard: drop refilled buckets, then (if still full) the longest idle"""
+        for key in [k for k, (_, last) in buckets.items() if now - last >= self.idle_seconds]:
+            del buckets[key]
+        if len(buckets) >= self.max_keys_per_shard:
+            for key, _ in sorted(buckets.items(), key=lambda item: item[1][1])[:len(buckets) // 4]:
+                del buckets[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"backend": "memory", "keys": sum(len(s) for s in self._shards), "shards": len(self._shards)}
+
+
+class SQLiteRateLimiter:
+    """Token buckets in a SQLite table shared by every worker process"""
+
+    blocking = True
+
+    # SET expressions all see the row as it was, so `allowed` and `tokens` agree
+    _ACQUIRE = (
+        "INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1) "
+        "ON CONFLICT(key) DO UPDATE SET "
+        " allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1,"
+        " tokens = min(:capacity, tokens + (:now - updated) * :rate)"
+        "  - (min(:capacity, tokens + (:now - updated) * :rate) >= 1),"
+        " updated = :now "
+        "RETURNING tokens, allowed"
+    )
+
+    def __init__(self, path: str, idle_seconds: float = 60.0, purge_interval: float = 60.0):
+        self.path = path
+        self.idle_seconds = idle_seconds
+        self.purge_interval = purge_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Buckets are soft state: losing the last writes on power failure is harmless
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " key TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated REAL NOT NULL,"
+                " allowed INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_updated ON buckets(updated)")
+            self._conn = conn
+        return self._conn
+
+    def acquire(self, key: str, rate: float, capacity: int, now: Optional[float] = None) -> Decision:
+        # Wall clock: monotonic clocks are not comparable across processes
+        now = time.time() if now is None else now
+        with self._lock:
+            db = self._db()
+            tokens, allowed = db.execute(
+                self._ACQUIRE, {"key": key, "capacity": capacity, "rate": rate, "now": now}
+            ).fetchone()
+            if now - self._last_purge > self.purge_interval:
+                self._last_purge = now
+                # A bucket idle this long has refilled: it carries no state
+                db.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_seconds,))
+        return _decide(tokens, bool(allowed), capacity, rate)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            keys = self._db().execute("SELECT count(*) FROM buckets").fetchone()[0]
+        return {"backend": "sqlite", "keys": keys}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+__all__ = [
+    'Decision',
+    'MemoryRateLimiter',
+    'SQLiteRateLimiter',
+]
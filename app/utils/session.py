@@ -0,0 +1,370 @@
+"""
+Chat Session Store
+Shared session index (SQLite, visible to every uvicorn worker) plus a
+process-local LRU of the heavyweight per-session objects
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+import json
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Rough resident size of an object graph in bytes
+    Honors `nbytes` (NumPy arrays) and a `memory_usage()` method when present
+    """
+    if obj is None:
+        return 0
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    usage = getattr(obj, "memory_usage", None)
+    if callable(usage):
+        return int(usage())
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, _seen) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), _seen)
+    return size
+
+
+@dataclass
+class SessionEntry:
+    """One chat session: shared metadata plus the local heavyweight object (if resident)"""
+    session_id: str
+    meta: Dict[str, Any]
+    created_at: float
+    last_access: float
+    obj: Any = None
+    size_bytes: int = 0
+
+
+@dataclass
+class _Resident:
+    obj: Any
+    size_bytes: int
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+class SessionStore:
+    """
+    - the session index (id, metadata, timestamps) lives in a SQLite file in
+      WAL mode, so any worker can resolve a session created by another one
+    - heavyweight objects (graphs, indexes) stay in this process, in an LRU
+      bounded by entry count and by estimated memory
+    - sessions idle for longer than `idle_ttl` are evicted everywhere
+    - a loader callback rebuilds the heavyweight object when a session is
+      known to the index but not resident in this process; it runs outside
+      the store lock, once per session (concurrent lookups wait for it)
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        idle_ttl: float,
+        memory_cap_bytes: int,
+        max_resident: int,
+        touch_interval: float = 5.0,
+    ):
+        self.index_path = index_path
+        self.idle_ttl = idle_ttl
+        self.memory_cap_bytes = memory_cap_bytes
+        self.max_resident = max(1, max_resident)
+        self.touch_interval = touch_interval
+
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_touch: Dict[str, float] = {}
+        # session_id -> set once the loader call in flight for it has finished
+        self._loading: Dict[str, threading.Event] = {}
+        self._last_purge = 0.0
+        self._loader: Optional[Callable[[str, Dict[str, Any]], Any]] = None
+
+        self.counters = {
+            "hits": 0,
+            "rehydrated": 0,
+            "coalesced": 0,
+            "misses": 0,
+            "evicted_lru": 0,
+            "evicted_memory": 0,
+            "evicted_idle": 0,
+            "dropped_remote": 0,
+        }
+
+    def set_loader(self, loader: Callable[[str, Dict[str, Any]], Any]):
+        """Register the callback that rebuilds a non-resident session object from its metadata"""
+        self._loader = loader
+
+    # ==========================================
+    # SHARED INDEX
+    # ==========================================
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.index_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.index_path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " meta TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+            self._conn = conn
+        return self._conn
+
+    # ==========================================
+    # PUBLIC API
+    # ==========================================
+
+    def create(self, session_id: str, meta: Dict[str, Any], obj: Any = None, size_bytes: Optional[int] = None):
+        now = time.time()
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO sessions (session_id, meta, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(meta, default=str), now, now)
+            )
+            self._last_touch[session_id] = now
+            if obj is not None:
+                self._make_resident(session_id, obj, meta, size_bytes)
+        self.purge_expired()
+
+    def get(self, session_id: str) -> Optional[SessionEntry]:
+        """
+        Resolve a session, rehydrating its object through the loader if it is
+        not resident in this process. Returns None for unknown or idle-expired sessions
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db().execute(
+                "SELECT meta, created_at, last_access FROM sessions WHERE session_id = ?",
+                (session_id,)
+            ).fetchone()
+
+            if row is None:
+                # Deleted, or purged by another worker
+                self._drop_resident(session_id)
+                self._last_touch.pop(session_id, None)
+                self.counters["misses"] += 1
+                return None
+
+            meta_json, created_at, last_access = row
+            if now - last_access > self.idle_ttl:
+                self.counters["evicted_idle"] += 1
+                self._delete_locked(session_id)
+                self.counters["misses"] += 1
+                return None
+
+            # Throttle index writes: last_access only needs ~touch_interval precision
+            if now - self._last_touch.get(session_id, 0.0) >= self.touch_interval:
+                self._db().execute(
+                    "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+                    (now, session_id)
+                )
+                self._last_touch[session_id] = now
+                last_access = now
+
+            meta = json.loads(meta_json)
+            loading, leader = None, False
+            resident = self._resident.get(session_id)
+            if resident is not None:
+                self._resident.move_to_end(session_id)
+                self.counters["hits"] += 1
+            elif self._loader is not None:
+                loading = self._loading.get(session_id)
+                leader = loading is None
+                if leader:
+                    loading = self._loading[session_id] = threading.Event()
+
+        if loading is not None:
+            resident = self._rehydrate(session_id, meta, loading) if leader else self._await_load(session_id, loading)
+
+        return SessionEntry(
+            session_id=session_id,
+            meta=meta,
+            created_at=created_at,
+            last_access=last_access,
+            obj=resident.obj if resident else None,
+            size_bytes=resident.size_bytes if resident else 0,
+        )
+
+    def _rehydrate(self, session_id: str, meta: Dict[str, Any], loading: threading.Event) -> Optional[_Resident]:
+        """Run the loader without the store lock (disk I/O, mmaps); other lookups carry on meanwhile"""
+        try:
+            obj = self._loader(session_id, meta)
+            if obj is None:
+                return None
+            size = estimate_size(obj)
+            with self._lock:
+                # Deleted while it was loading: do not bring it back
+                known = self._db().execute(
+                    "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if known is None:
+                    return None
+                resident = self._resident.get(session_id)
+                if resident is None:
+                    resident = self._make_resident(session_id, obj, meta, size)
+                    self.counters["rehydrated"] += 1
+                return resident
+        finally:
+            with self._lock:
+                self._loading.pop(session_id, None)
+            loading.set()
+
+    def _await_load(self, session_id: str, loading: threading.Event) -> Optional[_Resident]:
+        """Wait for the load another thread started for the same session"""
+        loading.wait()
+        with self._lock:
+            resident = self._resident.get(session_id)
+            if resident is not None:
+                self.counters["coalesced"] += 1
+            return resident
+
+    def attach(self, session_id: str, obj: Any, size_bytes: Optional[int] = None):
+        """Make (or replace) the local heavyweight object for an existing session"""
+        with self._lock:
+            row = self._db().execute(
+                "SELECT meta FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+            self._make_resident(session_id, obj, json.loads(row[0]), size_bytes)
+
+    def update_meta(self, session_id: str, **changes):
+        with self._lock:
+            row = self._db().execute(
+                "SELECT meta FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+            meta = {**json.loads(row[0]), **changes}
+            self._db().execute(
+                "UPDATE sessions SET meta = ? WHERE session_id = ?",
+                (json.dumps(meta, default=str), session_id)
+            )
+            resident = self._resident.get(session_id)
+            if resident is not None:
+                resident.meta = meta
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._delete_locked(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def purge_expired(self, force: bool = False) -> int:
+        """Drop idle sessions from the index and from this process (throttled to once a minute)"""
+        now = time.time()
+        if not force and now - self._last_purge < 60:
+            return 0
+        self._last_purge = now
+        cutoff = now - self.idle_ttl
+
+        with self._lock:
+            expired = [
+                r[0] for r in self._db().execute(
+                    "SELECT session_id FROM sessions WHERE last_access < ?", (cutoff,)
+                ).fetchall()
+            ]
+            self._db().execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+            for session_id in expired:
+                self._drop_resident(session_id)
+                self._last_touch.pop(session_id, None)
+            # Residents whose session was deleted (or purged) by another worker
+            for session_id in list(self._resident):
+                known = self._db().execute(
+                    "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if known is None:
+                    self._drop_resident(session_id)
+                    self._last_touch.pop(session_id, None)
+                    self.counters["dropped_remote"] += 1
+            # Touched here last before the cutoff: gone from the index by now either way
+            for session_id in [k for k, touched in self._last_touch.items() if touched < cutoff]:
+                del self._last_touch[session_id]
+
+        self.counters["evicted_idle"] += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shared = self._db().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            return {
+                **self.counters,
+                "sessions_shared": shared,
+                "sessions_resident": len(self._resident),
+                "memory_bytes": self._memory_bytes,
+                "memory_cap_bytes": self.memory_cap_bytes,
+                "max_resident": self.max_resident,
+                "idle_ttl_seconds": self.idle_ttl,
+            }
+
+    # ==========================================
+    # LOCAL LRU (lock held)
+    # ==========================================
+
+    def _make_resident(self, session_id: str, obj: Any, meta: Dict[str, Any], size_bytes: Optional[int]) -> _Resident:
+        self._drop_resident(session_id)
+        size = size_bytes if size_bytes is not None else estimate_size(obj)
+        resident = _Resident(obj=obj, size_bytes=size, meta=meta)
+        self._resident[session_id] = resident
+        self._memory_bytes += size
+
+        while len(self._resident) > self.max_resident:
+            self._evict_oldest("evicted_lru", keep=session_id)
+        while self._memory_bytes > self.memory_cap_bytes and len(self._resident) > 1:
+            self._evict_oldest("evicted_memory", keep=session_id)
+        return resident
+
+    def _evict_oldest(self, counter: str, keep: str):
+        for session_id in self._resident:
+            if session_id != keep:
+                self._drop_resident(session_id)
+                self.counters[counter] += 1
+                return
+
+    def _drop_resident(self, session_id: str):
+        resident = self._resident.pop(session_id, None)
+        if resident is not None:
+            self._memory_bytes -= resident.size_bytes
+
+    def _delete_locked(self, session_id: str) -> bool:
+        cursor = self._db().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._drop_resident(session_id)
+        self._last_touch.pop(session_id, None)
+        return cursor.rowcount > 0
+
+
+session_store = SessionStore(
+    index_path=settings.SESSION_INDEX_PATH,
+    idle_ttl=settings.SESSION_TIMEOUT_MINUTES * 60,
+    memory_cap_bytes=settings.SESSION_MEMORY_CAP_MB * 1024 * 1024,
+    max_resident=settings.SESSION_MAX_RESIDENT,
+)
@@ -0,0 +1,129 @@
+"""
+Startup Profiler
+Cold-start cost of `app.app`, measured in a fresh interpreter
+
+Runs `python -X importtime` on an import of app.app (which builds the app
+with create_app()) and reports
+- the wall time from an empty interpreter to a ready app object
+- the slowest modules by self and cumulative import time
+- import time per top-level package (fastapi, sqlalchemy, numpy, ...)
+
+tests/test_api.py holds that wall time to STARTUP_BUDGET_SECONDS.
+
+Usage:
+    python -m app.utils.startup [--top 20] [--eager]
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = Path(__file__).parent.parent.parent
+
+_SNIPPET = """
+import json, time
+started = time.perf_counter()
+import app.app
+imported = time.perf_counter()
+app.app.create_app()
+print(json.dumps({"cold_seconds": imported - started, "create_app_seconds": time.perf_counter() - imported}))
+"""
+
+
+@dataclass
+class ModuleTime:
+    name: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+@dataclass
+class StartupProfile:
+    cold_seconds: float  # interpreter to app object: every import plus the module-level create_app()
+    create_app_seconds: float  # create_app() again, with everything imported
+    modules: List[ModuleTime] = field(default_factory=list)
+
+    def slowest(self, n: int, key: str = "self_us", prefix: str = "") -> List[ModuleTime]:
+        selected = [m for m in self.modules if m.name.startswith(prefix)]
+        return sorted(selected, key=lambda m: getattr(m, key), reverse=True)[:n]
+
+    def by_package(self) -> List[Tuple[str, int]]:
+        totals: Dict[str, int] = {}
+        for module in self.modules:
+            package = module.name.split(".", 1)[0]
+            totals[package] = totals.get(package, 0) + module.self_us
+        return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def _parse_importtime(stderr: str) -> List[ModuleTime]:
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules.append(ModuleTime(
+                name=name.strip(),
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip())) // 2,
+            ))
+        except ValueError:
+            continue  # the header line
+    return modules
+
+
+def measure_startup(eager: bool = False, env: Optional[Dict[str, str]] = None) -> StartupProfile:
+    """Profile one cold start (eager: every router imported up front, as before lazy loading)"""
+    run_env = {**os.environ, **(env or {})}
+    if eager:
+        run_env["LAZY_ROUTERS"] = "false"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _SNIPPET],
+        cwd=ROOT, env=run_env, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return StartupProfile(
+        cold_seconds=timings["cold_seconds"],
+        create_app_seconds=timings["create_app_seconds"],
+        modules=_parse_importtime(result.stderr),
+    )
+
+
+def _report(profile: StartupProfile, top: int):
+    print(f"cold start: {profile.cold_seconds * 1000:.0f} ms "
+          f"(create_app() alone: {profile.create_app_seconds * 1000:.1f} ms), {len(profile.modules)} modules")
+
+    print(f"\n{'package':<30} {'self ms':>9}")
+    for package, self_us in profile.by_package()[:top]:
+        print(f"{package:<30} {self_us / 1000:>9.1f}")
+
+    for title, prefix, key in (("slowest modules (self)", "", "self_us"),
+                               ("app modules (cumulative)", "app", "cumulative_us")):
+        print(f"\n{title:<50} {'self ms':>9} {'cum ms':>9}")
+        for module in profile.slowest(top, key=key, prefix=prefix):
+            print(f"{module.name:<50} {module.self_us / 1000:>9.1f} {module.cumulative_us / 1000:>9.1f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m app.utils.startup")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--eager", action="store_true", help="import every router up front (LAZY_ROUTERS=false)")
+    args = parser.parse_args(argv)
+    _report(measure_startup(eager=args.eager), args.top)
+
+
+__all__ = [
+    'ModuleTime',
+    'StartupProfile',
+    'measure_startup',
+]
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
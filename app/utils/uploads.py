@@ -0,0 +1,94 @@
+"""
+Upload Handling
+Streams uploaded files to disk in chunks with an enforced size limit
+and an incrementally computed SHA-256
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+import hashlib
+import os
+import tempfile
+
+
+@dataclass
+class StoredUpload:
+    """An upload that has been written to disk"""
+    path: Path
+    filename: str
+    size_bytes: int
+    sha256: str
+
+    def persist(self, directory: str) -> "StoredUpload":
+        """Move the file to <directory>/<sha256><suffix> (content-addressed, deduplicated)"""
+        target = Path(directory) / f"{self.sha256}{Path(self.filename).suffix.lower()}"
+        os.replace(self.path, target)
+        self.path = target
+        return self
+
+    def remove(self):
+        remove_upload(self.path)
+
+
+def remove_upload(path) -> None:
+    """Delete an upload; already gone is fine"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(413, detail=f"File too large. Maximum size: {max_bytes // (1024 * 1024)}MB")
+
+
+async def stream_upload(
+    file: UploadFile,
+    directory: str,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024,
+) -> StoredUpload:
+    """
+    Copy an UploadFile to a temp file under `directory` chunk by chunk
+
+    Never holds more than one chunk in memory. Raises 413 as soon as the
+    running size passes `max_bytes` and removes the partial file
+    (the PDF workers memory-map the file, which needs it non-empty: empty
+    uploads are rejected with 400)
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="upload-", suffix=".part")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            def write(chunk: bytes):
+                hasher.update(chunk)
+                out.write(chunk)
+
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(max_bytes)
+                await run_in_threadpool(write, chunk)
+
+        if size == 0:
+            raise HTTPException(400, detail="Uploaded file is empty")
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return StoredUpload(
+        path=Path(tmp_path),
+        filename=file.filename or "",
+        size_bytes=size,
+        sha256=hasher.hexdigest(),
+    )
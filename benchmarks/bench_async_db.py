@@ -0,0 +1,203 @@
+"""
+Async database layer benchmark
+
+Runs a small FastAPI app under uvicorn (separate process) whose routes issue
+the same queries as the chatbot routes two ways:
+- sync:   `with get_db()` inside an `async def` handler (how the routes used
+          to work: every query blocks the event loop)
+- async:  `async with get_async_db()` (AsyncSession over aiosqlite / asyncpg)
+
+200 concurrent clients hammer each variant with a mix of session-history
+reads and query-log writes; throughput and latency percentiles are reported.
+--db-latency-ms adds a fixed per-query delay (time.sleep vs asyncio.sleep) to
+model a networked database such as PostgreSQL, where the gap is largest.
+
+Usage:
+    python benchmarks/bench_async_db.py [--clients 200] [--requests 4000] [--db-latency-ms 0]
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SESSIONS = 50
+PORT = 8765
+
+
+def build_app(db_latency: float):
+    from fastapi import FastAPI
+    from sqlalchemy import select
+    from app.database.connection import get_db, get_async_db
+    from app.database.models import ChatQuery, ChatSession
+
+    app = FastAPI()
+
+    @app.get("/sync/history/{session_id}")
+    async def sync_history(session_id: str):
+        with get_db() as db:
+            if db_latency:
+                time.sleep(db_latency)
+            session = db.query(ChatSession).filter_by(session_id=session_id).first()
+            queries = db.query(ChatQuery).filter_by(session_id=session_id)\
+                .order_by(ChatQuery.timestamp.desc()).limit(20).all()
+            return {"session": session.to_dict(), "queries": [q.to_dict() for q in queries]}
+
+    @app.post("/sync/record/{session_id}")
+    async def sync_record(session_id: str):
+        with get_db() as db:
+            if db_latency:
+                time.sleep(db_latency)
+            db.add(ChatQuery(session_id=session_id, query="q", response="r", response_time_ms=1.0))
+        return {"status": "success"}
+
+    @app.get("/async/history/{session_id}")
+    async def async_history(session_id: str):
+        async with get_async_db() as db:
+            if db_latency:
+                await asyncio.sleep(db_latency)
+            session = await db.scalar(select(ChatSession).filter_by(session_id=session_id))
+            queries = (await db.scalars(
+                select(ChatQuery).filter_by(session_id=session_id)
+                .order_by(ChatQuery.timestamp.desc()).limit(20)
+            )).all()
+            return {"session": session.to_dict(), "queries": [q.to_dict() for q in queries]}
+
+    @app.post("/async/record/{session_id}")
+    async def async_record(session_id: str):
+        async with get_async_db() as db:
+            if db_latency:
+                await asyncio.sleep(db_latency)
+            db.add(ChatQuery(session_id=session_id, query="q", response="r", response_time_ms=1.0))
+        return {"status": "success"}
+
+    return app
+
+
+def seed():
+    from app.database.connection import get_db, init_db
+    from app.database.models import ChatQuery, ChatSession
+
+    init_db()
+    with get_db() as db:
+        for s in range(SESSIONS):
+            db.add(ChatSession(session_id=f"bench-{s}", pdf_filename="bench.pdf", queries_count=0))
+            for q in range(20):
+                db.add(ChatQuery(session_id=f"bench-{s}", query=f"q{q}", response="r" * 200, response_time_ms=5.0))
+
+
+def serve(db_latency: float):
+    import logging
+    import uvicorn
+    from app.database import connection
+
+    logging.disable(logging.CRITICAL)
+    connection.engine.echo = False
+    connection.async_engine.echo = False
+    uvicorn.run(build_app(db_latency), host="127.0.0.1", port=PORT, log_level="error", access_log=False)
+
+
+async def request(reader, writer, method: str, path: str) -> int:
+    """One HTTP/1.1 keep-alive request on a raw connection (httpx costs more CPU than the server)"""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: 0\r\n\r\n".encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def drive(variant: str, clients: int, total: int, write_ratio: float):
+    rng = random.Random(0)
+    plan = [
+        ("POST" if rng.random() < write_ratio else "GET", f"bench-{rng.randrange(SESSIONS)}")
+        for _ in range(total)
+    ]
+    latencies = []
+    errors = 0
+
+    async def worker(jobs):
+        nonlocal errors
+        reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+        try:
+            for method, session_id in jobs:
+                path = f"/{variant}/record/{session_id}" if method == "POST" else f"/{variant}/history/{session_id}"
+                start = time.perf_counter()
+                status = await request(reader, writer, method, path)
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += status != 200
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(plan[i::clients]) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "errors": errors,
+    }
+
+
+def wait_until_up(timeout: float = 20.0):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/docs", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("benchmark server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=4000, help="requests per variant")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before app.config is imported (here and in the server process)
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ["DEBUG"] = "false"
+        seed()
+
+        server = multiprocessing.get_context("spawn").Process(target=serve, args=(args.db_latency_ms / 1000,))
+        server.start()
+        try:
+            wait_until_up()
+            results = {}
+            for variant in ("sync", "async"):
+                asyncio.run(drive(variant, args.clients, args.requests // 10, args.write_ratio))  # warm-up
+                results[variant] = asyncio.run(drive(variant, args.clients, args.requests, args.write_ratio))
+        finally:
+            server.terminate()
+            server.join()
+
+    print(f"{args.clients} clients, {args.requests} requests per variant, "
+          f"{args.write_ratio:.0%} writes, simulated DB latency {args.db_latency_ms} ms")
+    print(f"{'variant':<8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['rps']:>9.0f} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+BM25 retrieval benchmark
+
+Builds the array-backed BM25Index over a synthetic corpus (Zipf-distributed
+vocabulary, ~chunk-sized documents) and times top-10 retrieval:
+- dict:   dict-of-lists postings + heapq, the straightforward pure-Python index
+- numpy:  BM25Index in memory
+- mmap:   BM25Index.load(..., mmap=True) from the saved .npy files
+
+Usage:
+    python benchmarks/bench_bm25.py [--chunks 100000] [--queries 2000]
+"""
+from collections import defaultdict
+from pathlib import Path
+import argparse
+import heapq
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from app.core.queryengine import BM25Index, tokenize
+
+
+def make_corpus(num_chunks: int, vocab_size: int, words_per_chunk: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"term{i}" for i in range(vocab_size)])
+    ids = (rng.zipf(1.15, size=num_chunks * words_per_chunk) - 1) % vocab_size
+    tokens = words[ids].reshape(num_chunks, words_per_chunk)
+    return [" ".join(row) for row in tokens], words
+
+
+def make_queries(words, count: int, seed: int = 1):
+    """2-4 terms per query, drawn from the mid-frequency band like real questions"""
+    rng = np.random.default_rng(seed)
+    band = words[10:5000]
+    return [" ".join(rng.choice(band, size=rng.integers(2, 5))) for _ in range(count)]
+
+
+class DictIndex:
+    """Baseline: term -> [(chunk, weight)] with weights precomputed the same way"""
+
+    def __init__(self, index: BM25Index):
+        self.postings = defaultdict(list)
+        for t, term in enumerate(index.vocab.tolist()):
+            start, end = index.indptr[t], index.indptr[t + 1]
+            self.postings[term] = list(zip(index.postings[start:end].tolist(), index.weights[start:end].tolist()))
+
+    def search(self, query: str, k: int = 10):
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            for doc, weight in self.postings.get(term, ()):
+                scores[doc] += weight
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def time_queries(search, queries, k: int = 10):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "mean": statistics.fmean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=180, help="words per chunk")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    texts, words = make_corpus(args.chunks, args.vocab, args.words)
+    queries = make_queries(words, args.queries)
+
+    start = time.perf_counter()
+    index = BM25Index.build(texts)
+    build_seconds = time.perf_counter() - start
+    del texts
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        index.save(tmp)
+        mapped = BM25Index.load(tmp, mmap=True)
+        baseline = DictIndex(index)
+
+        # Warm-up (page in the mapped files, JIT-free but cache-warm)
+        for search in (baseline.search, index.search, mapped.search):
+            for query in queries[:50]:
+                search(query, 10)
+
+        results["dict"] = time_queries(baseline.search, queries)
+        results["numpy"] = time_queries(index.search, queries)
+        results["mmap"] = time_queries(mapped.search, queries)
+        del mapped
+
+    print(f"{args.chunks} chunks, {index.num_terms} terms, {len(index.postings)} postings "
+          f"({index.memory_usage() / 1024 / 1024:.1f} MB), built in {build_seconds:.1f}s")
+    print(f"{'index':<8} {'p50 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['p50']:>9.3f} {r['p99']:>9.3f} {r['mean']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Response compression benchmark
+
+CPU time against bytes saved for gzip and brotli at several levels, on
+payloads shaped like what the app actually serves:
+- api/performance JSON (one entry per endpoint)
+- visitors/trend JSON over 365 days
+- a rendered HTML page
+- an NDJSON api_usage export, compressed chunk by chunk as
+  CompressionMiddleware does for streaming responses
+
+Usage:
+    python benchmarks/bench_compression.py [--rounds 20]
+"""
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import argparse
+import gzip
+import json
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.testclient import TestClient
+from app.api.middleware.compression import _Encoder
+import brotli
+
+LEVELS = [("gzip", level) for level in (1, 4, 6, 9)] + [("br", quality) for quality in (1, 4, 6, 9, 11)]
+
+
+# ==========================================
+# PAYLOADS
+# ==========================================
+
+def performance_json() -> bytes:
+    rng = random.Random(1)
+    endpoints = [f"/api/v1/{group}/{name}" for group in ("chatbot", "email", "analytics", "contact")
+                 for name in ("query", "upload", "session", "stats", "summary", "trend", "export", "usage")]
+    return json.dumps({
+        "status": "success",
+        "overview": {"total_requests": 812345, "error_requests": 1234, "error_rate": 0.15},
+        "endpoints": [
+            {"endpoint": e, "method": m, "requests": rng.randint(10, 90000),
+             "avg_response_time_ms": round(rng.uniform(1, 900), 2), "errors": rng.randint(0, 300)}
+            for e in endpoints for m in ("GET", "POST")
+        ],
+    }).encode()
+
+
+def trend_json() -> bytes:
+    rng = random.Random(2)
+    start = date(2026, 1, 1)
+    return json.dumps({
+        "status": "success",
+        "days": 365,
+        "data": [
+            {"date": (start + timedelta(days=i)).isoformat(), "visitors": rng.randint(20, 4000),
+             "unique_visitors": rng.randint(10, 2000)}
+            for i in range(365)
+        ],
+    }).encode()
+
+
+def html_page() -> bytes:
+    from app.api.routes.pages import templates
+    with TestClient(_page_app(templates)) as client:
+        return client.get("/", headers={"accept-encoding": "identity"}).content
+
+
+def _page_app(templates):
+    from starlette.applications import Starlette
+    from starlette.routing import Mount, Route
+    from starlette.staticfiles import StaticFiles
+
+    async def home(request):
+        return templates.TemplateResponse("pages/home.html", {"request": request})
+
+    static = Path(__file__).resolve().parent.parent / "static"
+    return Starlette(routes=[Route("/", home), Mount("/static", StaticFiles(directory=static), name="static")])
+
+
+def export_chunks(rows: int = 20000, batch_rows: int = 2000) -> list:
+    rng = random.Random(3)
+    start = datetime(2026, 3, 1)
+    lines = [
+        json.dumps({
+            "id": i, "endpoint": rng.choice(["/api/v1/chatbot/query", "/api/v1/email/generate", "/"]),
+            "method": rng.choice(["GET", "POST"]), "status_code": rng.choice([200, 200, 200, 404, 500]),
+            "response_time_ms": round(rng.uniform(1, 900), 3), "ip_hash": f"{rng.getrandbits(64):016x}",
+            "timestamp": (start + timedelta(seconds=i * 7)).isoformat(),
+        }) + "\n"
+        for i in range(rows)
+    ]
+    return ["".join(lines[i:i + batch_rows]).encode() for i in range(0, rows, batch_rows)]
+
+
+# ==========================================
+# HARNESS
+# ==========================================
+
+def compress_whole(encoding: str, level: int, data: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level)
+
+
+def compress_stream(encoding: str, level: int, chunks: list) -> bytes:
+    encoder = _Encoder(encoding, gzip_level=level, brotli_quality=level)
+    return b"".join(encoder.chunk(c) for c in chunks[:-1]) + encoder.finish(chunks[-1])
+
+
+def bench(fn, rounds: int) -> tuple:
+    samples = []
+    out = b""
+    for _ in range(rounds):
+        start = time.perf_counter()
+        out = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = {
+        "api/performance": performance_json(),
+        "visitors/trend": trend_json(),
+        "home.html": html_page(),
+    }
+    chunks = export_chunks()
+
+    for name, data in payloads.items():
+        print(f"\n{name}: {len(data):,} bytes")
+        print(f"{'encoding':<10} {'ms':>8} {'MB/s':>8} {'bytes':>9} {'ratio':>7} {'saved/ms':>10}")
+        for encoding, level in LEVELS:
+            seconds, size = bench(lambda: compress_whole(encoding, level, data), args.rounds)
+            _row(f"{encoding}-{level}", seconds, len(data), size)
+
+    total = sum(len(c) for c in chunks)
+    print(f"\nNDJSON export, {len(chunks)} chunks: {total:,} bytes (flushed per chunk)")
+    print(f"{'encoding':<10} {'ms':>8} {'MB/s':>8} {'bytes':>9} {'ratio':>7} {'saved/ms':>10}")
+    for encoding, level in LEVELS:
+        seconds, size = bench(lambda: compress_stream(encoding, level, chunks), max(3, args.rounds // 4))
+        _row(f"{encoding}-{level}", seconds, total, size)
+
+
+def _row(label: str, seconds: float, original: int, size: int):
+    ms = seconds * 1000
+    print(f"{label:<10} {ms:>8.2f} {original / seconds / 1e6:>8.1f} {size:>9,} "
+          f"{original / size:>6.1f}x {(original - size) / max(ms, 1e-6):>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Knowledge graph benchmark
+
+Builds the same random typed graph (power-law degrees) twice:
+- dict:  networkx-style dict-of-dicts adjacency, {u: {v: {"type": r, "weight": w}}}
+- csr:   KnowledgeGraph (interned entities, CSR arrays)
+and compares resident memory and 1-3 hop neighborhood expansion.
+
+Usage:
+    python benchmarks/bench_knowledge_graph.py [--edges 1000000] [--entities 200000]
+"""
+from collections import deque
+from pathlib import Path
+import argparse
+import gc
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from app.core.knowledgegraph import KnowledgeGraphBuilder
+
+RELATIONS = ["co_sentence", "co_chunk", "works_for", "located_in"]
+
+
+def make_edges(num_entities: int, num_edges: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    # Zipf-ish endpoints: a few hub entities, a long tail
+    src = (rng.zipf(1.3, size=num_edges) - 1) % num_entities
+    dst = rng.integers(0, num_entities, size=num_edges)
+    rel = rng.integers(0, len(RELATIONS), size=num_edges)
+    return src, dst, rel
+
+
+def build_dict(names, src, dst, rel):
+    graph = {}
+    for u, v, r in zip(src.tolist(), dst.tolist(), rel.tolist()):
+        if u == v:
+            continue
+        a, b, relation = names[u], names[v], RELATIONS[r]
+        for x, y in ((a, b), (b, a)):
+            edge = graph.setdefault(x, {}).get(y)
+            if edge is None:
+                graph[x][y] = {"type": relation, "weight": 1}
+            else:
+                edge["weight"] += 1
+    return graph
+
+
+def build_csr(names, src, dst, rel):
+    builder = KnowledgeGraphBuilder()
+    for name in names:
+        builder.add_entity(name)
+    for u, v, r in zip(src.tolist(), dst.tolist(), rel.tolist()):
+        builder.add_relation(names[u], RELATIONS[r], names[v])
+    return builder.build()
+
+
+def dict_k_hop(graph, seed, hops):
+    seen = {seed: 0}
+    queue = deque([seed])
+    while queue:
+        node = queue.popleft()
+        depth = seen[node]
+        if depth == hops:
+            continue
+        for neighbor in graph.get(node, ()):
+            if neighbor not in seen:
+                seen[neighbor] = depth + 1
+                queue.append(neighbor)
+    return seen
+
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(*args)
+    seconds = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, current
+
+
+def time_calls(fn, seeds):
+    latencies = []
+    for seed in seeds:
+        start = time.perf_counter()
+        fn(seed)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies), statistics.fmean(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--edges", type=int, default=1_000_000)
+    parser.add_argument("--entities", type=int, default=200_000)
+    parser.add_argument("--seeds", type=int, default=50)
+    args = parser.parse_args()
+
+    names = [f"Entity {i}" for i in range(args.entities)]
+    src, dst, rel = make_edges(args.entities, args.edges)
+
+    dict_graph, dict_build, dict_bytes = measure(build_dict, names, src, dst, rel)
+    csr_graph, csr_build, csr_bytes = measure(build_csr, names, src, dst, rel)
+
+    rng = np.random.default_rng(2)
+    seeds = rng.integers(0, args.entities, size=args.seeds).tolist()
+
+    print(f"{args.entities} entities, {args.edges} relations "
+          f"({csr_graph.num_edges} adjacency entries after dedup, both directions)")
+    print(f"{'graph':<6} {'build s':>8} {'memory MB':>10}")
+    print(f"{'dict':<6} {dict_build:>8.1f} {dict_bytes / 1024 / 1024:>10.1f}")
+    print(f"{'csr':<6} {csr_build:>8.1f} {csr_bytes / 1024 / 1024:>10.1f}")
+
+    print(f"\n{'hops':<5} {'dict p50 ms':>12} {'csr p50 ms':>11} {'reached (median)':>17}")
+    for hops in (1, 2, 3):
+        dict_p50, _ = time_calls(lambda s: dict_k_hop(dict_graph, names[s], hops), seeds)
+        csr_p50, _ = time_calls(lambda s: csr_graph.k_hop([s], hops=hops), seeds)
+        reached = statistics.median(len(csr_graph.k_hop([s], hops=hops)[0]) for s in seeds)
+        print(f"{hops:<5} {dict_p50:>12.2f} {csr_p50:>11.2f} {reached:>17.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+LLM client load test, offline
+
+Runs the bundled stub provider (app/core/llm_stub.py) on a local port and
+drives it through LLMClient:
+1. streamed answers at high caller concurrency: pooled client vs. a fresh
+   httpx client per request (connections opened, TTFT, throughput)
+2. the same load with injected 429/503s: retries, failures, latency
+3. embeddings requested one text at a time: micro-batched vs. unbatched
+
+Usage:
+    python benchmarks/bench_llm_client.py [--requests 200] [--callers 50] [--concurrency 16]
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import uvicorn
+from app.core.llm import LLMClient, LLMError
+from app.core.llm_stub import StubConfig, create_stub_app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    def __init__(self, config: StubConfig):
+        self.port = free_port()
+        self.app = create_stub_app(config)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, port=self.port, log_level="error", lifespan="off"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+    def reset(self, **config):
+        for name, value in config.items():
+            setattr(self.app.state.config, name, value)
+        stats = self.app.state.stats
+        stats.requests = stats.errors_injected = stats.peak_in_flight = 0
+        stats.connections.clear()
+
+
+def messages(i: int):
+    return [{"role": "user", "content": f"question {i}: what does the document say about entity {i % 17}?"}]
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def stream_load(make_client, requests: int, callers: int):
+    """`callers` tasks share `requests` streamed answers -> (ttfts, totals, failures, seconds)"""
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    ttfts, totals, failures = [], [], 0
+
+    async def caller():
+        nonlocal failures
+        while not queue.empty():
+            i = queue.get_nowait()
+            client, owned = make_client()
+            started = time.perf_counter()
+            first = None
+            try:
+                async for _ in client.stream(messages(i)):
+                    if first is None:
+                        first = time.perf_counter() - started
+                ttfts.append(first * 1000)
+                totals.append((time.perf_counter() - started) * 1000)
+            except LLMError:
+                failures += 1
+            finally:
+                if owned:
+                    await client.aclose()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(callers)))
+    return ttfts, totals, failures, time.perf_counter() - started
+
+
+def report(label: str, server: StubServer, result, client_stats=None):
+    ttfts, totals, failures, seconds = result
+    stats = server.app.state.stats
+    print(f"{label:<22} {len(totals) / seconds:>7.1f} {percentile(ttfts, .5):>8.0f} {percentile(ttfts, .95):>8.0f} "
+          f"{percentile(totals, .95):>8.0f} {len(stats.connections):>6} {stats.peak_in_flight:>5} "
+          f"{(client_stats or {}).get('retries', 0):>7} {failures:>5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ttft-ms", type=float, default=150.0)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    config = StubConfig(ttft_ms=args.ttft_ms, token_ms=args.token_ms, tokens=40)
+    with StubServer(config) as server:
+        def pooled(**options):
+            return LLMClient(server.base_url, api_key="stub", model="stub-chat",
+                             max_concurrency=args.concurrency, max_connections=args.concurrency, **options)
+
+        print(f"{args.requests} streamed answers, {args.callers} callers, semaphore {args.concurrency}, "
+              f"stub TTFT ~{args.ttft_ms:.0f} ms + {args.token_ms:.0f} ms/token")
+        print(f"{'client':<22} {'req/s':>7} {'ttft50':>8} {'ttft95':>8} {'total95':>8} {'conns':>6} {'peak':>5} "
+              f"{'retries':>7} {'fail':>5}")
+
+        # 1. pooled vs. one client per request (no semaphore, no pool)
+        server.reset()
+        client = pooled()
+        report("pooled", server, asyncio.run(stream_load(lambda: (client, False), args.requests, args.callers)),
+               client.stats())
+
+        server.reset()
+        report("client per request", server, asyncio.run(stream_load(
+            lambda: (LLMClient(server.base_url, api_key="stub", model="stub-chat",
+                               max_concurrency=args.callers, http2=False), True),
+            args.requests, args.callers)))
+
+        # 2. injected failures
+        for error_rate in (0.1, 0.3):
+            server.reset(error_rate=error_rate)
+            client = pooled(backoff_base=0.05, latency_budget=5.0)
+            report(f"pooled, {error_rate:.0%} errors", server,
+                   asyncio.run(stream_load(lambda: (client, False), args.requests, args.callers)), client.stats())
+        server.reset(error_rate=0.0)
+
+        # 3. embeddings, one text per call
+        print(f"\n{args.requests * 5} embed() calls of one text each")
+        print(f"{'mode':<22} {'seconds':>8} {'http requests':>14}")
+        for label, window_ms in (("unbatched", 0.0), ("batched (5 ms window)", 5.0)):
+            server.reset()
+            client = pooled(batch_window_ms=window_ms, batch_max_inputs=256 if window_ms else 1)
+
+            async def run():
+                started = time.perf_counter()
+                await asyncio.gather(*(client.embed([f"chunk {i}"]) for i in range(args.requests * 5)))
+                return time.perf_counter() - started
+
+            seconds = asyncio.run(run())
+            print(f"{label:<22} {seconds:>8.2f} {server.app.state.stats.requests:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Middleware overhead benchmark
+
+Compares the per-request cost of the old BaseHTTPMiddleware stack
+(ProxyHeaders + SecurityHeaders + Analytics) with RequestPipelineMiddleware.
+Requests are driven straight through the ASGI interface, so the numbers are
+pure middleware + routing overhead with no network or server in the way.
+
+Usage:
+    python benchmarks/bench_middleware.py [--requests 20000] [--no-analytics]
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from app.config import settings
+from app.database.analytics_buffer import analytics_buffer
+from app.api.middleware.analytics import should_track, track_request
+from app.api.middleware.security import SECURITY_HEADERS
+from app.api.middleware.pipeline import RequestPipelineMiddleware
+
+
+# ==========================================
+# LEGACY STACK (as it was before the pure-ASGI rewrite)
+# ==========================================
+
+class LegacyProxyHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        forwarded_proto = request.headers.get("x-forwarded-proto")
+        if forwarded_proto:
+            request.scope["scheme"] = forwarded_proto
+        return await call_next(request)
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS.items():
+            response.headers[name] = value
+        return response
+
+
+class LegacyAnalyticsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        if not settings.ENABLES_ANALYTICS:
+            return await call_next(request)
+        start_time = time.time()
+        response = await call_next(request)
+        process_time_ms = (time.time() - start_time) * 1000
+        if settings.TRACK_RESPONSE_TIME:
+            response.headers["X-Process-Time"] = str(round(process_time_ms, 2))
+        if should_track(request.url.path):
+            track_request(
+                path=request.url.path,
+                method=request.method,
+                status_code=response.status_code,
+                process_time_ms=process_time_ms,
+                client=request.scope.get("client"),
+                user_agent=request.headers.get("user-agent", ""),
+                referrer=request.headers.get("referer", ""),
+            )
+        return response
+
+
+# ==========================================
+# HARNESS
+# ==========================================
+
+async def endpoint(request):
+    return PlainTextResponse("ok")
+
+
+def build_app(stack: str) -> Starlette:
+    if stack == "none":
+        middleware = []
+    elif stack == "legacy":
+        # Same order as the old create_app: last added is outermost
+        middleware = [
+            Middleware(LegacySecurityHeadersMiddleware),
+            Middleware(LegacyAnalyticsMiddleware),
+            Middleware(LegacyProxyHeadersMiddleware),
+        ]
+    else:
+        middleware = [Middleware(RequestPipelineMiddleware)]
+    return Starlette(routes=[Route("/api/v1/ping", endpoint)], middleware=middleware)
+
+
+def make_scope() -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/v1/ping",
+        "raw_path": b"/api/v1/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"user-agent", b"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) Chrome/120.0 Safari/537.36"),
+            (b"x-forwarded-proto", b"https"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+
+
+def make_receive():
+    """Deliver the (empty) request body once, then wait like an idle client"""
+    sent = False
+    idle = asyncio.Event()
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await idle.wait()
+        return {"type": "http.disconnect"}
+
+    return receive
+
+
+async def run_requests(app, n: int) -> float:
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(make_scope(), make_receive(), send)
+    return time.perf_counter() - start
+
+
+async def bench(stack: str, n: int, rounds: int) -> float:
+    app = build_app(stack)
+    await run_requests(app, min(n, 1000))  # warm-up
+    samples = []
+    for _ in range(rounds):
+        analytics_buffer._pending.clear()
+        elapsed = await run_requests(app, n)
+        samples.append(elapsed / n * 1e6)
+    analytics_buffer._pending.clear()
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--no-analytics", action="store_true")
+    args = parser.parse_args()
+
+    settings.ENABLES_ANALYTICS = not args.no_analytics
+    settings.TRACK_RESPONSE_TIME = True
+
+    results = {}
+    for stack in ("none", "legacy", "pipeline"):
+        results[stack] = asyncio.run(bench(stack, args.requests, args.rounds))
+
+    base = results["none"]
+    print(f"{args.requests} requests x {args.rounds} rounds, analytics={'on' if settings.ENABLES_ANALYTICS else 'off'}")
+    print(f"{'stack':<10} {'us/request':>12} {'overhead us':>12}")
+    for stack, us in results.items():
+        print(f"{stack:<10} {us:>12.1f} {us - base:>12.1f}")
+    speedup = (results["legacy"] - base) / max(results["pipeline"] - base, 1e-9)
+    print(f"pipeline middleware overhead is {speedup:.1f}x lower than the legacy stack")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+PDF pipeline throughput benchmark
+
+Generates a corpus of synthetic text PDFs and measures pages/second for
+- sequential: extraction + chunking in this process (iter_pages)
+- pool:       process_pdf() over the shared ProcessPoolExecutor
+
+The pool figure scales with cores; on a single-core machine it mostly shows
+the (small) cost of shipping pages between processes.
+
+Usage:
+    python benchmarks/bench_pdf_pipeline.py [--docs 4] [--pages 200] [--workers 0]
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.document_processor import chunk_pages, iter_pages, process_pdf
+
+
+WORDS = (
+    "graph retrieval augmented generation knowledge entity relation community "
+    "summary document chunk embedding vector index query answer context model "
+    "portfolio project analytics pipeline latency throughput cache session"
+).split()
+
+
+# ==========================================
+# SYNTHETIC PDF WRITER
+# ==========================================
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_synthetic_pdf(path: Path, pages: int, lines_per_page: int = 45, seed: int = 0):
+    """Minimal valid PDF: one Helvetica text stream per page, hand-built xref"""
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for _ in range(pages):
+        lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        ops += [f"({_escape(line)}) '" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    path.write_bytes(bytes(out))
+
+
+# ==========================================
+# BENCHMARKS
+# ==========================================
+
+def bench_sequential(paths) -> float:
+    start = time.perf_counter()
+    for path in paths:
+        for _ in chunk_pages(iter_pages(path)):
+            pass
+    return time.perf_counter() - start
+
+
+async def bench_pool(paths, executor: ProcessPoolExecutor, output_root: Path) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        process_pdf(path, output_root / path.stem, executor=executor) for path in paths
+    ))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=0, help="0 = one per core")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    total_pages = args.docs * args.pages
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        paths = []
+        for i in range(args.docs):
+            path = root / f"doc{i}.pdf"
+            write_synthetic_pdf(path, args.pages, seed=i)
+            paths.append(path)
+        corpus_mb = sum(p.stat().st_size for p in paths) / (1024 * 1024)
+
+        sequential = bench_sequential(paths)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Start the worker processes outside the timing
+            for future in [executor.submit(os.getpid) for _ in range(workers)]:
+                future.result()
+            pool = asyncio.run(bench_pool(paths, executor, root / "out"))
+
+    print(f"{args.docs} docs x {args.pages} pages ({corpus_mb:.1f} MB), {workers} worker(s)")
+    print(f"{'mode':<12} {'seconds':>9} {'pages/s':>10}")
+    for mode, seconds in (("sequential", sequential), ("pool", pool)):
+        print(f"{mode:<12} {seconds:>9.2f} {total_pages / seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Rate limiter overhead benchmark
+
+1. acquire() cost of each backend, single-threaded and from 8 threads
+   (1 hot key vs. 10k distinct clients)
+2. per-request overhead of RateLimitMiddleware, driven straight through the
+   ASGI interface like bench_middleware.py (no network or server)
+3. four processes sharing the SQLite backend: the number of requests let
+   through must equal the bucket capacity, however they interleave
+
+Usage:
+    python benchmarks/bench_rate_limit.py [--ops 50000] [--requests 20000]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from pathlib import Path
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from app.api.middleware.rate_limit import RateLimitMiddleware
+from app.utils.rate_limit import MemoryRateLimiter, SQLiteRateLimiter
+
+# Never refuse: the benchmark measures bookkeeping, not 429s
+RATE, CAPACITY = 1e9, 10 ** 9
+
+
+def make_backend(name: str, directory: str):
+    if name == "sqlite":
+        return SQLiteRateLimiter(os.path.join(directory, f"bench-{time.perf_counter_ns()}.sqlite3"))
+    return MemoryRateLimiter()
+
+
+# ==========================================
+# 1. BACKENDS
+# ==========================================
+
+def bench_acquire(limiter, ops: int, threads: int, distinct: int) -> float:
+    """Microseconds per acquire(), one pass"""
+    keys = [f"api:{i:032x}" for i in range(distinct)]
+    per_thread = ops // threads
+
+    def worker(offset: int):
+        for i in range(per_thread):
+            limiter.acquire(keys[(offset + i) % distinct], RATE, CAPACITY)
+
+    start = time.perf_counter()
+    if threads == 1:
+        worker(0)
+    else:
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(worker, range(0, threads * 7919, 7919)))
+    return (time.perf_counter() - start) / (per_thread * threads) * 1e6
+
+
+# ==========================================
+# 2. MIDDLEWARE
+# ==========================================
+
+async def endpoint(request):
+    return PlainTextResponse("ok")
+
+
+def build_app(limiter) -> Starlette:
+    middleware = [] if limiter is None else [
+        Middleware(RateLimitMiddleware, limiter=limiter, groups=(("/api/", "api", CAPACITY),))
+    ]
+    return Starlette(routes=[Route("/api/v1/ping", endpoint)], middleware=middleware)
+
+
+def make_scope(client: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/v1/ping", "raw_path": b"/api/v1/ping", "query_string": b"",
+        "root_path": "", "headers": [(b"host", b"localhost")],
+        "client": (client, 50000), "server": ("localhost", 80),
+    }
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def send(message):
+    pass
+
+
+async def run_requests(app, n: int, clients: int) -> float:
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    start = time.perf_counter()
+    for i in range(n):
+        await app(make_scope(ips[i % clients]), receive, send)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def bench_middleware(limiter, n: int, clients: int, rounds: int = 5) -> float:
+    app = build_app(limiter)
+    asyncio.run(run_requests(app, min(n, 1000), clients))  # warm-up
+    return statistics.median(asyncio.run(run_requests(app, n, clients)) for _ in range(rounds))
+
+
+# ==========================================
+# 3. SHARED SQLITE ACROSS PROCESSES
+# ==========================================
+
+def _spend(args) -> int:
+    path, attempts = args
+    limiter = SQLiteRateLimiter(path)
+    # Refill negligible over the test: only the initial capacity is available
+    return sum(limiter.acquire("upload:shared", rate=1e-6, capacity=100).allowed for _ in range(attempts))
+
+
+def bench_shared(directory: str, processes: int = 4, attempts: int = 200) -> list:
+    path = os.path.join(directory, "shared.sqlite3")
+    SQLiteRateLimiter(path).stats()  # create the table up front
+    with Pool(processes) as pool:
+        return pool.map(_spend, [(path, attempts)] * processes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"acquire(), {args.ops} ops (us/op)")
+        print(f"{'backend':<8} {'threads':>8} {'1 key':>8} {'10k keys':>9}")
+        for backend in ("memory", "sqlite"):
+            for threads in (1, 8):
+                hot = bench_acquire(make_backend(backend, directory), args.ops, threads, 1)
+                spread = bench_acquire(make_backend(backend, directory), args.ops, threads, 10000)
+                print(f"{backend:<8} {threads:>8} {hot:>8.2f} {spread:>9.2f}")
+
+        print(f"\nRateLimitMiddleware, {args.requests} requests, 1000 clients (us/request)")
+        base = bench_middleware(None, args.requests, 1000)
+        print(f"{'none':<8} {base:>8.1f}")
+        for backend in ("memory", "sqlite"):
+            us = bench_middleware(make_backend(backend, directory), args.requests, 1000)
+            print(f"{backend:<8} {us:>8.1f}  (+{us - base:.1f})")
+
+        allowed = bench_shared(directory)
+        print(f"\nshared SQLite, 4 processes x 200 attempts at capacity 100: "
+              f"allowed {allowed} = {sum(allowed)} (expect 100)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+SQLite read/write mixed-load benchmark
+
+Reader threads run session-history queries while writer threads log chat
+queries, for a fixed duration, against
+- legacy:  one shared connection (StaticPool, check_same_thread=False),
+           rollback journal, one commit per write
+- wal:     the current setup from app.database.connection / writer:
+           WAL + tuned pragmas, a pool of query_only readers, and a single
+           writer thread that group-commits whatever is queued
+
+Reported: reads/s, writes/s, p50/p99 latency of each, and errors (the shared
+connection is not safe to use from several threads at once).
+
+Usage:
+    python benchmarks/bench_sqlite_rw.py [--readers 8] [--writers 8] [--seconds 5]
+"""
+from pathlib import Path
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SESSIONS = 100
+
+
+def seed(engine):
+    from sqlalchemy import insert
+    from app.database.models import Base, ChatQuery
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(ChatQuery), [
+            {"session_id": f"bench-{s}", "query": f"q{q}", "response": "r" * 200, "response_time_ms": 5.0}
+            for s in range(SESSIONS) for q in range(50)
+        ])
+
+
+def read_history(db, n: int):
+    from sqlalchemy import func, select
+    from app.database.models import ChatQuery
+
+    session_id = f"bench-{n % SESSIONS}"
+    rows = db.execute(
+        select(ChatQuery.id, ChatQuery.query, ChatQuery.response)
+        .where(ChatQuery.session_id == session_id)
+        .order_by(ChatQuery.timestamp.desc())
+        .limit(20)
+    ).all()
+    total = db.scalar(select(func.count(ChatQuery.id)).where(ChatQuery.session_id == session_id))
+    return len(rows), total
+
+
+def write_query(db, n: int):
+    from sqlalchemy import insert
+    from app.database.models import ChatQuery
+
+    db.execute(insert(ChatQuery), {
+        "session_id": f"bench-{n % SESSIONS}", "query": "new", "response": "r" * 200, "response_time_ms": 1.0,
+    })
+
+
+def run_load(read_once, write_once, readers: int, writers: int, seconds: float):
+    stop = time.perf_counter() + seconds
+    results = {"read": [], "write": []}
+    errors = {"read": 0, "write": 0}
+    lock = threading.Lock()
+
+    def loop(kind, op, offset):
+        latencies, failed, n = [], 0, offset
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                op(n)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                failed += 1
+            n += 1
+        with lock:
+            results[kind] += latencies
+            errors[kind] += failed
+
+    threads = [threading.Thread(target=loop, args=("read", read_once, i * 7)) for i in range(readers)]
+    threads += [threading.Thread(target=loop, args=("write", write_once, i * 13)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    summary = {}
+    for kind, latencies in results.items():
+        latencies.sort()
+        summary[kind] = {
+            "ops": len(latencies) / seconds,
+            "p50": statistics.median(latencies) if latencies else 0.0,
+            "p99": latencies[max(int(len(latencies) * 0.99) - 1, 0)] if latencies else 0.0,
+            "errors": errors[kind],
+        }
+    return summary
+
+
+def bench_legacy(path: str, args):
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    seed(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def read_once(n):
+        with Session() as db:
+            read_history(db, n)
+
+    def write_once(n):
+        with Session() as db:
+            write_query(db, n)
+            db.commit()
+
+    return run_load(read_once, write_once, args.readers, args.writers, args.seconds)
+
+
+def bench_wal(args):
+    from app.database import connection
+    from app.database.writer import db_writer
+
+    seed(connection.engine)
+
+    def read_once(n):
+        with connection.get_read_db() as db:
+            read_history(db, n)
+
+    def write_once(n):
+        db_writer.submit(write_query, n).result()
+
+    try:
+        result = run_load(read_once, write_once, args.readers, args.writers, args.seconds)
+        result["write"]["avg_batch"] = db_writer.stats()["avg_batch"]
+        return result
+    finally:
+        db_writer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app's engines are built from DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/wal.db"
+        os.environ["DEBUG"] = "false"
+        import logging
+        logging.disable(logging.WARNING)
+
+        results = {
+            "legacy": bench_legacy(f"{tmp}/legacy.db", args),
+            "wal": bench_wal(args),
+        }
+
+    print(f"{args.readers} readers + {args.writers} writers, {args.seconds:.0f}s each")
+    print(f"{'setup':<8} {'op':<6} {'ops/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, result in results.items():
+        for kind, r in result.items():
+            print(f"{name:<8} {kind:<6} {r['ops']:>9.0f} {r['p50']:>9.2f} {r['p99']:>9.2f} {r['errors']:>7}")
+    print(f"writer group commit: {results['wal']['write'].get('avg_batch', 0)} writes per transaction")
+
+
+if __name__ == "__main__":
+    main()
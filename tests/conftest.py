@@ -0,0 +1,20 @@
+"""
+Test configuration
+Points the database and every on-disk store at a throwaway directory
+before any app module reads the settings
+"""
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="portfolio-tests-")
+
+for name, value in {
+    "DATABASE_URL": f"sqlite:///{_DATA_DIR}/portfolio.db",
+    "SESSION_INDEX_PATH": f"{_DATA_DIR}/sessions.sqlite3",
+    "DOCUMENT_CACHE_DIR": f"{_DATA_DIR}/document_cache",
+    "UPLOAD_DIR": f"{_DATA_DIR}/uploads",
+    "RATE_LIMIT_DB_PATH": f"{_DATA_DIR}/ratelimit.sqlite3",
+    "EMAIL_CACHE_PATH": f"{_DATA_DIR}/email_cache.sqlite3",
+    "ARCHIVE_DIR": f"{_DATA_DIR}/archive",
+}.items():
+    os.environ.setdefault(name, value)
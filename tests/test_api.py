@@ -0,0 +1,316 @@
+from app.config import settings
+from app.utils.startup import measure_startup
+
+
+def test_create_app_within_startup_budget():
+    profile = measure_startup()
+    slowest = ", ".join(f"{m.name} {m.cumulative_us / 1000:.0f} ms" for m in profile.slowest(5, key="cumulative_us", prefix="app."))
+    assert profile.cold_seconds <= settings.STARTUP_BUDGET_SECONDS, (
+        f"cold create_app() took {profile.cold_seconds:.2f}s "
+        f"(budget {settings.STARTUP_BUDGET_SECONDS:.2f}s); slowest app modules: {slowest}"
+    )
+
+
+def test_heavy_routers_not_imported_at_startup():
+    profile = measure_startup()
+    imported = {m.name for m in profile.modules}
+    assert "app.api.routes.chatbot" not in imported
+    assert "app.core.graphrag" not in imported
+
+
+def test_api_usage_recorded_by_route_template(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.api.middleware import pipeline
+    from app.app import create_app
+
+    tracked = []
+    monkeypatch.setattr(settings, "ENABLES_ANALYTICS", True)
+    monkeypatch.setattr(pipeline, "track_request", lambda **event: tracked.append(event))
+
+    with TestClient(create_app()) as client:
+        client.get("/api/v1/chatbot/session/3f6c2a9e-session")
+        client.get("/api/v1/chatbot/session/91b07d44-session")
+        client.get("/api/no-such-route/12345")
+
+    routes = [event["route"] for event in tracked if event["path"].startswith("/api/")]
+    assert routes == ["/api/v1/chatbot/session/{session_id}"] * 2 + [None]
+
+
+def test_unmatched_api_paths_share_one_endpoint(monkeypatch):
+    from app.api.middleware import analytics
+
+    events = []
+    monkeypatch.setattr(analytics.analytics_buffer, "submit", lambda kind, row: events.append(row) or True)
+    for path in ("/api/scan/1", "/api/scan/2"):
+        analytics.track_request(path, "GET", 404, 1.0, ("10.0.0.1", 1234))
+    analytics.track_request("/api/v1/chatbot/session/abc", "GET", 200, 1.0, None,
+                            route="/api/v1/chatbot/session/{session_id}")
+
+    assert [e["endpoint"] for e in events] == [analytics.UNMATCHED_ENDPOINT] * 2 + ["/api/v1/chatbot/session/{session_id}"]
+
+
+def test_single_flight_cache_is_bounded_lru():
+    import asyncio
+    from app.utils.cache import SingleFlightCache
+
+    cache = SingleFlightCache(max_entries=3)
+
+    async def fill():
+        for key in range(5):
+            await cache.get_or_compute(key, 60, lambda key=key: asyncio.sleep(0, result=key))
+        await cache.get_or_compute(2, 60, lambda: asyncio.sleep(0, result=-1))  # hit: 2 becomes most recent
+        await cache.get_or_compute(5, 60, lambda: asyncio.sleep(0, result=5))
+
+    asyncio.run(fill())
+    assert list(cache._entries) == [4, 2, 5]
+    assert cache.counters["evictions"] == 3
+
+
+def test_single_flight_cache_drops_value_computed_across_invalidation():
+    import asyncio
+    from app.utils.cache import SingleFlightCache
+
+    cache = SingleFlightCache()
+
+    async def run():
+        started = asyncio.Event()
+
+        async def slow_read():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "before write"
+
+        pending = asyncio.create_task(cache.get_or_compute("summary", 60, slow_read, tags=("visitors",)))
+        await started.wait()
+        cache.invalidate_tags(["visitors"])
+        assert await pending == "before write"
+        return await cache.get_or_compute("summary", 60, lambda: asyncio.sleep(0, result="after write"),
+                                          tags=("visitors",))
+
+    assert asyncio.run(run()) == "after write"
+    assert cache.counters["stale_discarded"] == 1
+
+
+def test_page_views_days_is_bounded():
+    from fastapi.testclient import TestClient
+    from app.app import create_app
+
+    with TestClient(create_app()) as client:
+        assert client.get("/api/v1/analytics/pages/views?days=0").status_code == 422
+        assert client.get("/api/v1/analytics/pages/views?days=366").status_code == 422
+        assert client.get("/api/v1/analytics/pages/views?days=7").status_code == 200
+
+
+def test_rejected_upload_leaves_nothing_behind(monkeypatch):
+    from pathlib import Path
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+    from app.app import create_app
+    from app.core.ingestion import QueueFull, ingestion_queue
+    from app.database.connection import get_read_db
+    from app.database.models import ChatSession
+
+    def full(*args):
+        raise QueueFull("test")
+
+    monkeypatch.setattr(ingestion_queue, "submit", full)
+    payload = b"%PDF-1.4 rejected upload " + Path(__file__).name.encode()
+
+    with TestClient(create_app()) as client:
+        before = set(Path(settings.UPLOAD_DIR).glob("*"))
+        response = client.post("/api/v1/chatbot/upload", files={"file": ("r.pdf", payload, "application/pdf")})
+        assert response.status_code == 503
+        assert set(Path(settings.UPLOAD_DIR).glob("*")) == before
+
+    with get_read_db() as db:
+        assert db.execute(select(ChatSession).where(ChatSession.pdf_filename == "r.pdf")).first() is None
+
+
+def test_uploads_are_not_kept_for_cached_or_deleted_sessions(monkeypatch):
+    from pathlib import Path
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    from app.api.routes import chatbot
+    from app.app import create_app
+    from app.core.ingestion import ingestion_queue
+
+    # Never processed: the job is recorded done as soon as it is submitted
+    monkeypatch.setattr(ingestion_queue, "submit", ingestion_queue.record_done)
+    monkeypatch.setattr(ingestion_queue, "notify", lambda: None)
+    upload_dir = Path(settings.UPLOAD_DIR)
+    payload = b"%PDF-1.4 kept upload " + Path(__file__).name.encode()
+
+    with TestClient(create_app()) as client:
+        before = set(upload_dir.glob("*"))
+        response = client.post("/api/v1/chatbot/upload", files={"file": ("k.pdf", payload, "application/pdf")})
+        assert response.status_code == 202
+        assert len(set(upload_dir.glob("*")) - before) == 1
+
+        assert client.delete(f"/api/v1/chatbot/session/{response.json()['session_id']}").status_code == 200
+        assert set(upload_dir.glob("*")) == before
+
+        document = SimpleNamespace(path="cached", metadata={"pages": 1, "chunks": 1})
+        monkeypatch.setattr(chatbot.document_cache, "get", lambda sha256: document)
+        monkeypatch.setattr(chatbot.GraphRAG, "load", staticmethod(lambda path: object()))
+        response = client.post("/api/v1/chatbot/upload", files={"file": ("k.pdf", payload, "application/pdf")})
+        assert response.status_code == 200 and response.json()["cached"]
+        assert set(upload_dir.glob("*")) == before
+
+
+def test_raw_exports_require_admin_key(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.app import create_app
+
+    with TestClient(create_app()) as client:
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", "")
+        assert client.get("/api/v1/analytics/export/chat_queries").status_code == 403
+
+        monkeypatch.setattr(settings, "ADMIN_API_KEY", "s3cret-admin-key")
+        for table in ("chat_queries", "visitors", "api_usage"):
+            assert client.get(f"/api/v1/analytics/export/{table}").status_code == 401
+        assert client.get("/api/v1/analytics/export/visitors",
+                          headers={"Authorization": "Bearer wrong"}).status_code == 401
+        assert client.get("/api/v1/analytics/export/visitors",
+                          headers={"Authorization": "Bearer s3cret-admin-key"}).status_code == 200
+        assert client.get("/api/v1/analytics/export/chat_queries",
+                          headers={"X-Admin-Key": "s3cret-admin-key"}).status_code == 200
+
+
+def test_pages_render_once_regardless_of_host():
+    from fastapi.testclient import TestClient
+    from app.api.routes import pages
+    from app.app import create_app
+
+    page_cache = pages.page_cache
+    page_cache.invalidate()
+    misses = page_cache.counters["misses"]
+
+    with TestClient(create_app()) as client:
+        bodies = {
+            client.get("/", headers={"Host": host, "Accept-Encoding": "identity"}).text
+            for host in ("a.example", "b.example", "c.example")
+        }
+
+    assert page_cache.counters["misses"] == misses + 1
+    (body,) = bodies
+    assert "example" not in body
+
+
+def test_page_last_modified_follows_asset_manifest(tmp_path):
+    from email.utils import formatdate
+    from fastapi.templating import Jinja2Templates
+    from starlette.requests import Request
+    from app.utils.page_cache import PageCache
+    import asyncio
+    import os
+
+    (tmp_path / "page.html").write_text("<p>hi</p>")
+    os.utime(tmp_path / "page.html", (1_000_000, 1_000_000))
+    templates = Jinja2Templates(directory=str(tmp_path))
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+    page = asyncio.run(PageCache(templates, tmp_path, assets_mtime=2_000_000.5).get(request, "page.html"))
+    assert page.last_modified_header == formatdate(2_000_000, usegmt=True)
+    page = asyncio.run(PageCache(templates, tmp_path).get(request, "page.html"))
+    assert page.last_modified_header == formatdate(1_000_000, usegmt=True)
+
+
+def _limited_client(limiter, trusted_hops=0, per_minute=2):
+    from fastapi.testclient import TestClient
+    from starlette.responses import PlainTextResponse
+    from app.api.middleware.rate_limit import RateLimitMiddleware
+
+    app = RateLimitMiddleware(PlainTextResponse("ok"), limiter=limiter,
+                              groups=(("/api/", "api", per_minute),), trusted_hops=trusted_hops)
+    return TestClient(app), app
+
+
+def test_rate_limit_refuses_past_capacity_with_headers():
+    from app.utils.rate_limit import MemoryRateLimiter
+
+    client, app = _limited_client(MemoryRateLimiter())
+    first, second, third = (client.get("/api/x") for _ in range(3))
+
+    assert [first.status_code, second.status_code, third.status_code] == [200, 200, 429]
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    assert int(third.headers["Retry-After"]) >= 1
+    assert client.get("/other").status_code == 200
+    assert app.counters == {"allowed": 2, "limited": 1}
+
+
+def test_rate_limit_keys_on_forwarded_client_behind_trusted_proxy():
+    from app.utils.rate_limit import MemoryRateLimiter
+
+    client, _ = _limited_client(MemoryRateLimiter(), trusted_hops=1, per_minute=1)
+    # Entries left of the proxy's own are client-supplied and ignored
+    assert client.get("/api/x", headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 200
+    assert client.get("/api/x", headers={"X-Forwarded-For": "198.51.100.2"}).status_code == 200
+    assert client.get("/api/x", headers={"X-Forwarded-For": "1.2.3.4, 203.0.113.7"}).status_code == 429
+
+    direct, _ = _limited_client(MemoryRateLimiter(), per_minute=1)
+    assert direct.get("/api/x", headers={"X-Forwarded-For": "203.0.113.7"}).status_code == 200
+    assert direct.get("/api/x", headers={"X-Forwarded-For": "198.51.100.2"}).status_code == 429
+
+
+def test_sqlite_rate_limit_is_shared_and_runs_off_the_event_loop(tmp_path):
+    from app.utils.rate_limit import SQLiteRateLimiter
+    import asyncio
+
+    on_loop = []
+
+    class Recording(SQLiteRateLimiter):
+        def acquire(self, *args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:
+                on_loop.append(False)
+            return super().acquire(*args, **kwargs)
+
+    path = str(tmp_path / "buckets.sqlite3")
+    worker_a, worker_b = Recording(path), Recording(path)
+    client_a, _ = _limited_client(worker_a)
+    client_b, _ = _limited_client(worker_b)
+
+    assert client_a.get("/api/x").status_code == 200
+    assert client_b.get("/api/x").status_code == 200
+    assert client_a.get("/api/x").status_code == 429
+    assert on_loop == [False, False, False]
+    worker_a.close()
+    worker_b.close()
+
+
+def test_ttft_percentiles_read_every_rank_in_one_query():
+    from sqlalchemy import delete, event, false, inspect
+    from app.api.routes.analytics import _percentiles
+    from app.database import crud
+    from app.database.connection import async_engine, engine, get_async_db, get_db, init_db
+    from app.database.models import ChatQuery
+    import asyncio
+
+    init_db()
+    assert "idx_chat_query_ttft" in {index["name"] for index in inspect(engine).get_indexes("chat_queries")}
+    with get_db() as db:
+        db.execute(delete(ChatQuery))
+        for ttft in range(100, 0, -1):
+            crud.record_query(db, "ttft-session", "q", "a", float(ttft), float(ttft))
+        crud.record_query(db, "ttft-session", "q", "a", 1000.0, 1000.0, error_message="failed")
+
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def percentiles():
+        async with get_async_db() as db:
+            return await _percentiles(db, ChatQuery.ttft_ms, ChatQuery.error == false())
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    try:
+        result = asyncio.run(percentiles())
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+    assert result == {"p50": 50.0, "p90": 90.0, "p95": 95.0, "p99": 99.0, "samples": 100}
+    assert len(statements) == 2
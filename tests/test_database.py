@@ -0,0 +1,359 @@
+from datetime import datetime, timedelta
+import asyncio
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.ingestion import IngestionQueue, QueueFull, _JobProgress
+from app.database.connection import get_db, init_db
+from app.database.models import IngestionJob
+from app.database.writer import GroupCommitWriter
+from app.utils.session import SessionStore
+
+
+def _store(tmp_path, **options) -> SessionStore:
+    return SessionStore(
+        index_path=str(tmp_path / "sessions.sqlite3"),
+        idle_ttl=options.pop("idle_ttl", 600),
+        memory_cap_bytes=1 << 30,
+        max_resident=16,
+        **options,
+    )
+
+
+def test_session_loader_runs_outside_the_store_lock_once_per_session(tmp_path):
+    store = _store(tmp_path)
+    store.create("warm", {}, obj="resident")
+    store.create("cold", {})
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def slow_loader(session_id, meta):
+        calls.append(session_id)
+        started.set()
+        release.wait(5)
+        return f"loaded {session_id}"
+
+    store.set_loader(slow_loader)
+    results = []
+    loaders = [threading.Thread(target=lambda: results.append(store.get("cold").obj)) for _ in range(3)]
+    loaders[0].start()
+    assert started.wait(5)
+    for thread in loaders[1:]:
+        thread.start()
+
+    # A cold load in progress must not hold up lookups of other sessions
+    begin = time.perf_counter()
+    assert store.get("warm").obj == "resident"
+    assert time.perf_counter() - begin < 1.0
+
+    release.set()
+    for thread in loaders:
+        thread.join(5)
+    assert calls == ["cold"]
+    assert results == ["loaded cold"] * 3
+    assert store.counters["coalesced"] == 2
+
+
+def test_session_purged_by_another_worker_is_not_counted_idle(tmp_path):
+    store, other = _store(tmp_path), _store(tmp_path)
+    store.create("shared", {}, obj="graph")
+    assert other.delete("shared")
+
+    store.purge_expired(force=True)
+    assert store.counters["dropped_remote"] == 1
+    assert store.counters["evicted_idle"] == 0
+    assert "shared" not in store._last_touch
+    assert store.get("shared") is None
+
+
+# ==========================================
+# INGESTION QUEUE
+# ==========================================
+
+@pytest.fixture
+def queue():
+    init_db()
+    with get_db() as db:
+        db.query(IngestionJob).delete()
+    return IngestionQueue(concurrency=1, max_queued=2, poll_interval=60,
+                          heartbeat_interval=1, stale_after=3, max_attempts=2)
+
+
+def _submit(queue, name):
+    job_id = str(uuid.uuid4())
+    queue.submit(job_id, f"session-{name}", "ab" * 32, f"{name}.pdf", f"/tmp/{name}.pdf", 10)
+    return job_id
+
+
+def test_claim_takes_queued_jobs_oldest_first(queue):
+    first, second = _submit(queue, "first"), _submit(queue, "second")
+    with pytest.raises(QueueFull):
+        _submit(queue, "third")
+
+    claimed = queue._claim()
+    assert claimed["job_id"] == first
+    assert (claimed["status"], claimed["stage"], claimed["attempts"]) == ("running", "extracting", 1)
+    assert queue._claim()["job_id"] == second
+    assert queue._claim() is None
+    assert queue.get(first)["status"] == "running"
+
+
+def test_recover_stale_requeues_then_fails_out_of_attempts(queue):
+    job_id = _submit(queue, "stale")
+
+    def stall():
+        with get_db() as db:
+            db.query(IngestionJob).filter_by(job_id=job_id).update(
+                {"updated_at": datetime.utcnow() - timedelta(seconds=30)}, synchronize_session=False
+            )
+
+    queue._claim()
+    queue._write_progress(job_id, _JobProgress(progress=10.0, pages_done=1, pages_total=10))
+    assert queue.recover_stale() == 0  # heartbeat is fresh
+
+    stall()
+    assert queue.recover_stale() == 1
+    assert queue.get(job_id)["status"] == "queued"
+
+    assert queue._claim()["attempts"] == 2
+    stall()
+    assert queue.recover_stale() == 1
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "interrupted" in job["error"]
+
+
+def test_upload_is_unlinked_once_no_pending_job_needs_it(queue, tmp_path, monkeypatch):
+    from app.core import ingestion
+    from app.core.document_processor import InvalidDocument
+
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(upload_dir))
+    outcomes = {}
+
+    async def ingest(path, sha256, *args, **kwargs):
+        if outcomes[path] == "invalid":
+            raise InvalidDocument("not a PDF")
+        return object()
+
+    monkeypatch.setattr(ingestion, "ingest_document", ingest)
+
+    def submit(name, outcome):
+        path = upload_dir / f"{name}.pdf"
+        path.write_bytes(b"%PDF-1.4")
+        outcomes[str(path)] = outcome
+        job_id = str(uuid.uuid4())
+        queue.submit(job_id, f"session-{uuid.uuid4()}", "cd" * 32, path.name, str(path), 8)
+        return path
+
+    shared = submit("shared", "ok")
+    submit("shared", "ok")  # a second upload of the same bytes
+    asyncio.run(queue._run(queue._claim()))
+    assert shared.exists()  # the other job is still queued
+    asyncio.run(queue._run(queue._claim()))
+    assert not shared.exists()
+
+    submit("broken", "invalid")
+    asyncio.run(queue._run(queue._claim()))
+    assert list(upload_dir.iterdir()) == []
+
+
+def test_ingestion_writes_go_through_the_writer(queue):
+    from app.database.writer import db_writer
+
+    before = db_writer.counters["writes"]
+    job_id = _submit(queue, "routed")
+    queue._claim()
+    queue._write_progress(job_id, _JobProgress())
+    queue._finish(job_id, "succeeded", "ready", _JobProgress(), None)
+    assert db_writer.counters["writes"] - before == 4
+    assert queue.get(job_id)["status"] == "succeeded"
+
+
+# ==========================================
+# GROUP-COMMIT WRITER
+# ==========================================
+
+class _Writer:
+    """A GroupCommitWriter on its own SQLite file with one `items` table"""
+
+    def __init__(self, path, fail_commit: bool = False):
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+        self.items = Table("items", MetaData(), Column("id", Integer, primary_key=True))
+        self.items.metadata.create_all(self.engine)
+        self.fail_commit = fail_commit
+        self.writer = GroupCommitWriter(self._session)
+        self.gate = threading.Event()
+        self.holding = threading.Event()
+
+    def _session(self):
+        session = Session(self.engine)
+        if self.fail_commit:
+            @event.listens_for(session, "before_commit")
+            def fail(session):
+                raise RuntimeError("disk full")
+        return session
+
+    def hold(self):
+        """Queue a write that blocks the writer thread until `gate` is set, so later writes form one batch"""
+        def wait(db):
+            self.holding.set()
+            self.gate.wait(5)
+
+        future = self.writer.submit(wait)
+        assert self.holding.wait(5)
+        return future
+
+    def insert(self, item_id: int, fail: bool = False):
+        def write(db):
+            db.execute(self.items.insert().values(id=item_id))
+            if fail:
+                raise ValueError(f"write {item_id} failed")
+            return item_id
+        return self.writer.submit(write)
+
+    def ids(self):
+        with self.engine.connect() as conn:
+            return sorted(conn.execute(select(self.items.c.id)).scalars())
+
+
+def test_writer_isolates_failed_write_in_its_savepoint(tmp_path):
+    w = _Writer(tmp_path / "writer.db")
+    w.hold()
+    futures = [w.insert(1), w.insert(2, fail=True), w.insert(3)]
+    w.gate.set()
+
+    assert futures[0].result(5) == 1 and futures[2].result(5) == 3
+    with pytest.raises(ValueError, match="write 2 failed"):
+        futures[1].result(5)
+    assert w.ids() == [1, 3]
+    assert w.writer.counters["largest_batch"] == 3
+    w.writer.stop()
+
+
+def test_writer_commit_failure_reaches_every_caller_in_the_batch(tmp_path):
+    w = _Writer(tmp_path / "writer.db", fail_commit=True)
+    w.hold()
+    futures = [w.insert(1), w.insert(2), w.insert(3, fail=True)]
+    w.gate.set()
+
+    for future, expected in zip(futures, (RuntimeError, RuntimeError, ValueError)):
+        with pytest.raises(expected):
+            future.result(5)
+    assert w.ids() == []
+    assert w.writer.counters["commit_errors"] == 2  # the gate write's batch and the three-write batch
+    w.writer.stop()
+
+
+def test_writer_stop_drains_queued_writes(tmp_path):
+    w = _Writer(tmp_path / "writer.db")
+    w.hold()
+    futures = [w.insert(i) for i in range(1, 21)]
+    stopper = threading.Thread(target=w.writer.stop)
+    stopper.start()
+    w.gate.set()
+    stopper.join(10)
+
+    assert not w.writer.running
+    assert [f.result(0) for f in futures] == list(range(1, 21))
+    assert w.ids() == list(range(1, 21))
+
+
+# ==========================================
+# ROLLUPS
+# ==========================================
+
+def test_summary_counters_track_messages_and_session_averages():
+    from app.database import crud
+    from app.database.rollups import _count_summary, read_summary_counters
+
+    init_db()
+    sessions = [f"summary-{uuid.uuid4()}" for _ in range(3)]
+    with get_db() as db:
+        before = read_summary_counters(db)
+        crud.create_contact_message(db, "a", "a@example.com", "hi")
+        for session_id in sessions:
+            crud.create_chat_session(db, session_id, "doc.pdf")
+        for response_time_ms in (100.0, 250.5, 80.25):
+            crud.record_query(db, sessions[0], "q", "a", response_time_ms, None)
+        crud.record_query(db, sessions[1], "q", "a", 42.0, None)
+        crud.record_query(db, sessions[2], "q", "a", 5.0, None, error_message="failed")
+        crud.delete_chat_session(db, sessions[1])
+
+    with get_db() as db:
+        after = read_summary_counters(db)
+        assert after == _count_summary(db)
+    assert {name: after[name] - before[name] for name in after} == {
+        "contact_messages.unread": 1,
+        "chat_sessions.active": 1,
+        "chat_sessions.avg_response_us": 143583,
+    }
+
+
+def _old_visitors(page, count, days_ago=200):
+    from app.database.models import Visitor
+
+    timestamp = datetime.utcnow().replace(minute=5) - timedelta(days=days_ago)
+    with get_db() as db:
+        db.add_all(Visitor(page=page, device_type="desktop", timestamp=timestamp) for _ in range(count))
+    return timestamp.date()
+
+
+def _daily_views(page):
+    from sqlalchemy import func
+    from app.database.models import DailyPageStat
+
+    with get_db() as db:
+        return db.scalar(select(func.coalesce(func.sum(DailyPageStat.views), 0)).where(DailyPageStat.page == page))
+
+
+def test_backfill_keeps_the_history_of_archived_rows(tmp_path, monkeypatch):
+    from app.database.retention import run_retention
+    from app.database.rollups import backfill_rollups
+
+    init_db()
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    page = f"/archived-{uuid.uuid4()}"
+    _old_visitors(page, 3)
+    assert run_retention(days=90)["visitors"]["archived"] >= 3
+
+    with get_db() as db:
+        backfill_rollups(db)
+    assert _daily_views(page) == 3
+
+
+def test_retention_batch_rolls_back_when_rows_were_already_deleted():
+    from sqlalchemy import delete, func
+    from app.database.models import HourlyPageStat, Visitor
+    from app.database.retention import RetentionConflict, _downsample_and_delete
+    from app.database.writer import write_sync
+
+    init_db()
+    page = f"/conflict-{uuid.uuid4()}"
+    _old_visitors(page, 2)
+    with get_db() as db:
+        rows = [dict(r) for r in db.execute(select(Visitor.__table__).where(Visitor.page == page)).mappings()]
+        db.execute(delete(Visitor.__table__).where(Visitor.id == rows[0]["id"]))
+
+    with pytest.raises(RetentionConflict):
+        write_sync(_downsample_and_delete, "visitors", rows)
+    with get_db() as db:
+        assert db.scalar(select(func.count(Visitor.id)).where(Visitor.page == page)) == 1
+        assert db.scalar(select(func.count()).select_from(HourlyPageStat).where(HourlyPageStat.page == page)) == 0
+
+
+def test_one_retention_pass_at_a_time(tmp_path, monkeypatch):
+    from app.database.retention import retention_lock, run_retention
+
+    init_db()
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    with retention_lock(settings.ARCHIVE_DIR) as acquired:
+        assert acquired
+        assert run_retention(days=90)["skipped"]
+    assert "skipped" not in run_retention(days=90)
@@ -0,0 +1,143 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core.document_processor import aiter_chunks, aiter_pages
+
+
+def write_pdf(path, pages):
+    """Minimal PDF with one line of Helvetica text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(bytes(out))
+    return path
+
+
+def test_aiter_chunks_streams_chunks_and_reports_progress(tmp_path):
+    pdf = write_pdf(tmp_path / "doc.pdf", ["Graphs link entities", "Relations carry weights"])
+    reports = []
+
+    async def collect():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return [chunk async for chunk in aiter_chunks(
+                pdf, executor=executor, progress=lambda done, total: reports.append((done, total))
+            )]
+
+    chunks = asyncio.run(collect())
+    text = " ".join(chunk.text for chunk in chunks)
+    assert "Graphs link entities" in text and "Relations carry weights" in text
+    assert reports[0] == (0, 2) and reports[-1] == (2, 2)
+
+
+def test_aiter_chunks_without_progress(tmp_path):
+    pdf = write_pdf(tmp_path / "one.pdf", ["Single page"])
+
+    async def collect():
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return [chunk async for chunk in aiter_chunks(pdf, executor=executor)]
+
+    assert [chunk.text for chunk in asyncio.run(collect())] == ["Single page"]
+
+
+def test_aiter_pages_accepts_any_executor(tmp_path):
+    from concurrent.futures import Executor, Future
+
+    class Inline(Executor):
+        """Runs each call at submit time; has no ProcessPoolExecutor internals"""
+
+        def __init__(self):
+            self.calls = 0
+
+        def submit(self, fn, *args, **kwargs):
+            self.calls += 1
+            future = Future()
+            future.set_result(fn(*args, **kwargs))
+            return future
+
+    path = write_pdf(tmp_path / "doc.pdf", ["one", "two", "three"])
+    executor = Inline()
+
+    async def collect():
+        return [page.text async for page in aiter_pages(path, executor=executor, batch_pages=1, workers=1)]
+
+    assert asyncio.run(collect()) == ["one", "two", "three"]
+    assert executor.calls == 4  # page count, then one call per range
+
+
+def test_email_follower_takes_over_when_the_leader_is_cancelled():
+    from types import SimpleNamespace
+    from app.core.email_generator import EmailGenerator
+
+    class Client:
+        model = "test-model"
+        configured = True
+
+        def __init__(self):
+            self.calls = 0
+
+        async def complete(self, messages, **params):
+            self.calls += 1
+            if self.calls == 1:
+                await asyncio.Event().wait()  # the leader hangs until cancelled
+            return SimpleNamespace(text=" Dear team ", model=self.model)
+
+    async def scenario():
+        client = Client()
+        generator = EmailGenerator(cache=None, client=client)
+        leader = asyncio.create_task(generator.generate("job", "resume"))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(generator.generate("job", "resume"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        generated = await follower
+        return leader, generated, client.calls
+
+    leader, generated, calls = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert generated.email == "Dear team"
+    assert not generated.cache_hit
+    assert calls == 2
+
+
+def _answer(text):
+    from app.core.answer_cache import CachedAnswer
+    return CachedAnswer(query=text, answer=text, sources=[], response_time_ms=100.0)
+
+
+def test_answer_cache_near_hits_need_the_same_numbers_and_negations():
+    from app.core.answer_cache import AnswerCache
+
+    cache = AnswerCache()
+    cache.store("doc", "v1", "What did the author do in 2019?", _answer("2019 answer"))
+
+    assert cache.lookup("doc", "v1", "What did the author do in 2020?") is None
+    assert cache.lookup("doc", "v1", "What did the author not do in 2019?") is None
+    assert cache.lookup("doc", "v1", "What didn't the author do in 2019?") is None
+    assert cache.lookup("doc", "v1", "what did the author do in 2019")[1] == "exact"
+    assert cache.counters["near_hits"] == 0
+
+
+def test_answer_cache_serves_rephrasings_as_near_hits():
+    from app.core.answer_cache import AnswerCache
+
+    cache = AnswerCache()
+    cache.store("doc", "v1", "How does the model handle missing values?", _answer("imputation"))
+
+    answer, kind = cache.lookup("doc", "v1", "how does the model handle the missing values")
+    assert (answer.answer, kind) == ("imputation", "near")
+    assert cache.lookup("doc", "v1", "How does the model handle outliers?") is None